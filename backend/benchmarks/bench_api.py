@@ -0,0 +1,213 @@
+"""
+Benchmark de la API completa sin servicios externos: la IA es simulada
+(benchmarks/fake_ai.py) y la base de datos es un SQLite local sembrado con
+volúmenes realistas (benchmarks/seed.py). Las peticiones pasan por toda la
+app (middlewares, dependencias, pools) dentro del mismo proceso.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_api
+    python -m benchmarks.bench_api --scenarios chat teachers --concurrency 1 10 50 --requests 300
+    python -m benchmarks.bench_api --sql-latency 0.1 --answer-latency 0.2 --json resultados.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+
+ESCENARIOS = ("chat", "token", "register", "teachers", "locations", "search")
+PASSWORD = "secreto123"
+
+
+def preparar_entorno(args):
+    # Antes de importar src: nada del .env real (Postgres, API key) debe usarse
+    os.environ["ENV_FILE"] = os.devnull
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ.pop("DATABASE_READ_URL", None)
+    os.environ["GEMINI_API_KEY"] = "benchmark-sin-red"
+    os.environ["BCRYPT_ROUNDS"] = str(args.bcrypt_rounds)
+    os.environ["SCHEMA_SNAPSHOT_PATH"] = f"{args.db}.schema.json"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Se mide el pipeline, no el límite de tasa (todas las peticiones son anónimas)
+    os.environ.setdefault("GLOBAL_RATE_LIMIT", "1000000000")
+    for archivo in (args.db, f"{args.db}.schema.json"):
+        if os.path.exists(archivo):
+            os.remove(archivo)
+
+
+def preguntas_chat(datos: dict, distintas: int, total: int, seed: int) -> list:
+    """
+    Mezcla de preguntas como las de los estudiantes, con repeticiones
+    (distribución tipo Zipf) para que cachés e índices trabajen como en
+    producción. `distintas` controla cuántas preguntas diferentes hay.
+    """
+    rng = random.Random(seed)
+    generadores = [
+        lambda: rng.choice(datos["faqs"]),
+        lambda: f"¿Dónde queda el {rng.choice(datos['ubicaciones'])}?",
+        lambda: f"¿Qué docente dicta {rng.choice(datos['nombres_cursos'])}?",
+        lambda: f"¿Cuál es el correo de {rng.choice(datos['docentes'])}?",
+        lambda: f"¿Qué cursos hay del ciclo {rng.randint(1, 10)}?",
+    ]
+    pool = []
+    while len(pool) < distintas:
+        pregunta = rng.choice(generadores)()
+        if pregunta not in pool:
+            pool.append(pregunta)
+    pesos = [1 / (i + 1) for i in range(len(pool))]
+    return rng.choices(pool, weights=pesos, k=total)
+
+
+def construir_peticiones(escenario: str, datos: dict, args):
+    """Devuelve una función que, dado el número de petición, la ejecuta con el cliente."""
+    if escenario == "chat":
+        preguntas = preguntas_chat(datos, args.chat_distinct, args.requests, args.seed)
+        return lambda c, i: c.post("/chat", json={"prompt": preguntas[i % len(preguntas)]})
+    if escenario == "token":
+        correos = datos["correos"]
+        return lambda c, i: c.post("/token", data={"username": correos[i % len(correos)], "password": PASSWORD})
+    if escenario == "register":
+        secuencia = itertools.count()
+
+        def registrar(c, i):
+            n = next(secuencia)
+            return c.post("/api/register", json={
+                "fullName": f"Alumno Benchmark {n}",
+                "studentCode": f"B{time.time_ns() % 10**8}{n}",
+                "career": "Ingeniería de Sistemas",
+                "email": f"bench{time.time_ns()}_{n}@uni.pe",
+                "password": PASSWORD,
+            })
+        return registrar
+    if escenario == "teachers":
+        cursos = datos["cursos"]
+        return lambda c, i: c.get("/api/teachers", params={"limit": 100} if i % 2 else {"course": cursos[i % len(cursos)]})
+    if escenario == "locations":
+        return lambda c, i: c.get("/api/locations")
+    if escenario == "search":
+        # Lo que envía un autocompletado: prefijos crecientes de nombres reales
+        rng = random.Random(args.seed)
+        nombres = datos["ubicaciones"] + datos["docentes"] + datos["nombres_cursos"]
+        consultas = []
+        while len(consultas) < args.requests:
+            nombre = rng.choice(nombres)
+            consultas += [nombre[:n] for n in range(1, len(nombre) + 1)]
+        return lambda c, i: c.get("/api/search", params={"q": consultas[i % len(consultas)]})
+    raise ValueError(escenario)
+
+
+def percentil(latencias: list, q: float) -> float:
+    return latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1000 if latencias else 0.0
+
+
+async def medir(cliente, peticion, total: int, concurrencia: int) -> dict:
+    latencias, errores = [], 0
+    siguiente = itertools.count()
+
+    async def trabajador():
+        nonlocal errores
+        while (i := next(siguiente)) < total:
+            inicio = time.perf_counter()
+            try:
+                respuesta = await peticion(cliente, i)
+                ok = respuesta.status_code < 400
+            except Exception:
+                ok = False
+            if ok:
+                latencias.append(time.perf_counter() - inicio)
+            else:
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabajador() for _ in range(concurrencia)))
+    duracion = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "ok": len(latencias),
+        "errors": errores,
+        "rps": len(latencias) / duracion if duracion else 0.0,
+        "p50_ms": percentil(latencias, 0.50),
+        "p95_ms": percentil(latencias, 0.95),
+        "p99_ms": percentil(latencias, 0.99),
+    }
+
+
+async def correr(args):
+    preparar_entorno(args)
+
+    import bcrypt
+    import httpx
+
+    from src.database import Base, SessionLocal, engine
+
+    from .fake_ai import FakeAI
+    from .seed import sembrar
+
+    Base.metadata.create_all(bind=engine)
+    inicio = time.perf_counter()
+    hash_password = bcrypt.hashpw(PASSWORD.encode(), bcrypt.gensalt(rounds=args.bcrypt_rounds)).decode()
+    with SessionLocal() as db:
+        datos = sembrar(db, hash_password, docentes=args.docentes, cursos=args.cursos,
+                        asignaciones=args.asignaciones, ubicaciones=args.ubicaciones,
+                        faqs=args.faqs, usuarios=args.usuarios, seed=args.seed)
+    print(f"Base sembrada en {time.perf_counter() - inicio:.1f}s ({args.db})")
+
+    from src import main
+
+    fake = FakeAI(sql_latency=args.sql_latency, answer_latency=args.answer_latency, seed=args.seed)
+    main.ai_sql_platform = main.envolver_llm(fake, "sql")
+    main.ai_platform = main.envolver_llm(fake, "answer")
+
+    resultados = []
+    transporte = httpx.ASGITransport(app=main.app)
+    # El lifespan lee el schema y carga la FAQ; las plataformas ya asignadas se respetan
+    async with main.app.router.lifespan_context(main.app):
+        async with httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=120) as cliente:
+            print(f"IA simulada: SQL {args.sql_latency * 1000:.0f} ms, respuesta {args.answer_latency * 1000:.0f} ms; "
+                  f"bcrypt rounds={args.bcrypt_rounds}; {args.requests} peticiones por corrida")
+            print(f"{'escenario':<10} {'conc':>5} {'ok':>6} {'err':>5} {'req/s':>9} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+            for escenario in args.scenarios:
+                for concurrencia in args.concurrency:
+                    # Cada corrida empieza con cachés frías para ser comparable
+                    main.sql_cache.clear()
+                    main.result_cache.clear()
+                    peticion = construir_peticiones(escenario, datos, args)
+                    r = await medir(cliente, peticion, args.requests, concurrencia)
+                    r.update({"scenario": escenario, "concurrency": concurrencia})
+                    resultados.append(r)
+                    print(f"{escenario:<10} {concurrencia:>5} {r['ok']:>6} {r['errors']:>5} {r['rps']:>9.1f} "
+                          f"{r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"config": {k: v for k, v in vars(args).items() if k != "json"}, "results": resultados}, f, indent=2)
+        print(f"Resultados guardados en {args.json}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", nargs="+", choices=ESCENARIOS, default=list(ESCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--requests", type=int, default=200, help="peticiones por escenario y nivel de concurrencia")
+    parser.add_argument("--sql-latency", type=float, default=0.4, help="segundos por llamada de generación de SQL")
+    parser.add_argument("--answer-latency", type=float, default=0.8, help="segundos por llamada de respuesta")
+    parser.add_argument("--chat-distinct", type=int, default=50, help="preguntas distintas en la mezcla del chat")
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--docentes", type=int, default=800)
+    parser.add_argument("--cursos", type=int, default=300)
+    parser.add_argument("--asignaciones", type=int, default=3000)
+    parser.add_argument("--ubicaciones", type=int, default=400)
+    parser.add_argument("--faqs", type=int, default=200)
+    parser.add_argument("--usuarios", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "trikabot_bench.db"))
+    parser.add_argument("--json", help="guarda los resultados en este archivo para comparar corridas")
+    asyncio.run(correr(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
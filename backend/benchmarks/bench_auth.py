@@ -0,0 +1,104 @@
+"""
+Costo por petición de autenticar un token: verificación JWT + consulta del
+usuario en cada petición (camino sin caché) frente a get_current_principal
+con las cachés de tokens y de usuarios calientes. Usa un SQLite temporal.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_auth
+    python -m benchmarks.bench_auth --requests 20000 --users 500
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+
+def preparar_entorno(args):
+    # Antes de importar src, como en bench_api
+    os.environ["ENV_FILE"] = os.devnull
+    os.environ["DATABASE_URL"] = f"sqlite:///{args.db}"
+    os.environ.pop("DATABASE_READ_URL", None)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    if os.path.exists(args.db):
+        os.remove(args.db)
+
+
+def percentil(latencias: list, q: float) -> float:
+    return latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1e6 if latencias else 0.0
+
+
+async def medir(nombre: str, funcion, tokens: list, peticiones: int) -> dict:
+    latencias = []
+    inicio = time.perf_counter()
+    for i in range(peticiones):
+        t0 = time.perf_counter()
+        await funcion(tokens[i % len(tokens)])
+        latencias.append(time.perf_counter() - t0)
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "path": nombre,
+        "req/s": peticiones / total,
+        "p50_us": percentil(latencias, 0.50),
+        "p99_us": percentil(latencias, 0.99),
+    }
+
+
+async def correr(args):
+    preparar_entorno(args)
+
+    from fastapi.concurrency import run_in_threadpool
+    from jose import jwt
+
+    from src.auth import dependencies
+    from src.auth.utils import create_access_token, get_user_by_email
+    from src.database import Base, SessionLocal, engine
+
+    from .seed import sembrar
+
+    Base.metadata.create_all(bind=engine)
+    with SessionLocal() as db:
+        datos = sembrar(db, "x", docentes=1, cursos=1, asignaciones=1, ubicaciones=1, faqs=1, usuarios=args.users)
+    tokens = [create_access_token({"sub": correo}) for correo in datos["correos"]]
+
+    def consultar(correo):
+        with SessionLocal() as db:
+            return get_user_by_email(db, correo)
+
+    async def sin_cache(token):
+        # Lo que cuesta hoy: firma + exp en cada petición y el usuario desde la base
+        claims = jwt.decode(token, dependencies.SECRET_KEY, algorithms=[dependencies.ALGORITHM])
+        return await run_in_threadpool(consultar, claims["sub"])
+
+    async def solo_jwt(token):
+        return jwt.decode(token, dependencies.SECRET_KEY, algorithms=[dependencies.ALGORITHM])
+
+    async def con_cache(token):
+        return await dependencies.get_current_principal(token)
+
+    # Una pasada para calentar las cachés (y los pools) antes de medir
+    for token in tokens:
+        await con_cache(token)
+        await sin_cache(token)
+
+    print(f"{args.requests} peticiones sobre {len(tokens)} tokens/usuarios distintos")
+    print(f"{'camino':<28} {'req/s':>10} {'p50_us':>9} {'p99_us':>9}")
+    for nombre, funcion in (("jwt + usuario desde la base", sin_cache), ("sólo jwt.decode", solo_jwt),
+                            ("principal con cachés", con_cache)):
+        r = await medir(nombre, funcion, tokens, args.requests)
+        print(f"{r['path']:<28} {r['req/s']:>10.0f} {r['p50_us']:>9.1f} {r['p99_us']:>9.1f}")
+    print(f"cachés: tokens {dependencies.token_cache.stats()['hit_rate']:.0%} aciertos, "
+          f"usuarios {dependencies.user_cache.stats()['hit_rate']:.0%} aciertos")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--db", default=os.path.join(tempfile.gettempdir(), "trikabot_bench_auth.db"))
+    asyncio.run(correr(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Efecto de los controles de latencia del LLM (plazos, reintentos, hedging y
+circuit breaker) con una IA simulada que inyecta llamadas lentas y errores.
+No usa red ni base de datos.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_llm_resilience
+    python -m benchmarks.bench_llm_resilience --calls 500 --slow-rate 0.05 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from src.ai.resilience import CircuitBreaker, LLMNoDisponible, ResilientPlatform
+
+from .fake_ai import FakeAI
+
+PROMPT = "Redacta la respuesta para el usuario."
+
+
+def percentil(latencias: list, q: float) -> float:
+    return latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1000 if latencias else 0.0
+
+
+async def medir(plataforma, calls: int, concurrencia: int) -> dict:
+    latencias, errores, rapidos = [], 0, 0
+    semaforo = asyncio.Semaphore(concurrencia)
+
+    async def llamada():
+        nonlocal errores, rapidos
+        async with semaforo:
+            inicio = time.perf_counter()
+            try:
+                await plataforma.achat(PROMPT)
+                latencias.append(time.perf_counter() - inicio)
+            except LLMNoDisponible:
+                rapidos += 1
+            except Exception:
+                errores += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(llamada() for _ in range(calls)))
+    total = time.perf_counter() - inicio
+    latencias.sort()
+    return {
+        "ok": len(latencias),
+        "errors": errores,
+        "fast_fail": rapidos,
+        "seconds": total,
+        "p50_ms": percentil(latencias, 0.50),
+        "p95_ms": percentil(latencias, 0.95),
+        "p99_ms": percentil(latencias, 0.99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="latencia normal por llamada (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fracción de llamadas lentas")
+    parser.add_argument("--slow-factor", type=float, default=15.0, help="cuántas veces más tardan las lentas")
+    parser.add_argument("--error-rate", type=float, default=0.03, help="fracción de errores transitorios")
+    parser.add_argument("--timeout", type=float, default=1.5, help="plazo por llamada (s)")
+    args = parser.parse_args()
+    # Los avisos de cada reintento ensucian la tabla; se cuentan en las métricas
+    logging.getLogger("src").setLevel(logging.ERROR)
+
+    def fake(error_rate=args.error_rate):
+        return FakeAI(answer_latency=args.latency, slow_rate=args.slow_rate, slow_factor=args.slow_factor,
+                      error_rate=error_rate, seed=11)
+
+    def resiliente(inner, **kwargs):
+        opciones = dict(step="bench", timeout=args.timeout, max_retries=2, retry_base_delay=0.05,
+                        retry_max_delay=0.5, total_deadline=args.timeout * 3,
+                        breaker=CircuitBreaker(threshold=10_000))
+        opciones.update(kwargs)
+        return ResilientPlatform(inner, **opciones)
+
+    configuraciones = [
+        ("sin controles", fake()),
+        ("plazo+reintentos", resiliente(fake())),
+        ("+hedging", resiliente(fake(), hedge=True, hedge_min_delay=args.latency * 1.5)),
+        ("caída, sin breaker", resiliente(fake(error_rate=1.0))),
+        ("caída, con breaker", resiliente(fake(error_rate=1.0), breaker=CircuitBreaker(threshold=5, cooldown=60))),
+    ]
+
+    print(f"{args.calls} llamadas, concurrencia {args.concurrency}, latencia {args.latency * 1000:.0f} ms, "
+          f"{args.slow_rate:.0%} lentas x{args.slow_factor:g}, {args.error_rate:.0%} errores, plazo {args.timeout}s")
+    print(f"{'configuración':<20} {'ok':>5} {'err':>5} {'rápidas':>8} {'total_s':>8} {'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'llamadas':>9}")
+    for nombre, plataforma in configuraciones:
+        r = await medir(plataforma, args.calls, args.concurrency)
+        inner = getattr(plataforma, "inner", plataforma)
+        print(f"{nombre:<20} {r['ok']:>5} {r['errors']:>5} {r['fast_fail']:>8} {r['seconds']:>8.2f} "
+              f"{r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} {r['p99_ms']:>8.1f} {inner.calls:>9}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark de throughput de login (verificación bcrypt) según el tamaño del
+pool de hashing.
+
+Uso (desde backend/):
+    python -m benchmarks.bench_password_hashing
+    python -m benchmarks.bench_password_hashing --pools 1 2 4 8 --logins 200 --rounds 10
+"""
+import argparse
+import asyncio
+import time
+
+import bcrypt
+
+from src.auth.hashing import HashQueueFull, PasswordHasher
+
+
+async def medir(pool_size: int, logins: int, rounds: int, queue_max: int, stored: str):
+    hasher = PasswordHasher(pool_size=pool_size, queue_max=queue_max, rounds=rounds)
+    rechazados = 0
+    latencias = []
+
+    async def login():
+        nonlocal rechazados
+        inicio = time.perf_counter()
+        try:
+            valida, _ = await hasher.verify("secreto123", stored)
+            assert valida
+            latencias.append(time.perf_counter() - inicio)
+        except HashQueueFull:
+            rechazados += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    total = time.perf_counter() - inicio
+    hasher.shutdown()
+
+    latencias.sort()
+    p = lambda q: latencias[min(len(latencias) - 1, int(q * len(latencias)))] * 1000 if latencias else 0.0
+    return {
+        "pool": pool_size,
+        "ok": len(latencias),
+        "503": rechazados,
+        "logins/s": len(latencias) / total,
+        "p50_ms": p(0.50),
+        "p95_ms": p(0.95),
+        "p99_ms": p(0.99),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pools", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--logins", type=int, default=100, help="logins concurrentes por corrida")
+    parser.add_argument("--rounds", type=int, default=12, help="costo de bcrypt")
+    parser.add_argument("--queue-max", type=int, default=10_000, help="tamaño de la cola (admisión)")
+    args = parser.parse_args()
+
+    stored = bcrypt.hashpw(b"secreto123", bcrypt.gensalt(rounds=args.rounds)).decode()
+    print(f"bcrypt rounds={args.rounds}, {args.logins} logins concurrentes, cola={args.queue_max}")
+    print(f"{'pool':>5} {'ok':>6} {'503':>6} {'logins/s':>10} {'p50_ms':>9} {'p95_ms':>9} {'p99_ms':>9}")
+    for pool in args.pools:
+        r = await medir(pool, args.logins, args.rounds, args.queue_max, stored)
+        print(f"{r['pool']:>5} {r['ok']:>6} {r['503']:>6} {r['logins/s']:>10.1f} {r['p50_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
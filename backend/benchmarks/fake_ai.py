@@ -0,0 +1,103 @@
+"""
+Plataforma de IA simulada para benchmarks: sin red ni API key, con
+latencia configurable y respuestas fijas. Es determinista para una misma
+semilla, así que dos corridas sólo difieren por el código bajo prueba.
+También puede inyectar colas de latencia y errores transitorios para
+ejercitar los reintentos, el hedging y el circuit breaker.
+"""
+import asyncio
+import random
+import re
+import time
+
+from src.ai.base import AIPlatform, registrar_uso
+
+# Palabra clave de la pregunta -> SQL que "generaría" el modelo
+SQL_POR_TEMA = (
+    ("correo", "SELECT nombres_completos, correo_institucional FROM docentes ORDER BY id_docente LIMIT 5"),
+    ("docente", "SELECT d.nombres_completos, i.codigo_curso, i.metodologia FROM docentes d "
+                "JOIN docente_curso_info i ON i.id_docente = d.id_docente ORDER BY d.id_docente LIMIT 40"),
+    ("dicta", "SELECT d.nombres_completos, c.nombre FROM docentes d "
+              "JOIN docente_curso_info i ON i.id_docente = d.id_docente "
+              "JOIN cursos c ON c.codigo_curso = i.codigo_curso ORDER BY c.codigo_curso LIMIT 20"),
+    ("curso", "SELECT codigo_curso, nombre, ciclo_sugerido FROM cursos ORDER BY codigo_curso LIMIT 60"),
+    ("queda", "SELECT nombre, tipo, pabellon, piso, descripcion, referencia_llegada, imagen_url "
+              "FROM ubicaciones ORDER BY id_ubicacion LIMIT 1"),
+)
+# "¿Dónde queda el X?" -> SQL con el nombre como literal, como lo escribe el
+# modelo; así las plantillas de SQL aprendidas también se ejercitan
+_UBICACION = re.compile(r"queda el (.+?)\?")
+SQL_UBICACION = ("SELECT nombre, tipo, pabellon, piso, descripcion, referencia_llegada, imagen_url "
+                 "FROM ubicaciones WHERE nombre = '{}' LIMIT 1")
+SQL_POR_DEFECTO = "SELECT nombre, tipo, pabellon, piso FROM ubicaciones ORDER BY id_ubicacion LIMIT 50"
+
+
+class FakeAI(AIPlatform):
+    """
+    `sql_latency` y `answer_latency` son segundos por llamada; `jitter` es
+    la fracción de variación aleatoria (0.2 = ±20%). Con probabilidad
+    `slow_rate` una llamada tarda `slow_factor` veces más, y con
+    probabilidad `error_rate` falla con ConnectionError.
+    """
+
+    def __init__(self, sql_latency: float = 0.4, answer_latency: float = 0.8, jitter: float = 0.2,
+                 answer_chars: int = 400, seed: int = 42, slow_rate: float = 0.0, slow_factor: float = 10.0,
+                 error_rate: float = 0.0):
+        self.sql_latency = sql_latency
+        self.answer_latency = answer_latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_factor = slow_factor
+        self.error_rate = error_rate
+        self.errors = 0
+        self.answer = ("Según la información registrada en el sistema, " + "esto es una respuesta simulada. " * 40)[:answer_chars]
+        self._rng = random.Random(seed)
+        self.calls = 0
+
+    def _latencia(self, base: float) -> float:
+        latencia = max(0.0, base * (1 + self._rng.uniform(-self.jitter, self.jitter)))
+        if self._rng.random() < self.slow_rate:
+            latencia *= self.slow_factor
+        return latencia
+
+    def _quizas_fallar(self):
+        if self._rng.random() < self.error_rate:
+            self.errors += 1
+            raise ConnectionError("falla simulada del proveedor")
+
+    def _responder(self, prompt: str):
+        if "Traduce la siguiente pregunta" in prompt:
+            pregunta = prompt.rsplit("Pregunta del usuario:", 1)[-1]
+            ubicacion = _UBICACION.search(pregunta)
+            if ubicacion:
+                return SQL_UBICACION.format(ubicacion.group(1).replace("'", "''")), self._latencia(self.sql_latency)
+            pregunta = pregunta.lower()
+            sql = next((s for clave, s in SQL_POR_TEMA if clave in pregunta), SQL_POR_DEFECTO)
+            return sql, self._latencia(self.sql_latency)
+        return self.answer, self._latencia(self.answer_latency)
+
+    def chat(self, prompt: str) -> str:
+        self.calls += 1
+        texto, espera = self._responder(prompt)
+        time.sleep(espera)
+        self._quizas_fallar()
+        registrar_uso(len(prompt) // 4, len(texto) // 4)
+        return texto
+
+    async def achat(self, prompt: str) -> str:
+        self.calls += 1
+        texto, espera = self._responder(prompt)
+        await asyncio.sleep(espera)
+        self._quizas_fallar()
+        registrar_uso(len(prompt) // 4, len(texto) // 4)
+        return texto
+
+    async def astream(self, prompt: str):
+        self.calls += 1
+        texto, espera = self._responder(prompt)
+        fragmentos = [texto[i:i + 40] for i in range(0, len(texto), 40)] or [""]
+        self._quizas_fallar()
+        for fragmento in fragmentos:
+            await asyncio.sleep(espera / len(fragmentos))
+            yield fragmento
+        registrar_uso(len(prompt) // 4, len(texto) // 4)
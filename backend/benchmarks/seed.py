@@ -0,0 +1,139 @@
+"""
+Datos sintéticos con volúmenes realistas para los benchmarks: docentes,
+cursos, asignaciones docente-curso, ubicaciones, FAQ y usuarios. Usa una
+semilla fija para que las corridas sean comparables.
+"""
+import random
+
+from sqlalchemy import insert
+
+from src.models import (
+    Curso,
+    Docente,
+    DocenteCursoInfo,
+    FuenteInformacion,
+    PreguntaFrecuente,
+    TipoUsuario,
+    Ubicacion,
+    Usuario,
+)
+
+NOMBRES = ["Ana", "Luis", "María", "José", "Carmen", "Jorge", "Rosa", "Carlos", "Elena", "Miguel", "Lucía", "Pedro"]
+APELLIDOS = ["Quispe", "Flores", "Rojas", "Huamán", "Torres", "Chávez", "Vargas", "Ramos", "Mendoza", "Castillo"]
+ESPECIALIDADES = ["Investigación de Operaciones", "Ingeniería de Software", "Estadística", "Finanzas",
+                  "Sistemas de Información", "Gestión de Operaciones", "Economía", "Base de Datos"]
+MATERIAS = ["Cálculo", "Física", "Programación", "Estadística", "Contabilidad", "Base de Datos", "Redes",
+            "Investigación Operativa", "Economía", "Simulación", "Ingeniería de Procesos", "Algoritmos"]
+TIPOS_UBICACION = ["aula", "laboratorio", "oficina", "auditorio", "biblioteca"]
+PABELLONES = ["A", "B", "C", "D", "Central"]
+TEMAS_FAQ = [
+    ("matrícula", "¿Cuándo es la matrícula de {x}?", "La matrícula de {x} se realiza en la semana indicada en el calendario académico."),
+    ("trámites", "¿Cómo solicito el {x}?", "El {x} se solicita en la plataforma INTRANET-UNI adjuntando el voucher de pago."),
+    ("horarios", "¿Cuál es el horario de atención de {x}?", "{x} atiende de lunes a viernes de 8:00 a 16:00."),
+]
+OBJETOS_FAQ = ["ingresantes", "rezagados", "certificado de estudios", "constancia de matrícula", "carnet universitario",
+               "biblioteca", "mesa de partes", "bienestar universitario", "la oficina de estadística", "retiro de curso"]
+
+
+def nombre_completo(rng: random.Random) -> str:
+    return f"{rng.choice(NOMBRES)} {rng.choice(NOMBRES)} {rng.choice(APELLIDOS)} {rng.choice(APELLIDOS)}"
+
+
+def sembrar(db, password_hash: str, docentes: int = 800, cursos: int = 300, asignaciones: int = 3000,
+            ubicaciones: int = 400, faqs: int = 200, usuarios: int = 500, seed: int = 7) -> dict:
+    """
+    Inserta los datos en la sesión `db` (con inserciones masivas) y devuelve
+    lo necesario para armar las peticiones: correos de usuarios, cursos,
+    docentes, ubicaciones y preguntas de FAQ.
+    """
+    rng = random.Random(seed)
+
+    db.execute(insert(TipoUsuario), [
+        {"id_tipo": 1, "nombre": "admin", "descripcion": "Administrador"},
+        {"id_tipo": 2, "nombre": "estudiante", "descripcion": "Estudiante"},
+    ])
+
+    filas_cursos = []
+    for i in range(cursos):
+        materia = MATERIAS[i % len(MATERIAS)]
+        filas_cursos.append({
+            "codigo_curso": f"{'CIMST'[i % 5]}{'BCE'[i % 3]}{100 + i}",
+            "nombre": f"{materia} {i // len(MATERIAS) + 1}",
+            "ciclo_sugerido": 1 + i % 10,
+        })
+    db.execute(insert(Curso), filas_cursos)
+
+    filas_docentes = []
+    for i in range(1, docentes + 1):
+        nombre = nombre_completo(rng)
+        filas_docentes.append({
+            "id_docente": i,
+            "nombres_completos": nombre,
+            "correo_institucional": f"docente{i}@uni.edu.pe",
+            "especialidad": rng.choice(ESPECIALIDADES),
+            "grado_academico": rng.choice(["Docente", "Magíster", "Doctor"]),
+        })
+    db.execute(insert(Docente), filas_docentes)
+
+    db.execute(insert(DocenteCursoInfo), [
+        {
+            "id_docente": rng.randint(1, docentes),
+            "codigo_curso": rng.choice(filas_cursos)["codigo_curso"],
+            "metodologia": "Clases teóricas con prácticas dirigidas y un proyecto final.",
+            "consejos": "Resolver los ejercicios de la semana antes de cada práctica.",
+            "estado_validacion": rng.choice(["validado", "validado", "pendiente"]),
+        }
+        for _ in range(asignaciones)
+    ])
+
+    filas_ubicaciones = []
+    for i in range(1, ubicaciones + 1):
+        tipo = TIPOS_UBICACION[i % len(TIPOS_UBICACION)]
+        pabellon = rng.choice(PABELLONES)
+        filas_ubicaciones.append({
+            "id_ubicacion": i,
+            "nombre": f"{tipo.capitalize()} {pabellon}{i}",
+            "tipo": tipo,
+            "pabellon": pabellon,
+            "piso": str(rng.randint(1, 4)),
+            "descripcion": f"{tipo.capitalize()} del pabellón {pabellon}.",
+            "referencia_llegada": "Subiendo por la escalera principal, a la derecha.",
+        })
+    db.execute(insert(Ubicacion), filas_ubicaciones)
+
+    db.execute(insert(FuenteInformacion), [{"id_fuente": 1, "titulo": "Reglamento académico", "tipo_origen": "manual"}])
+    filas_faq = []
+    for i in range(faqs):
+        categoria, pregunta, respuesta = TEMAS_FAQ[i % len(TEMAS_FAQ)]
+        objeto = OBJETOS_FAQ[(i // len(TEMAS_FAQ)) % len(OBJETOS_FAQ)]
+        sufijo = "" if i < len(TEMAS_FAQ) * len(OBJETOS_FAQ) else f" ({i})"
+        filas_faq.append({
+            "pregunta": pregunta.format(x=objeto) + sufijo,
+            "respuesta": respuesta.format(x=objeto),
+            "categoria": categoria,
+            "id_fuente": 1,
+        })
+    db.execute(insert(PreguntaFrecuente), filas_faq)
+
+    correos = [f"alumno{i}@uni.pe" for i in range(usuarios)]
+    db.execute(insert(Usuario), [
+        {
+            "codigo_uni": f"2024{i:05d}",
+            "nombre_completo": nombre_completo(rng),
+            "correo": correo,
+            "contrasenia": password_hash,
+            "estado": True,
+            "id_tipo_usuario": 2,
+        }
+        for i, correo in enumerate(correos)
+    ])
+    db.commit()
+
+    return {
+        "correos": correos,
+        "cursos": [c["codigo_curso"] for c in filas_cursos],
+        "nombres_cursos": [c["nombre"] for c in filas_cursos],
+        "docentes": [d["nombres_completos"] for d in filas_docentes],
+        "ubicaciones": [u["nombre"] for u in filas_ubicaciones],
+        "faqs": [f["pregunta"] for f in filas_faq],
+    }
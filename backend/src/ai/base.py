@@ -1,7 +1,116 @@
+import asyncio
+import time
 from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import AsyncIterator
+
+from src.observability.metrics import LLM_CALLS, LLM_TOKENS
+
+
+class UsoTokens:
+    """Tokens consumidos por las llamadas al modelo dentro de una petición."""
+
+    def __init__(self):
+        self.tokens_entrada = 0
+        self.tokens_salida = 0
+        self.llamadas = 0
+
+    @property
+    def total(self) -> int:
+        return self.tokens_entrada + self.tokens_salida
+
+
+_uso_actual: ContextVar = ContextVar("uso_tokens", default=None)
+
+
+def iniciar_conteo_tokens() -> UsoTokens:
+    """
+    Empieza a acumular el uso de tokens del contexto actual (la petición).
+    Las tareas e hilos lanzados después comparten el mismo acumulador.
+    """
+    uso = UsoTokens()
+    _uso_actual.set(uso)
+    return uso
+
+
+def registrar_uso(tokens_entrada: int, tokens_salida: int):
+    """Las plataformas llaman a esto con los metadatos de uso de cada respuesta."""
+    LLM_CALLS.inc()
+    LLM_TOKENS.inc(tokens_entrada or 0, kind="prompt")
+    LLM_TOKENS.inc(tokens_salida or 0, kind="completion")
+    uso = _uso_actual.get()
+    if uso is None:
+        return
+    uso.tokens_entrada += tokens_entrada or 0
+    uso.tokens_salida += tokens_salida or 0
+    uso.llamadas += 1
+
+
+class LimiteRPM:
+    """
+    Presupuesto de llamadas al modelo por minuto, repartido en turnos
+    regulares (sin ráfagas). Lo usan los lotes de preguntas para no agotar
+    la cuota del proveedor que comparten con el chat en vivo.
+    """
+
+    def __init__(self, rpm: float):
+        self.rpm = rpm
+        self.intervalo = 60.0 / rpm
+        self.llamadas = 0
+        self.esperas = 0
+        self.segundos_espera = 0.0
+        self._siguiente = 0.0
+
+    async def esperar(self) -> float:
+        """Espera el turno de la siguiente llamada y devuelve cuántos segundos esperó."""
+        ahora = time.monotonic()
+        turno = max(ahora, self._siguiente)
+        self._siguiente = turno + self.intervalo
+        self.llamadas += 1
+        espera = turno - ahora
+        if espera > 0:
+            self.esperas += 1
+            self.segundos_espera += espera
+            await asyncio.sleep(espera)
+        return espera
+
+    def stats(self) -> dict:
+        return {
+            "rpm": self.rpm,
+            "calls": self.llamadas,
+            "waits": self.esperas,
+            "wait_seconds": round(self.segundos_espera, 3),
+        }
+
+
+_limite_actual: ContextVar = ContextVar("limite_llm", default=None)
+
+
+def usar_limite_llm(limite: LimiteRPM | None):
+    """Las llamadas al modelo del contexto actual respetan `limite` (None = sin límite)."""
+    _limite_actual.set(limite)
+
+
+def limite_llm_actual() -> LimiteRPM | None:
+    return _limite_actual.get()
 
 
 class AIPlatform(ABC):
     @abstractmethod
     def chat(self, prompt: str) -> str:
         pass
+
+    async def achat(self, prompt: str) -> str:
+        """
+        Versión asíncrona de `chat`. Por defecto ejecuta `chat` en un hilo
+        para no bloquear el event loop; las plataformas con SDK asíncrono
+        deben sobrescribirla.
+        """
+        return await asyncio.to_thread(self.chat, prompt)
+
+    async def astream(self, prompt: str) -> AsyncIterator[str]:
+        """
+        Genera la respuesta por fragmentos a medida que el modelo la produce.
+        Por defecto entrega la respuesta completa en un solo fragmento.
+        """
+        yield await self.achat(prompt)
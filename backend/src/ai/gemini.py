@@ -1,20 +1,50 @@
 import os
-import google.generativeai as genai
-from .base import AIPlatform
+from .base import AIPlatform, registrar_uso
 
 
 class Gemini(AIPlatform):
-    def __init__(self, api_key: str, system_prompt: str = None):
+    def __init__(self, api_key: str, system_prompt: str = None, model_name: str = "gemini-2.5-flash",
+                 timeout: float = None):
         self.api_key = api_key
         self.system_prompt = system_prompt
+        self.model_name = model_name
+        # Plazo que aplica el propio cliente (además del de ResilientPlatform)
+        self.request_options = {"timeout": timeout} if timeout else None
+        # El SDK tarda cerca de un segundo en importarse: se carga al crear
+        # el cliente (en el arranque de la app), no al importar el módulo.
+        import google.generativeai as genai
+
         genai.configure(api_key=self.api_key)
 
         # See more models at: https://ai.google.dev/gemini-api/docs/models
-        self.model = genai.GenerativeModel("gemini-2.5-flash")
+        # El prompt de sistema va como system_instruction: no se vuelve a
+        # concatenar en cada llamada y el tamaño por turno no crece con él.
+        self.model = genai.GenerativeModel(
+            model_name, system_instruction=self.system_prompt or None
+        )
+
+    @staticmethod
+    def _registrar_uso(response):
+        meta = getattr(response, "usage_metadata", None)
+        if meta is not None:
+            registrar_uso(meta.prompt_token_count, meta.candidates_token_count)
 
     def chat(self, prompt: str) -> str:
-        if self.system_prompt:
-            prompt = f"{self.system_prompt}\n\n{prompt}"
+        response = self.model.generate_content(prompt, request_options=self.request_options)
+        self._registrar_uso(response)
+        return response.text
 
-        response = self.model.generate_content(prompt)
+    async def achat(self, prompt: str) -> str:
+        response = await self.model.generate_content_async(prompt, request_options=self.request_options)
+        self._registrar_uso(response)
         return response.text
+
+    async def astream(self, prompt: str):
+        response = await self.model.generate_content_async(
+            prompt, stream=True, request_options=self.request_options
+        )
+        async for chunk in response:
+            if chunk.parts:
+                yield chunk.text
+        # Con stream=True los metadatos de uso llegan con el último fragmento
+        self._registrar_uso(response)
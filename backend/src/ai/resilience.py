@@ -0,0 +1,292 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+
+from src.observability.metrics import REGISTRY, Counter
+
+from .base import AIPlatform, limite_llm_actual
+
+logger = logging.getLogger(__name__)
+
+try:
+    from google.api_core import exceptions as _google_exc  # type: ignore
+
+    _ERRORES_TRANSITORIOS = (
+        _google_exc.ServiceUnavailable,
+        _google_exc.ResourceExhausted,
+        _google_exc.DeadlineExceeded,
+        _google_exc.InternalServerError,
+        _google_exc.TooManyRequests,
+        _google_exc.BadGateway,
+        _google_exc.GatewayTimeout,
+    )
+except Exception:  # pragma: no cover
+    _ERRORES_TRANSITORIOS = ()
+
+LLM_RETRIES = REGISTRY.register(Counter(
+    "trikabot_llm_retries_total", "Reintentos de llamadas al LLM.", ("step",),
+))
+LLM_HEDGES = REGISTRY.register(Counter(
+    "trikabot_llm_hedges_total", "Llamadas duplicadas (hedging) lanzadas y ganadas.", ("step", "outcome"),
+))
+LLM_FAILURES = REGISTRY.register(Counter(
+    "trikabot_llm_failures_total", "Llamadas al LLM fallidas por motivo.", ("step", "reason"),
+))
+
+
+class LLMNoDisponible(Exception):
+    """El circuito está abierto: se falla rápido sin llamar al proveedor."""
+
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+        super().__init__(f"El servicio de IA no está disponible; reintenta en {retry_after:.0f}s.")
+
+
+def es_reintentable(error: Exception) -> bool:
+    return isinstance(error, (asyncio.TimeoutError, ConnectionError) + _ERRORES_TRANSITORIOS)
+
+
+class CircuitBreaker:
+    """
+    Tras `threshold` fallas seguidas el circuito se abre por `cooldown`
+    segundos; luego deja pasar una sola llamada de prueba (semiabierto) y
+    se cierra si sale bien.
+    """
+
+    def __init__(self, threshold: int = 5, cooldown: float = 30.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.fallas = 0
+        self.abierto_hasta = 0.0
+        self._probando = False
+        self.aperturas = 0
+
+    @property
+    def estado(self) -> str:
+        if self.fallas < self.threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.abierto_hasta else "half_open"
+
+    def permitir(self) -> bool:
+        """
+        Lanza LLMNoDisponible si el circuito no deja pasar la llamada.
+        Devuelve True si la llamada es la de prueba: quien la hace debe
+        cerrarla con `cerrar_prueba` pase lo que pase.
+        """
+        estado = self.estado
+        if estado == "open" or (estado == "half_open" and self._probando):
+            raise LLMNoDisponible(max(self.abierto_hasta - time.monotonic(), 1.0))
+        if estado == "half_open":
+            self._probando = True
+            return True
+        return False
+
+    def cerrar_prueba(self, error: BaseException = None):
+        """
+        Registra el resultado de la llamada de prueba si nadie lo hizo
+        todavía. Un error no transitorio (p. ej. una respuesta bloqueada)
+        prueba que el proveedor responde; una cancelación no prueba nada y
+        cuenta como falla, así el circuito no queda trabado en "probando".
+        """
+        if not self._probando:
+            return
+        if isinstance(error, Exception) and not es_reintentable(error):
+            self.exito()
+        else:
+            self.falla()
+
+    def exito(self):
+        self.fallas = 0
+        self._probando = False
+
+    def falla(self):
+        self.fallas += 1
+        self._probando = False
+        if self.fallas >= self.threshold:
+            if self.fallas == self.threshold:
+                self.aperturas += 1
+            self.abierto_hasta = time.monotonic() + self.cooldown
+
+
+class ResilientPlatform(AIPlatform):
+    """
+    Envuelve una plataforma con controles de latencia de cola:
+
+    - plazo por llamada (`timeout`) y reintentos acotados con backoff
+      exponencial y jitter completo, sólo para errores transitorios y sin
+      pasarse de `total_deadline`;
+    - hedging opcional: si la llamada tarda más que el p95 observado (nunca
+      menos de `hedge_min_delay`), se lanza un duplicado y gana el primero;
+    - circuit breaker: con el proveedor caído se falla de inmediato con
+      LLMNoDisponible en vez de ocupar la petición hasta el timeout.
+
+    Si el contexto tiene un presupuesto de llamadas por minuto
+    (`usar_limite_llm`), cada intento espera su turno antes de salir.
+    """
+
+    def __init__(self, inner: AIPlatform, step: str, timeout: float = 20.0, max_retries: int = 2,
+                 retry_base_delay: float = 0.5, retry_max_delay: float = 4.0, total_deadline: float = 45.0,
+                 hedge: bool = False, hedge_min_delay: float = 1.0, hedge_percentile: float = 0.95,
+                 breaker: CircuitBreaker = None):
+        self.inner = inner
+        self.step = step
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.total_deadline = total_deadline
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self._latencias = deque(maxlen=200)  # segundos de llamadas exitosas
+
+    # --- Hedging ---
+
+    def hedge_delay(self) -> float:
+        if len(self._latencias) < 20:
+            return max(self.hedge_min_delay, self.timeout / 2)
+        ordenadas = sorted(self._latencias)
+        p = ordenadas[min(len(ordenadas) - 1, int(self.hedge_percentile * len(ordenadas)))]
+        return max(self.hedge_min_delay, p)
+
+    async def _con_hedging(self, prompt: str, timeout: float) -> str:
+        # Con un presupuesto de llamadas por minuto (lotes) no se duplican llamadas
+        if not self.hedge or limite_llm_actual() is not None:
+            return await asyncio.wait_for(self.inner.achat(prompt), timeout)
+
+        async def con_plazo():
+            return await asyncio.wait_for(self.inner.achat(prompt), timeout)
+
+        primera = asyncio.ensure_future(con_plazo())
+        tareas = {primera}
+        try:
+            hechas, _ = await asyncio.wait(tareas, timeout=min(self.hedge_delay(), timeout))
+            if not hechas:
+                LLM_HEDGES.inc(step=self.step, outcome="fired")
+                tareas.add(asyncio.ensure_future(con_plazo()))
+            # Gana la primera respuesta exitosa; si ambas fallan, el último error
+            pendientes, error = set(tareas), None
+            while pendientes:
+                hechas, pendientes = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in hechas:
+                    if tarea.exception() is None:
+                        if tarea is not primera:
+                            LLM_HEDGES.inc(step=self.step, outcome="won")
+                        return tarea.result()
+                    error = tarea.exception()
+            raise error
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    # --- Interfaz AIPlatform ---
+
+    async def achat(self, prompt: str) -> str:
+        prueba = self.breaker.permitir()
+        error = None
+        try:
+            return await self._achat(prompt)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            if prueba:
+                self.breaker.cerrar_prueba(error)
+
+    async def _achat(self, prompt: str) -> str:
+        limite = time.monotonic() + self.total_deadline
+        presupuesto = limite_llm_actual()
+        intento = 0
+        while True:
+            if presupuesto is not None:
+                # La espera por cupo no cuenta contra el plazo total
+                limite += await presupuesto.esperar()
+            restante = limite - time.monotonic()
+            inicio = time.perf_counter()
+            try:
+                respuesta = await self._con_hedging(prompt, min(self.timeout, restante))
+            except Exception as e:
+                motivo = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+                LLM_FAILURES.inc(step=self.step, reason=motivo)
+                if not es_reintentable(e):
+                    raise
+                self.breaker.falla()
+                espera = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** intento))
+                if intento >= self.max_retries or limite - time.monotonic() - espera <= 0 or self.breaker.estado == "open":
+                    raise
+                intento += 1
+                LLM_RETRIES.inc(step=self.step)
+                logger.warning("LLM (%s) falló con %s; reintento %d en %.2fs", self.step, motivo, intento, espera)
+                await asyncio.sleep(espera)
+                continue
+            self._latencias.append(time.perf_counter() - inicio)
+            self.breaker.exito()
+            return respuesta
+
+    def chat(self, prompt: str) -> str:
+        prueba = self.breaker.permitir()
+        error = None
+        try:
+            respuesta = self.inner.chat(prompt)
+        except BaseException as e:
+            error = e
+            if isinstance(e, Exception) and es_reintentable(e):
+                self.breaker.falla()
+            raise
+        else:
+            self.breaker.exito()
+        finally:
+            if prueba:
+                self.breaker.cerrar_prueba(error)
+        return respuesta
+
+    async def astream(self, prompt: str):
+        """
+        Sin hedging ni reintentos (el texto ya enviado no se puede retirar),
+        pero con plazo para cada fragmento y registro en el breaker.
+        """
+        prueba = self.breaker.permitir()
+        error = None
+        fragmentos = None
+        try:
+            presupuesto = limite_llm_actual()
+            if presupuesto is not None:
+                await presupuesto.esperar()
+            fragmentos = self.inner.astream(prompt).__aiter__()
+            while True:
+                try:
+                    fragmento = await asyncio.wait_for(fragmentos.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    break
+                if prueba:
+                    # El primer fragmento ya prueba que el proveedor responde
+                    self.breaker.exito()
+                    prueba = False
+                yield fragmento
+            self.breaker.exito()
+        except BaseException as e:
+            error = e
+            if isinstance(e, Exception):
+                LLM_FAILURES.inc(step=self.step, reason="timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__)
+                if es_reintentable(e):
+                    self.breaker.falla()
+            raise
+        finally:
+            if prueba:
+                self.breaker.cerrar_prueba(error)
+            if fragmentos is not None:
+                await fragmentos.aclose()
+
+    def stats(self) -> dict:
+        return {
+            "model": getattr(self.inner, "model_name", None),
+            "step": self.step,
+            "circuit": self.breaker.estado,
+            "consecutive_failures": self.breaker.fallas,
+            "circuit_opens": self.breaker.aperturas,
+            "hedging": self.hedge,
+            "hedge_delay_s": round(self.hedge_delay(), 3),
+        }
@@ -0,0 +1,172 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+
+from src.models import Usuario
+
+
+class TokenCache:
+    """
+    Claims de los JWT ya verificados, por hash del token (el token en claro
+    no se guarda). Una entrada vive hasta el `exp` del token, así que un
+    token vencido nunca se acepta desde la caché; los tokens sin `exp` no
+    se guardan. Acotada a `max_size` entradas (LRU).
+    """
+
+    def __init__(self, max_size: int = 10_000):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # sha256(token) -> (claims, exp)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _clave(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        clave = self._clave(token)
+        with self._lock:
+            item = self._data.get(clave)
+            if item is None:
+                self.misses += 1
+                return None
+            claims, exp = item
+            if exp <= time.time():
+                del self._data[clave]
+                self.misses += 1
+                return None
+            self._data.move_to_end(clave)
+            self.hits += 1
+            return claims
+
+    def set(self, token: str, claims: dict):
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return
+        with self._lock:
+            self._data[self._clave(token)] = (claims, exp)
+            self._data.move_to_end(self._clave(token))
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# UserCache.get sin entrada vigente (None es un valor válido: "no hay usuario activo")
+SIN_ENTRADA = object()
+
+
+class UserCache:
+    """
+    Identidad (Principal) de cada usuario por correo, por `ttl` segundos.
+    Guarda también los "no encontrado/inactivo" (None) para que un token
+    válido de una cuenta dada de baja no consulte la base en cada petición.
+    Las escrituras a `usuarios` hechas con el ORM de este proceso invalidan
+    la entrada al confirmarse (ver `instalar_invalidacion`); en otros
+    workers el cambio se ve, a más tardar, al vencer el ttl.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_size: int = 10_000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.generacion = 0  # sube con cada invalidación
+        self._data = OrderedDict()  # correo -> (principal o None, vence)
+        self._lock = threading.Lock()
+
+    def get(self, correo: str):
+        """Devuelve el Principal (o None) guardado, o SIN_ENTRADA si no hay entrada vigente."""
+        with self._lock:
+            item = self._data.get(correo)
+            if item is None or item[1] <= time.monotonic():
+                self._data.pop(correo, None)
+                self.misses += 1
+                return SIN_ENTRADA
+            self._data.move_to_end(correo)
+            self.hits += 1
+            return item[0]
+
+    def set(self, correo: str, principal, generacion: int = None):
+        """
+        Con `generacion` (leída antes de consultar la base) no se guarda
+        nada si hubo una invalidación mientras tanto: el dato puede ser viejo.
+        """
+        with self._lock:
+            if generacion is not None and generacion != self.generacion:
+                return
+            self._data[correo] = (principal, time.monotonic() + self.ttl)
+            self._data.move_to_end(correo)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidar(self, correos):
+        with self._lock:
+            self.generacion += 1
+            for correo in correos:
+                if self._data.pop(correo, None) is not None:
+                    self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def instalar_invalidacion(session_factory, cache: UserCache):
+    """
+    Invalida la identidad de los usuarios creados, modificados (estado,
+    rol, correo...) o borrados con el ORM cuando la escritura se confirma.
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def _anotar_usuarios(session, flush_context):
+        correos = session.info.setdefault("usuarios_modificados", set())
+        for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+            if isinstance(obj, Usuario):
+                correos.add(obj.correo)
+                # Si cambió el correo, el anterior tampoco debe seguir en caché
+                correos.update(inspect(obj).attrs.correo.history.deleted or ())
+
+    @event.listens_for(session_factory, "after_commit")
+    def _invalidar(session):
+        correos = session.info.pop("usuarios_modificados", None)
+        if correos:
+            cache.invalidar(correos)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _descartar(session):
+        session.info.pop("usuarios_modificados", None)
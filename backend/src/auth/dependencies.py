@@ -1,28 +1,122 @@
+import os
+from dataclasses import dataclass
 from typing import Optional
+
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 
+from src.database import SessionLocal
+from src.models import Usuario
+from .cache import SIN_ENTRADA, TokenCache, UserCache
+
 SECRET_KEY = "a-string-secret-at-least-256-bits-long"
 ALGORITHM = "HS256"
 
+# Tokens ya verificados (hasta su exp) e identidades de usuario (ttl corto)
+AUTH_TOKEN_CACHE_MAX = int(os.getenv("AUTH_TOKEN_CACHE_MAX", "10000"))
+AUTH_USER_CACHE_TTL = float(os.getenv("AUTH_USER_CACHE_TTL", "60"))
+AUTH_USER_CACHE_MAX = int(os.getenv("AUTH_USER_CACHE_MAX", "10000"))
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token", auto_error=False)
+token_cache = TokenCache(max_size=AUTH_TOKEN_CACHE_MAX)
+user_cache = UserCache(ttl=AUTH_USER_CACHE_TTL, max_size=AUTH_USER_CACHE_MAX)
 
 
-async def get_user_identifier(token: Optional[str] = Depends(oauth2_scheme)):
-    if token is None:
-        return "global_unauthenticated_user"
+@dataclass(frozen=True)
+class Principal:
+    """Identidad del usuario autenticado: lo que necesitan los endpoints."""
+    id: int
+    email: str
+    role: str
+    id_tipo_usuario: Optional[int] = None
+
+
+# Identificador de quien llama sin token (el límite de tasa lo cuenta por IP)
+ANONYMOUS_USER = "global_unauthenticated_user"
 
-    credentials_exception = HTTPException(
+
+def rol_de(id_tipo_usuario: Optional[int]) -> str:
+    return "admin" if id_tipo_usuario == 1 else "student"
+
+
+def _credenciales_invalidas() -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+
+def verificar_token(token: str) -> dict:
+    """
+    Claims del JWT. La firma y el exp se verifican una sola vez por token;
+    después se responde desde la caché hasta que el token vence.
+    Lanza JWTError si el token no es válido.
+    """
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        token_cache.set(token, claims)
+    return claims
+
+
+def cargar_principal(email: str) -> Optional[Principal]:
+    """Busca al usuario activo con ese correo (bloqueante: usa la base)."""
+    with SessionLocal() as db:
+        fila = (
+            db.query(Usuario.id_usuario, Usuario.correo, Usuario.id_tipo_usuario)
+            .filter(Usuario.correo == email, Usuario.estado.is_not(False))
+            .first()
+        )
+    if fila is None:
+        return None
+    return Principal(id=fila.id_usuario, email=fila.correo, role=rol_de(fila.id_tipo_usuario),
+                     id_tipo_usuario=fila.id_tipo_usuario)
+
+
+async def get_user_identifier(token: Optional[str] = Depends(oauth2_scheme)):
+    if token is None:
+        return ANONYMOUS_USER
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
+        username: str = verificar_token(token).get("sub")
     except JWTError:
-        raise credentials_exception
+        raise _credenciales_invalidas()
+    if username is None:
+        raise _credenciales_invalidas()
     return username
+
+
+async def get_current_principal(token: Optional[str] = Depends(oauth2_scheme)) -> Principal:
+    """
+    Dependencia para endpoints autenticados: devuelve el Principal del
+    token. Con las cachés calientes no hay criptografía ni consulta a la
+    base; un usuario inactivo o inexistente recibe 401.
+    """
+    if token is None:
+        raise _credenciales_invalidas()
+    email = await get_user_identifier(token)
+    principal = user_cache.get(email)
+    if principal is SIN_ENTRADA:
+        generacion = user_cache.generacion
+        principal = await run_in_threadpool(cargar_principal, email)
+        user_cache.set(email, principal, generacion)
+    if principal is None:
+        raise _credenciales_invalidas()
+    return principal
+
+
+async def get_optional_principal(token: Optional[str] = Depends(oauth2_scheme)) -> Optional[Principal]:
+    """Como get_current_principal, pero sin token devuelve None en vez de 401."""
+    if token is None:
+        return None
+    return await get_current_principal(token)
+
+
+async def get_current_admin(principal: Principal = Depends(get_current_principal)) -> Principal:
+    """Como get_current_principal, pero sólo para administradores (403 si no lo es)."""
+    if principal.role != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return principal
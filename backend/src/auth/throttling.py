@@ -1,46 +1,237 @@
+import math
+import os
+import threading
 import time
-from collections import defaultdict
+from collections import OrderedDict
+from dataclasses import dataclass
 
-from fastapi import HTTPException, status
+from fastapi import Depends, Form, HTTPException, Request, Response, status
 
-# --- Constants ---
+from .dependencies import ANONYMOUS_USER, get_user_identifier
+
+# --- Constants (overridable from the environment) ---
 # For authenticated users
-AUTH_RATE_LIMIT = 5
-AUTH_TIME_WINDOW_SECONDS = 60
+AUTH_RATE_LIMIT = int(os.getenv("AUTH_RATE_LIMIT", "5"))
+AUTH_TIME_WINDOW_SECONDS = int(os.getenv("AUTH_TIME_WINDOW_SECONDS", "60"))
+
+# For unauthenticated users, per client IP
+GLOBAL_RATE_LIMIT = int(os.getenv("GLOBAL_RATE_LIMIT", "300"))
+GLOBAL_TIME_WINDOW_SECONDS = int(os.getenv("GLOBAL_TIME_WINDOW_SECONDS", "60"))
+
+# For POST /token: per username (password guessing) and per IP (spraying)
+LOGIN_RATE_LIMIT = int(os.getenv("LOGIN_RATE_LIMIT", "10"))
+LOGIN_IP_RATE_LIMIT = int(os.getenv("LOGIN_IP_RATE_LIMIT", "50"))
+LOGIN_TIME_WINDOW_SECONDS = int(os.getenv("LOGIN_TIME_WINDOW_SECONDS", "300"))
+
+# Maximum number of counters kept by the in-memory backend
+MEMORY_BACKEND_MAX_KEYS = 100_000
+
+
+# --- Storage backends ---
+# A backend only needs two operations on integer counters that expire:
+# `incr(key, ttl, other)`, which increments `key` and reads `other` in one
+# atomic step, and `decr(key)`. Counters live for two windows, which is all
+# the sliding-window-counter algorithm looks at.
+
+class MemoryBackend:
+    """
+    Per-process counters. Expired keys are swept a few at a time on every
+    call and the number of keys is bounded (LRU), so idle users do not
+    accumulate. Also used as a stand-in for Redis in tests.
+    """
+
+    SWEEP_PER_CALL = 8
+
+    def __init__(self, max_keys: int = MEMORY_BACKEND_MAX_KEYS):
+        self.max_keys = max_keys
+        self._data = OrderedDict()  # key -> [count, expires_at]
+        self._lock = threading.Lock()
+
+    def _sweep(self, now: float):
+        for _ in range(self.SWEEP_PER_CALL):
+            if not self._data:
+                return
+            key, (_, expires_at) = next(iter(self._data.items()))
+            if expires_at > now:
+                return
+            del self._data[key]
+
+    def incr(self, key: str, ttl: int, other: str) -> tuple:
+        """Increments `key` and returns (its new value, the value of `other`)."""
+        now = time.monotonic()
+        with self._lock:
+            self._sweep(now)
+            item = self._data.get(key)
+            if item is None or item[1] <= now:
+                item = [0, now + ttl]
+                self._data[key] = item
+            self._data.move_to_end(key)
+            item[0] += 1
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+            previous = self._data.get(other)
+            return item[0], previous[0] if previous and previous[1] > now else 0
+
+    def decr(self, key: str):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[0] > 0:
+                item[0] -= 1
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisBackend:
+    """
+    Counters shared by every worker, stored in a Redis-compatible server.
+    `client` is any object with the redis-py `pipeline()`/`decr()` API.
+    """
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+
+    @classmethod
+    def from_url(cls, url: str):
+        import redis  # optional dependency, only needed for this backend
+
+        return cls(redis.Redis.from_url(url))
+
+    def incr(self, key: str, ttl: int, other: str) -> tuple:
+        # The pipeline runs as a MULTI/EXEC transaction: no other worker's
+        # increment can land between these commands
+        pipe = self.client.pipeline(transaction=True)
+        pipe.incr(self.prefix + key)
+        pipe.expire(self.prefix + key, ttl)
+        pipe.get(self.prefix + other)
+        count, _, previous = pipe.execute()
+        return int(count), int(previous or 0)
+
+    def decr(self, key: str):
+        self.client.decr(self.prefix + key)
 
-# For unauthenticated "global" users
-GLOBAL_RATE_LIMIT = 300
-GLOBAL_TIME_WINDOW_SECONDS = 60
 
-# --- In-memory storage for user requests ---
-user_requests = defaultdict(list)
+# --- Sliding window counter ---
 
+@dataclass
+class RateLimitDecision:
+    allowed: bool
+    limit: int
+    remaining: int
+    reset_seconds: int  # seconds until the current window ends
+    retry_after: int = 0  # seconds to wait when not allowed
 
-# --- Throttling dependency ---
-def apply_rate_limit(user_id: str):
-    current_time = time.time()
+    def headers(self) -> dict:
+        headers = {
+            "RateLimit-Limit": str(self.limit),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(self.reset_seconds),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(self.retry_after)
+        return headers
 
-    if user_id == "global_unauthenticated_user":
-        rate_limit = GLOBAL_RATE_LIMIT
-        time_window = GLOBAL_TIME_WINDOW_SECONDS
-    else:
-        rate_limit = AUTH_RATE_LIMIT
-        time_window = AUTH_TIME_WINDOW_SECONDS
 
-    # Filter out requests older than the time window
-    user_requests[user_id] = [
-        t for t in user_requests[user_id] if t > current_time - time_window
-    ]
+class RateLimiter:
+    """
+    Sliding-window-counter limiter: the number of requests in the last
+    `window` seconds is estimated as
+        current_window_count + previous_window_count * (1 - elapsed / window)
+    which needs two counters per user and constant time per check.
 
-    if len(user_requests[user_id]) >= rate_limit:
+    The current counter is incremented before deciding, so concurrent
+    requests (threads or workers sharing Redis) each see the others'
+    increments and at most `limit` get through. A rejected request gives
+    its increment back.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def hit(self, user_id: str, limit: int, window: int, now: float = None) -> RateLimitDecision:
+        now = time.time() if now is None else now
+        current = int(now // window)
+        elapsed = now - current * window
+        key_current = f"{user_id}:{window}:{current}"
+        key_previous = f"{user_id}:{window}:{current - 1}"
+
+        current_count, previous_count = self.backend.incr(key_current, 2 * window, key_previous)
+        weight = 1 - elapsed / window
+        estimated = previous_count * weight + current_count
+        reset_seconds = math.ceil(window - elapsed)
+
+        if estimated > limit:
+            self.backend.decr(key_current)
+            current_count -= 1
+            # Time until the previous window's weight lets one more request in
+            if previous_count and current_count < limit:
+                needed = 1 - (limit - current_count - 1) / previous_count
+                retry_after = max(1, math.ceil(needed * window - elapsed))
+            else:
+                retry_after = reset_seconds
+            return RateLimitDecision(False, limit, 0, reset_seconds, min(retry_after, window))
+
+        remaining = max(0, math.floor(limit - previous_count * weight - current_count))
+        return RateLimitDecision(True, limit, remaining, reset_seconds)
+
+
+def _default_backend():
+    redis_url = os.getenv("RATE_LIMIT_REDIS_URL")
+    if redis_url:
+        return RedisBackend.from_url(redis_url)
+    return MemoryBackend()
+
+
+limiter = RateLimiter(_default_backend())
+
+
+def client_ip(request: Request) -> str:
+    # Behind a proxy, run uvicorn with --proxy-headers so this is the real client
+    return request.client.host if request.client else "unknown"
+
+
+def limits_for(user_id: str):
+    if user_id.startswith("ip:"):
+        return GLOBAL_RATE_LIMIT, GLOBAL_TIME_WINDOW_SECONDS
+    return AUTH_RATE_LIMIT, AUTH_TIME_WINDOW_SECONDS
+
+
+# --- Throttling dependencies ---
+def _check(key: str, rate_limit: int, time_window: int) -> RateLimitDecision:
+    decision = limiter.hit(key, rate_limit, time_window)
+    if not decision.allowed:
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail="Too many requests. Please try again later.",
+            headers=decision.headers(),
         )
-    else:
-        # For debugging: print current usage
-        current_usage = len(user_requests[user_id])
-        print(f"User {user_id}: {current_usage + 1}/{rate_limit} requests used.")
+    return decision
+
+
+def apply_rate_limit(user_id: str) -> RateLimitDecision:
+    rate_limit, time_window = limits_for(user_id)
+    return _check(user_id, rate_limit, time_window)
+
+
+def rate_limited(request: Request, response: Response, user_id: str = Depends(get_user_identifier)) -> str:
+    """
+    FastAPI dependency: applies the limit to the current user (anonymous
+    callers are counted per IP) and adds the RateLimit-* headers to the
+    response. Returns the user identifier.
+    """
+    key = f"ip:{client_ip(request)}" if user_id == ANONYMOUS_USER else user_id
+    decision = apply_rate_limit(key)
+    response.headers.update(decision.headers())
+    return user_id
+
 
-    user_requests[user_id].append(current_time)
-    return True
+def login_rate_limited(request: Request, response: Response, username: str = Form(...)):
+    """
+    FastAPI dependency for POST /token: its own budget per username and
+    per IP, so logins neither share the chat quota nor lock out everyone
+    else when one account or one address is being hammered.
+    """
+    por_ip = _check(f"login-ip:{client_ip(request)}", LOGIN_IP_RATE_LIMIT, LOGIN_TIME_WINDOW_SECONDS)
+    por_usuario = _check(f"login:{username.strip().lower()}", LOGIN_RATE_LIMIT, LOGIN_TIME_WINDOW_SECONDS)
+    response.headers.update(min(por_ip, por_usuario, key=lambda d: d.remaining).headers())
@@ -0,0 +1,125 @@
+"""
+Corre un lote de preguntas por el pipeline del chat (texto -> SQL ->
+datos -> respuesta) y guarda el resultado de cada una en JSONL.
+
+Uso (desde backend/):
+    python -m src.batch preguntas.jsonl -o resultados.jsonl
+    python -m src.batch preguntas.jsonl --refresh --baseline resultados_anteriores.jsonl
+    python -m src.batch preguntas.jsonl --url http://localhost:8000 --rpm 30
+
+Cada línea de entrada es {"id": ..., "prompt": "..."} (o sólo el texto
+entre comillas). Sin --url el pipeline corre en este proceso con la
+configuración del .env (útil tras editar src/prompts/*.md); con --url el
+archivo se envía a POST /chat/batch de una API en ejecución, cuyas cachés
+quedan calientes (requiere el token de un administrador: --token o la
+variable TRIKABOT_ADMIN_TOKEN). La API corre el lote en segundo plano y
+aquí se consulta su avance cada --poll segundos. --refresh vuelve a generar el SQL con el LLM aunque esté
+en caché, y --baseline lista las preguntas cuyo SQL cambió respecto de una
+corrida anterior.
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+
+async def correr_local(preguntas: list, args) -> dict:
+    from src import main
+    from .runner import ejecutar_lote
+
+    async with main.app.router.lifespan_context(main.app):
+        return await ejecutar_lote(
+            preguntas,
+            lambda prompt: main.responder_pregunta_lote(prompt, refrescar=args.refresh),
+            concurrency=args.concurrency,
+            rpm=args.rpm,
+        )
+
+
+def correr_remoto(args) -> dict:
+    import requests
+
+    url = args.url.rstrip("/")
+    headers = {"Authorization": f"Bearer {args.token}"}
+    with open(args.archivo, "rb") as archivo:
+        respuesta = requests.post(
+            url + "/chat/batch",
+            params={"concurrency": args.concurrency, "rpm": args.rpm, "refresh": str(args.refresh).lower()},
+            files={"archivo": (args.archivo, archivo, "application/x-ndjson")},
+            headers=headers,
+            timeout=60,
+        )
+    respuesta.raise_for_status()
+    lote = respuesta.json()
+    print(f"Lote {lote['job_id']}: {lote['unique']} preguntas distintas", file=sys.stderr)
+    while True:
+        time.sleep(args.poll)
+        respuesta = requests.get(url + lote["status_url"], headers=headers, timeout=60)
+        respuesta.raise_for_status()
+        estado = respuesta.json()
+        print(f"  {estado['status']}: {estado['done']}/{estado['unique']}", file=sys.stderr)
+        if estado["status"] == "done":
+            return {"summary": estado["summary"], "results": estado["results"]}
+        if estado["status"] != "running":
+            sys.exit(f"El lote terminó como {estado['status']}: {estado.get('error') or ''}")
+
+
+def comparar(resultados: list, ruta_base: str) -> list:
+    """Preguntas cuyo SQL difiere del de una corrida anterior (mismo texto)."""
+    with open(ruta_base, encoding="utf-8") as archivo:
+        anteriores = {r["prompt"]: r.get("sql") for r in map(json.loads, filter(str.strip, archivo))}
+    return [
+        {"prompt": r["prompt"], "before": anteriores[r["prompt"]], "after": r.get("sql")}
+        for r in resultados
+        if r["prompt"] in anteriores and anteriores[r["prompt"]] != r.get("sql")
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("archivo", help="JSONL de preguntas")
+    parser.add_argument("-o", "--output", help="JSONL con el resultado de cada pregunta")
+    parser.add_argument("--concurrency", type=int, default=4, help="preguntas en curso a la vez")
+    parser.add_argument("--rpm", type=float, default=60, help="llamadas al LLM por minuto (0 = sin límite)")
+    parser.add_argument("--refresh", action="store_true", help="regenera el SQL aunque esté en caché o plantilla")
+    parser.add_argument("--url", help="API en ejecución a la que enviar el lote")
+    parser.add_argument("--token", default=os.getenv("TRIKABOT_ADMIN_TOKEN"),
+                        help="token de un administrador para --url (por defecto, TRIKABOT_ADMIN_TOKEN)")
+    parser.add_argument("--poll", type=float, default=5, help="segundos entre consultas del avance con --url")
+    parser.add_argument("--baseline", help="resultados de una corrida anterior para comparar el SQL")
+    args = parser.parse_args()
+    if args.url and not args.token:
+        parser.error("--url requiere un token de administrador (--token o TRIKABOT_ADMIN_TOKEN)")
+
+    if args.url:
+        reporte = correr_remoto(args)
+    else:
+        from .runner import leer_preguntas
+
+        with open(args.archivo, encoding="utf-8-sig") as archivo:
+            preguntas, invalidas = leer_preguntas(archivo)
+        if not preguntas:
+            sys.exit("El archivo no tiene preguntas")
+        reporte = asyncio.run(correr_local(preguntas, args))
+        reporte["summary"]["invalid_lines"] = invalidas
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as salida:
+            for resultado in reporte["results"]:
+                salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    resumen = reporte["summary"]
+    print(json.dumps(resumen, ensure_ascii=False, indent=2))
+    for resultado in reporte["results"]:
+        if resultado.get("source") == "error":
+            print(f"  ERROR {resultado['ids']}: {resultado.get('error')}", file=sys.stderr)
+    if args.baseline:
+        cambios = comparar(reporte["results"], args.baseline)
+        print(f"{len(cambios)} preguntas con SQL distinto a {args.baseline}")
+        for cambio in cambios:
+            print(f"- {cambio['prompt']}\n    antes:   {cambio['before']}\n    después: {cambio['after']}")
+
+
+if __name__ == "__main__":
+    main()
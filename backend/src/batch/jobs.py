@@ -0,0 +1,135 @@
+"""
+Lotes de preguntas como trabajos en segundo plano.
+
+POST /chat/batch sólo lanza el lote y devuelve su id; el lote corre en una
+tarea del worker que lo recibió y guarda su avance en `lotes_chat` cada
+`flush_interval` segundos, así cualquier worker responde GET
+/chat/batch/{id} y un corte de la conexión no pierde nada.
+"""
+import asyncio
+import json
+import logging
+import uuid
+
+from src.models import LoteChat
+
+from .runner import deduplicar, ejecutar_lote
+
+logger = logging.getLogger(__name__)
+
+
+def _json(valor) -> str:
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+class BatchJobs:
+    """Lanza lotes, guarda su avance y los detiene con el worker."""
+
+    def __init__(self, session_factory, flush_interval: float = 5.0):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self._tareas = {}  # id_lote -> asyncio.Task
+        self.launched = 0
+        self.finished = 0
+        self.failed = 0
+
+    async def lanzar(self, preguntas: list, invalidas: list, responder, concurrency: int, rpm: float,
+                     id_usuario: int | None = None) -> dict:
+        """Registra el lote, lo arranca en segundo plano y devuelve su estado inicial."""
+        id_lote = uuid.uuid4().hex
+        unicas = len(deduplicar(preguntas))
+        await asyncio.to_thread(self._guardar, LoteChat(
+            id_lote=id_lote, id_usuario=id_usuario, estado="running",
+            preguntas=len(preguntas), unicas=unicas, hechas=0,
+        ))
+        tarea = asyncio.create_task(self._correr(id_lote, preguntas, invalidas, responder, concurrency, rpm))
+        self._tareas[id_lote] = tarea
+        tarea.add_done_callback(lambda _: self._tareas.pop(id_lote, None))
+        self.launched += 1
+        return {"job_id": id_lote, "status": "running", "questions": len(preguntas), "unique": unicas}
+
+    async def _correr(self, id_lote: str, preguntas: list, invalidas: list, responder, concurrency: int, rpm: float):
+        resultados = []
+        fin = asyncio.Event()
+
+        async def guardar_avance():
+            # No se cancela: se espera a que termine su escritura para que no
+            # pise la final
+            while not fin.is_set():
+                try:
+                    await asyncio.wait_for(fin.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(self._actualizar, id_lote, hechas=len(resultados),
+                                            resultados=_json(resultados))
+
+        avance = asyncio.create_task(guardar_avance())
+
+        async def detener_avance():
+            fin.set()
+            await avance
+
+        try:
+            reporte = await ejecutar_lote(preguntas, responder, concurrency=concurrency, rpm=rpm,
+                                          al_terminar=resultados.append)
+            reporte["summary"]["invalid_lines"] = invalidas
+        except asyncio.CancelledError:
+            # El worker se detiene: queda lo hecho hasta aquí
+            await detener_avance()
+            await asyncio.to_thread(self._actualizar, id_lote, estado="interrupted", hechas=len(resultados),
+                                    resultados=_json(resultados))
+            raise
+        except Exception as e:
+            await detener_avance()
+            logger.exception("Falló el lote %s", id_lote)
+            self.failed += 1
+            await asyncio.to_thread(self._actualizar, id_lote, estado="failed", error=str(e),
+                                    hechas=len(resultados), resultados=_json(resultados))
+            return
+        await detener_avance()
+        self.finished += 1
+        await asyncio.to_thread(self._actualizar, id_lote, estado="done", hechas=len(reporte["results"]),
+                                resultados=_json(reporte["results"]), resumen=_json(reporte["summary"]))
+
+    def _guardar(self, lote: LoteChat):
+        with self.session_factory() as db:
+            db.add(lote)
+            db.commit()
+
+    def _actualizar(self, id_lote: str, **campos):
+        with self.session_factory() as db:
+            db.query(LoteChat).filter(LoteChat.id_lote == id_lote).update(campos)
+            db.commit()
+
+    def consultar(self, id_lote: str) -> dict | None:
+        """Estado, avance y resultados (parciales mientras corre) de un lote."""
+        with self.session_factory() as db:
+            lote = db.get(LoteChat, id_lote)
+            if lote is None:
+                return None
+            return {
+                "job_id": lote.id_lote,
+                "status": lote.estado,
+                "questions": lote.preguntas,
+                "unique": lote.unicas,
+                "done": lote.hechas,
+                "created_at": lote.creado_en,
+                "updated_at": lote.actualizado_en,
+                "error": lote.error,
+                "summary": json.loads(lote.resumen) if lote.resumen else None,
+                "results": json.loads(lote.resultados) if lote.resultados else [],
+            }
+
+    async def detener(self):
+        """Cancela los lotes en curso de este worker (quedan como "interrupted")."""
+        tareas = list(self._tareas.values())
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "running": len(self._tareas),
+            "launched": self.launched,
+            "finished": self.finished,
+            "failed": self.failed,
+        }
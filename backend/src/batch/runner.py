@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+
+from src.ai.base import LimiteRPM, usar_limite_llm
+from src.chat.normalize import normalizar_texto
+
+logger = logging.getLogger(__name__)
+
+
+def leer_preguntas(lineas):
+    """
+    Lee un JSONL de preguntas: cada línea es un objeto con `prompt` (o
+    `question`) y un `id` opcional (por defecto, el número de línea), o
+    directamente un string. Devuelve (preguntas, errores por línea).
+    """
+    preguntas, errores = [], []
+    for numero, linea in enumerate(lineas, start=1):
+        if not linea.strip():
+            continue
+        try:
+            obj = json.loads(linea)
+        except ValueError as e:
+            errores.append({"line": numero, "error": f"JSON inválido: {e}"})
+            continue
+        if isinstance(obj, str):
+            obj = {"prompt": obj}
+        prompt = (obj.get("prompt") or obj.get("question")) if isinstance(obj, dict) else None
+        if not isinstance(prompt, str) or not prompt.strip():
+            errores.append({"line": numero, "error": "Falta el campo 'prompt'"})
+            continue
+        preguntas.append({"id": obj.get("id", numero), "prompt": prompt.strip()})
+    return preguntas, errores
+
+
+def deduplicar(preguntas: list) -> list:
+    """Agrupa las preguntas iguales tras normalizar; conserva el primer texto y todos los ids."""
+    unicas = {}
+    for pregunta in preguntas:
+        clave = normalizar_texto(pregunta["prompt"])
+        if clave in unicas:
+            unicas[clave]["ids"].append(pregunta["id"])
+        else:
+            unicas[clave] = {"prompt": pregunta["prompt"], "ids": [pregunta["id"]]}
+    return list(unicas.values())
+
+
+def _percentil(valores: list, q: float) -> float:
+    return valores[min(len(valores) - 1, int(q * len(valores)))] if valores else 0.0
+
+
+async def ejecutar_lote(preguntas: list, responder, concurrency: int = 4, rpm: float = 0,
+                        al_terminar=None) -> dict:
+    """
+    Corre `responder(prompt)` (una corrutina que devuelve el dict de
+    resultado de una pregunta) para cada pregunta distinta, con a lo sumo
+    `concurrency` en curso y, si `rpm` > 0, sin pasar de `rpm` llamadas al
+    modelo por minuto entre todas. Devuelve {"summary": ..., "results": [...]}
+    con los resultados en el orden de la primera aparición de cada pregunta.
+    `al_terminar(resultado)` se llama con cada uno apenas está listo.
+    """
+    unicas = deduplicar(preguntas)
+    limite = LimiteRPM(rpm) if rpm else None
+    semaforo = asyncio.Semaphore(max(1, concurrency))
+    resultados = [None] * len(unicas)
+
+    async def procesar(i: int, pregunta: dict):
+        # Cada pregunta corre en su propia tarea: sus etapas y tokens no se mezclan
+        usar_limite_llm(limite)
+        async with semaforo:
+            try:
+                resultado = await responder(pregunta["prompt"])
+            except Exception as e:
+                logger.exception("Falló la pregunta del lote: %s", pregunta["prompt"])
+                resultado = {"source": "error", "error": str(e)}
+        resultados[i] = {"ids": pregunta["ids"], "prompt": pregunta["prompt"], **resultado}
+        if al_terminar is not None:
+            al_terminar(resultados[i])
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(procesar(i, p) for i, p in enumerate(unicas)))
+    segundos = time.perf_counter() - inicio
+    return {"summary": resumir(len(preguntas), resultados, segundos, concurrency, limite), "results": resultados}
+
+
+def resumir(leidas: int, resultados: list, segundos: float, concurrency: int, limite: LimiteRPM | None) -> dict:
+    latencias = sorted(r["total_ms"] for r in resultados if r.get("total_ms") is not None)
+    etapas = {}
+    for r in resultados:
+        for etapa, ms in (r.get("stages_ms") or {}).items():
+            etapas.setdefault(etapa, []).append(ms)
+    llamadas = sum(r.get("llm_calls", 0) for r in resultados)
+    return {
+        "questions": leidas,
+        "unique": len(resultados),
+        "duplicates": leidas - len(resultados),
+        "by_source": dict(Counter(r.get("source") for r in resultados)),
+        "errors": sum(1 for r in resultados if r.get("source") == "error"),
+        "concurrency": concurrency,
+        "seconds": round(segundos, 3),
+        "questions_per_second": round(len(resultados) / segundos, 2) if segundos else 0.0,
+        "latency_ms": {
+            "p50": round(_percentil(latencias, 0.50), 1),
+            "p95": round(_percentil(latencias, 0.95), 1),
+            "max": round(latencias[-1], 1) if latencias else 0.0,
+        },
+        "stage_mean_ms": {e: round(sum(v) / len(v), 1) for e, v in etapas.items()},
+        "llm_calls": llamadas,
+        "llm_calls_per_minute": round(llamadas / segundos * 60, 1) if segundos else 0.0,
+        "tokens": sum(r.get("tokens", 0) for r in resultados),
+        "rpm_budget": limite.stats() if limite is not None else None,
+    }
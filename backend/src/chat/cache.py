@@ -0,0 +1,87 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from .normalize import normalizar_texto
+
+
+class TTLCache:
+    """
+    Caché LRU acotada con expiración por tiempo (TTL) y contadores de
+    aciertos/fallos. Es segura para usarse desde el event loop y desde
+    el threadpool de Starlette.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+def schema_fingerprint(schema: str) -> str:
+    """Hash corto del schema: si el schema cambia, cambian las claves."""
+    return hashlib.sha256(schema.encode()).hexdigest()[:16]
+
+
+class SQLCache(TTLCache):
+    """
+    Caché pregunta -> SQL validado (paso 1 del chat). La clave combina la
+    huella del schema (`schema_fingerprint`) con la pregunta normalizada,
+    así que un cambio de schema invalida las entradas anteriores sin tener
+    que vaciarla.
+    """
+
+    def get_sql(self, pregunta: str, fingerprint: str):
+        return self.get((fingerprint, normalizar_texto(pregunta)))
+
+    def set_sql(self, pregunta: str, fingerprint: str, sql_query: str):
+        self.set((fingerprint, normalizar_texto(pregunta)), sql_query)
+
+    def discard_sql(self, pregunta: str, fingerprint: str):
+        self.discard((fingerprint, normalizar_texto(pregunta)))
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+
+def estimar_tokens(texto: str) -> int:
+    """Aproximación barata (~4 caracteres por token) sin llamar al modelo."""
+    return len(texto) // 4 + 1 if texto else 0
+
+
+class Conversacion:
+    """
+    Estado de un chat: ventana de los últimos turnos completos y un resumen
+    de los anteriores. Se actualiza de forma incremental: los turnos que
+    salen de la ventana se pliegan al resumen, nunca se reenvían enteros.
+
+    `resumidos` cuenta los turnos que ya no están en la ventana y `vistos`
+    todos los que conoce este proceso (guardados o recién agregados).
+    """
+
+    def __init__(self, id_chat: int, turnos=None, resumen: str = "", id_usuario: int | None = None,
+                 resumidos: int = 0, vistos: int | None = None):
+        self.id_chat = id_chat
+        self.id_usuario = id_usuario  # dueño del chat, si lo abrió un usuario autenticado
+        self.resumen = resumen
+        self.turnos = deque(turnos or [])  # (pregunta, respuesta)
+        self.resumidos = resumidos
+        self.vistos = resumidos + len(self.turnos) if vistos is None else vistos
+        self.lock = asyncio.Lock()  # un solo resumen en curso por chat
+
+    def preguntas_recientes(self) -> str:
+        return " ".join(p for p, _ in self.turnos)
+
+
+class ConversationStore:
+    """
+    Conversaciones activas en memoria (LRU acotada por `max_chats`). El
+    contexto que se agrega al prompt nunca supera `token_budget` tokens:
+    el resumen ocupa como máximo `summary_share` del presupuesto y el resto
+    se llena con los turnos más recientes que quepan.
+
+    `summarizer(resumen_previo, turnos) -> str` es una corrutina que pliega
+    turnos viejos en el resumen; se ejecuta en segundo plano, después de
+    responder, para no sumar una llamada al LLM a la latencia del chat.
+    `guardar_resumen(id_chat, resumen, resumidos)` (bloqueante) lo persiste,
+    así sobrevive a reinicios y lo ven los demás workers.
+    """
+
+    def __init__(self, summarizer, max_turns: int = 4, token_budget: int = 1200,
+                 summary_share: float = 0.4, max_chats: int = 1000, max_turn_chars: int = 1500,
+                 guardar_resumen=None):
+        self.summarizer = summarizer
+        self.guardar_resumen = guardar_resumen
+        self.max_turns = max_turns
+        self.token_budget = token_budget
+        self.summary_budget = int(token_budget * summary_share)
+        self.max_chats = max_chats
+        self.max_turn_chars = max_turn_chars
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+        self._tareas = set()
+        self.loads = 0
+        self.reloads = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    async def obtener(self, id_chat: int, cargar, contar):
+        """
+        Devuelve la conversación del chat o None si el chat no existe.
+        `cargar(id_chat, max_turns)` y `contar(id_chat)` son bloqueantes
+        (consultan la base). `cargar` devuelve una Conversacion o None;
+        `contar`, cuántos turnos tiene guardados el chat: si son más de los
+        que vio este proceso, otro worker respondió en el chat y se recarga.
+        """
+        with self._lock:
+            conv = self._chats.get(id_chat)
+            if conv is not None:
+                self._chats.move_to_end(id_chat)
+        if conv is not None:
+            # Los turnos propios aún en la cola del historial cuentan como vistos
+            if await asyncio.to_thread(contar, id_chat) <= conv.vistos:
+                return conv
+            self.reloads += 1
+        cargada = await asyncio.to_thread(cargar, id_chat, self.max_turns)
+        with self._lock:
+            if cargada is None:
+                self._chats.pop(id_chat, None)
+                return None
+            self.loads += 1
+            self._chats[id_chat] = cargada
+            self._chats.move_to_end(id_chat)
+            while len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        return cargada
+
+    def contexto(self, conv: Conversacion) -> str:
+        """Texto de la conversación previa acotado a `token_budget`."""
+        partes = []
+        usados = 0
+        if conv.resumen:
+            partes.append(f"Resumen de lo conversado antes: {conv.resumen}")
+            usados += estimar_tokens(partes[0])
+        recientes = []
+        for pregunta, respuesta in reversed(conv.turnos):
+            turno = f"Usuario: {pregunta}\nAsistente: {respuesta}"
+            costo = estimar_tokens(turno)
+            if usados + costo > self.token_budget:
+                break
+            recientes.append(turno)
+            usados += costo
+        partes.extend(reversed(recientes))
+        return "\n".join(partes)
+
+    def agregar_turno(self, conv: Conversacion, pregunta: str, respuesta: str):
+        """Registra el turno y, si la ventana se desbordó, lanza el resumen."""
+        conv.turnos.append((pregunta[:self.max_turn_chars], respuesta[:self.max_turn_chars]))
+        conv.vistos += 1
+        if self._desbordada(conv) and not conv.lock.locked():
+            tarea = asyncio.create_task(self.compactar(conv))
+            self._tareas.add(tarea)
+            tarea.add_done_callback(self._tareas.discard)
+
+    def _desbordada(self, conv: Conversacion, desde: int = 0) -> bool:
+        turnos = list(conv.turnos)[desde:]
+        if len(turnos) > self.max_turns:
+            return True
+        tokens_turnos = sum(estimar_tokens(p) + estimar_tokens(r) for p, r in turnos)
+        return len(turnos) > 1 and tokens_turnos > self.token_budget - self.summary_budget
+
+    async def compactar(self, conv: Conversacion):
+        async with conv.lock:
+            # Los turnos siguen en la ventana hasta que el resumen esté listo
+            n = 0
+            while self._desbordada(conv, desde=n):
+                n += 1
+            if not n:
+                return
+            viejos = list(conv.turnos)[:n]
+            try:
+                resumen = (await self.summarizer(conv.resumen, viejos)).strip()
+                self.summaries += 1
+            except Exception as e:
+                # Sin LLM el resumen se degrada a la lista de preguntas previas
+                logger.warning("Falló el resumen del chat %s: %s", conv.id_chat, e)
+                self.summary_failures += 1
+                resumen = " ".join([conv.resumen] + [f"Preguntó: {p}." for p, _ in viejos]).strip()
+            conv.resumen = self._recortar(resumen)
+            for _ in range(n):
+                conv.turnos.popleft()
+            conv.resumidos += n
+            if self.guardar_resumen is not None:
+                try:
+                    await asyncio.to_thread(self.guardar_resumen, conv.id_chat, conv.resumen, conv.resumidos)
+                except Exception as e:
+                    logger.warning("No se pudo guardar el resumen del chat %s: %s", conv.id_chat, e)
+
+    def _recortar(self, resumen: str) -> str:
+        # Se conserva lo más reciente si el modelo se excede del presupuesto
+        max_chars = self.summary_budget * 4
+        return resumen if len(resumen) <= max_chars else resumen[-max_chars:]
+
+    def stats(self) -> dict:
+        return {
+            "active": len(self._chats),
+            "max_chats": self.max_chats,
+            "max_turns": self.max_turns,
+            "token_budget": self.token_budget,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+            "pending_summaries": len(self._tareas),
+        }
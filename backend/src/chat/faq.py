@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+from collections import Counter
+
+from sqlalchemy import event
+
+from src.models import PreguntaFrecuente
+from .normalize import tokenizar
+
+
+class FAQIndex:
+    """
+    Índice invertido en memoria sobre `preguntas_frecuentes` con puntaje
+    BM25. Permite responder preguntas frecuentes sin llamar al LLM.
+
+    El ranking usa BM25; la decisión de responder usa una confianza en
+    [0, 1]: la media armónica entre la fracción (ponderada por idf) de los
+    términos de la pregunta que aparecen en la FAQ y la de los términos de
+    la FAQ que aparecen en la pregunta. Así "horario" no responde a una FAQ
+    larga sobre "horario de matrícula de ingresantes".
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, threshold: float = 0.7):
+        self.threshold = threshold
+        self.lookups = 0
+        self.matches = 0
+        self.total_match_ms = 0.0
+        self._docs = {}      # id -> {"pregunta", "respuesta", "categoria", "terms", "len"}
+        self._postings = {}  # término -> {id: tf}
+        self._total_len = 0
+        self._durante_carga = None  # cambios hechos mientras corre `cargar`
+        self._lock = threading.Lock()
+
+    # --- Mantenimiento del índice ---
+
+    @staticmethod
+    def _documento(pregunta: str, respuesta: str, categoria: str = None) -> dict:
+        terms = Counter(tokenizar(pregunta))
+        return {
+            "pregunta": pregunta,
+            "respuesta": respuesta,
+            "categoria": categoria,
+            "terms": terms,
+            "len": sum(terms.values()),
+        }
+
+    def _remove(self, id_pregunta: int):
+        doc = self._docs.pop(id_pregunta, None)
+        if doc is None:
+            return
+        self._total_len -= doc["len"]
+        for term in doc["terms"]:
+            posting = self._postings[term]
+            posting.pop(id_pregunta, None)
+            if not posting:
+                del self._postings[term]
+
+    def _insertar(self, id_pregunta: int, doc: dict):
+        self._remove(id_pregunta)
+        self._docs[id_pregunta] = doc
+        self._total_len += doc["len"]
+        for term, tf in doc["terms"].items():
+            self._postings.setdefault(term, {})[id_pregunta] = tf
+
+    def upsert(self, id_pregunta: int, pregunta: str, respuesta: str, categoria: str = None):
+        doc = self._documento(pregunta, respuesta, categoria)
+        with self._lock:
+            self._insertar(id_pregunta, doc)
+            if self._durante_carga is not None:
+                self._durante_carga.append((id_pregunta, doc))
+
+    def remove(self, id_pregunta: int):
+        with self._lock:
+            self._remove(id_pregunta)
+            if self._durante_carga is not None:
+                self._durante_carga.append((id_pregunta, None))
+
+    def cargar(self, db) -> int:
+        """
+        Reconstruye el índice completo desde la base de datos. El nuevo se
+        arma aparte y se cambia de una vez bajo el lock: `buscar` nunca ve
+        un índice vacío o a medias.
+        """
+        with self._lock:
+            self._durante_carga = []
+        try:
+            filas = db.query(
+                PreguntaFrecuente.id_pregunta,
+                PreguntaFrecuente.pregunta,
+                PreguntaFrecuente.respuesta,
+                PreguntaFrecuente.categoria,
+            ).all()
+            docs, postings, total_len = {}, {}, 0
+            for id_pregunta, pregunta, respuesta, categoria in filas:
+                doc = docs[id_pregunta] = self._documento(pregunta, respuesta, categoria)
+                total_len += doc["len"]
+                for term, tf in doc["terms"].items():
+                    postings.setdefault(term, {})[id_pregunta] = tf
+            with self._lock:
+                self._docs, self._postings, self._total_len = docs, postings, total_len
+                # Lo confirmado mientras se leía la tabla puede faltar en `filas`
+                for id_pregunta, doc in self._durante_carga:
+                    if doc is None:
+                        self._remove(id_pregunta)
+                    else:
+                        self._insertar(id_pregunta, doc)
+        finally:
+            with self._lock:
+                self._durante_carga = None
+        return len(filas)
+
+    # --- Búsqueda ---
+
+    def _idf(self, term: str, n: int) -> float:
+        df = len(self._postings.get(term, ()))
+        return math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    def buscar(self, pregunta: str):
+        """
+        Devuelve el mejor match como dict (id_pregunta, pregunta, respuesta,
+        categoria, score, confianza) o None si no supera el umbral.
+        """
+        inicio = time.perf_counter()
+        query = Counter(tokenizar(pregunta))
+        mejor = None
+        with self._lock:
+            n = len(self._docs)
+            if query and n:
+                avgdl = self._total_len / n or 1.0
+                idf = {t: self._idf(t, n) for t in query}
+                scores = {}
+                for term in query:
+                    for doc_id, tf in self._postings.get(term, {}).items():
+                        dl = self._docs[doc_id]["len"]
+                        scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * tf * (self.K1 + 1) / (
+                            tf + self.K1 * (1 - self.B + self.B * dl / avgdl)
+                        )
+                if scores:
+                    doc_id = max(scores, key=scores.get)
+                    doc = self._docs[doc_id]
+                    comunes = query.keys() & doc["terms"].keys()
+                    peso_query = sum(idf.values())
+                    peso_doc = sum(self._idf(t, n) for t in doc["terms"])
+                    cobertura_query = sum(idf[t] for t in comunes) / peso_query
+                    cobertura_doc = sum(idf[t] for t in comunes) / peso_doc if peso_doc else 0.0
+                    confianza = (
+                        2 * cobertura_query * cobertura_doc / (cobertura_query + cobertura_doc)
+                        if comunes else 0.0
+                    )
+                    if confianza >= self.threshold:
+                        mejor = {
+                            "id_pregunta": doc_id,
+                            "pregunta": doc["pregunta"],
+                            "respuesta": doc["respuesta"],
+                            "categoria": doc["categoria"],
+                            "score": scores[doc_id],
+                            "confianza": confianza,
+                        }
+            match_ms = (time.perf_counter() - inicio) * 1000
+            self.lookups += 1
+            if mejor is not None:
+                self.matches += 1
+            self.total_match_ms += match_ms
+        if mejor is not None:
+            mejor["match_ms"] = match_ms
+        return mejor
+
+    def __len__(self):
+        return len(self._docs)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._docs),
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "matches": self.matches,
+            "avg_match_ms": round(self.total_match_ms / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+def instalar_refresco(session_factory, index: FAQIndex):
+    """
+    Mantiene el índice al día con las escrituras hechas con el ORM: las
+    altas/cambios/bajas de PreguntaFrecuente se aplican al confirmar.
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def _anotar_cambios(session, flush_context):
+        cambios = session.info.setdefault("faq_cambios", [])
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, PreguntaFrecuente):
+                cambios.append(("upsert", obj.id_pregunta, obj.pregunta, obj.respuesta, obj.categoria))
+        for obj in session.deleted:
+            if isinstance(obj, PreguntaFrecuente):
+                cambios.append(("remove", obj.id_pregunta))
+
+    @event.listens_for(session_factory, "after_commit")
+    def _aplicar(session):
+        for cambio in session.info.pop("faq_cambios", []):
+            if cambio[0] == "upsert":
+                index.upsert(*cambio[1:])
+            else:
+                index.remove(cambio[1])
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _descartar(session):
+        session.info.pop("faq_cambios", None)
@@ -0,0 +1,185 @@
+import json
+import logging
+import queue
+import threading
+import time
+
+from sqlalchemy import func
+
+from src.models import Chat, Consulta, MetricaConsulta, Respuesta
+from src.observability.metrics import acumular_etapas
+
+logger = logging.getLogger(__name__)
+
+
+class RegistroChat:
+    """
+    Lo que queda de una pregunta al chat: pregunta, SQL, respuesta, origen,
+    latencia por etapa y tokens. Se arma durante la petición y se encola al
+    final; nunca toca la base de datos. Las etapas medidas con `span` en el
+    contexto de la petición se acumulan en `etapas`.
+    """
+
+    def __init__(self, pregunta: str, id_chat: int | None = None):
+        self.pregunta = pregunta
+        self.id_chat = id_chat
+        self.sql = None
+        self.filas = None  # filas que devolvió el SQL (None: no se ejecutó o falló)
+        self.respuesta = None
+        self.origen = None
+        self.rechazo = None  # motivo del guardián si el SQL se rechazó
+        self.tokens_entrada = 0
+        self.tokens_salida = 0
+        self.llamadas_llm = 0
+        self.etapas = {}  # etapa -> ms
+        self._inicio = time.perf_counter()
+        self.total_ms = None
+        acumular_etapas(self.etapas)
+
+    def cerrar(self, respuesta: str, origen: str, uso=None):
+        self.respuesta = respuesta
+        self.origen = self.origen or origen  # un "error" marcado en el camino prevalece
+        self.total_ms = round((time.perf_counter() - self._inicio) * 1000, 3)
+        if uso is not None:
+            self.tokens_entrada = uso.tokens_entrada
+            self.tokens_salida = uso.tokens_salida
+            self.llamadas_llm = uso.llamadas
+
+
+class HistoryWriter:
+    """
+    Cola write-behind para el historial del chat. `registrar` solo encola
+    (sin esperar a la base de datos); un hilo de fondo inserta por lotes de
+    hasta `batch_size` registros o cada `flush_interval` segundos, lo que
+    ocurra primero. Si la cola está llena el registro se descarta y se
+    cuenta: perder historial es preferible a frenar el chat.
+    """
+
+    _FIN = object()
+
+    def __init__(self, session_factory, batch_size: int = 50, flush_interval: float = 2.0, queue_max: int = 5000):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._cola = queue.Queue(maxsize=queue_max)
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+        self.total_batch_ms = 0.0
+
+    def start(self):
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="history-writer", daemon=True)
+                self._hilo.start()
+
+    def registrar(self, registro: RegistroChat) -> bool:
+        try:
+            self._cola.put_nowait(registro)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+        with self._lock:
+            self.enqueued += 1
+        return True
+
+    def close(self, timeout: float = 10.0):
+        """Vacía lo pendiente y detiene el hilo (se llama al apagar la app)."""
+        hilo = self._hilo
+        if hilo is None or not hilo.is_alive():
+            return
+        self._cola.put(self._FIN)
+        hilo.join(timeout)
+
+    # --- Hilo de escritura ---
+
+    def _bucle(self):
+        while True:
+            lote = []
+            item = self._cola.get()  # el intervalo corre desde el primer registro del lote
+            terminar = item is self._FIN
+            limite = time.monotonic() + self.flush_interval
+            while not terminar:
+                lote.append(item)
+                if len(lote) >= self.batch_size:
+                    break
+                try:
+                    item = self._cola.get(timeout=max(limite - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                terminar = item is self._FIN
+            if lote:
+                self._escribir(lote)
+            if terminar:
+                # Lo que llegó después de la señal de cierre también se guarda
+                resto = []
+                while True:
+                    try:
+                        item = self._cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not self._FIN:
+                        resto.append(item)
+                for i in range(0, len(resto), self.batch_size):
+                    self._escribir(resto[i:i + self.batch_size])
+                return
+
+    def _escribir(self, lote: list):
+        inicio = time.perf_counter()
+        db = self.session_factory()
+        try:
+            for r in lote:
+                consulta = Consulta(
+                    id_chat=r.id_chat,
+                    contenido=r.pregunta,
+                    tokens_usados=r.tokens_entrada + r.tokens_salida,
+                )
+                if r.respuesta:
+                    consulta.respuestas.append(Respuesta(contenido=r.respuesta))
+                consulta.metrica = MetricaConsulta(
+                    sql_generado=r.sql,
+                    origen=r.origen,
+                    tokens_entrada=r.tokens_entrada,
+                    tokens_salida=r.tokens_salida,
+                    llamadas_llm=r.llamadas_llm,
+                    latencia_total_ms=r.total_ms,
+                    latencias_etapas=json.dumps(r.etapas),
+                    filas_resultado=r.filas,
+                )
+                db.add(consulta)
+            chats = {r.id_chat for r in lote if r.id_chat is not None}
+            if chats:
+                db.query(Chat).filter(Chat.id_chat.in_(chats)).update(
+                    {Chat.fecha_ult_mens: func.now()}, synchronize_session=False
+                )
+            db.commit()
+            with self._lock:
+                self.written += len(lote)
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self.failed += len(lote)
+            logger.error("No se pudo guardar el historial (%d registros): %s", len(lote), e)
+        finally:
+            db.close()
+            with self._lock:
+                self.batches += 1
+                self.total_batch_ms += (time.perf_counter() - inicio) * 1000
+
+    def stats(self) -> dict:
+        return {
+            "backlog": self._cola.qsize(),
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+            "avg_batch_ms": round(self.total_batch_ms / self.batches, 3) if self.batches else 0.0,
+            "batch_size": self.batch_size,
+            "flush_interval_s": self.flush_interval,
+        }
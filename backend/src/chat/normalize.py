@@ -0,0 +1,41 @@
+import re
+import unicodedata
+
+_NO_ALFANUMERICO = re.compile(r"[^\w\s-]")
+_ESPACIOS = re.compile(r"\s+")
+
+
+def normalizar_texto(texto: str) -> str:
+    """
+    Normaliza una pregunta para usarla como clave: minúsculas, sin tildes,
+    sin signos de puntuación (¿?¡!.,) y con los espacios colapsados.
+    Ej: "¿Dónde queda el  Pabellón X?" -> "donde queda el pabellon x"
+    """
+    texto = unicodedata.normalize("NFKD", texto.casefold())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = _NO_ALFANUMERICO.sub(" ", texto)
+    return _ESPACIOS.sub(" ", texto).strip()
+
+
+STOPWORDS = {
+    "a", "al", "con", "cual", "cuales", "de", "del", "el", "en", "es", "esta",
+    "hay", "la", "las", "le", "lo", "los", "me", "mi", "o", "para", "por",
+    "que", "se", "su", "sus", "un", "una", "y", "yo", "tu", "dame", "quiero",
+    "saber", "sobre", "todos", "todas",
+}
+
+
+def stem(token: str) -> str:
+    """Stemming mínimo para plurales y género en español."""
+    if len(token) > 4 and token.endswith("es"):
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    if len(token) > 4 and token[-1] in "aeo":
+        token = token[:-1]
+    return token
+
+
+def tokenizar(texto: str) -> list:
+    texto = normalizar_texto(texto).replace("_", " ")
+    return [stem(t) for t in texto.split() if t not in STOPWORDS and len(t) > 1]
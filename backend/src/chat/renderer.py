@@ -0,0 +1,161 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+# Etiquetas legibles para las columnas más comunes
+ETIQUETAS = {
+    "nombre": "Nombre",
+    "tipo": "Tipo",
+    "pabellon": "Pabellón",
+    "piso": "Piso",
+    "descripcion": "Descripción",
+    "referencia_llegada": "Cómo llegar",
+    "nombres_completos": "Docente",
+    "correo_institucional": "Correo",
+    "especialidad": "Especialidad",
+    "grado_academico": "Grado académico",
+    "codigo_curso": "Código del curso",
+    "ciclo_sugerido": "Ciclo sugerido",
+    "metodologia": "Metodología",
+    "consejos": "Consejos",
+    "titulo": "Trámite",
+    "descripcion_general": "Descripción",
+    "pasos_guia": "Pasos",
+    "plataforma_asociada": "Plataforma",
+    "enlace_externo": "Enlace",
+}
+
+# Columnas que delatan un COUNT (count, count(*), count_1...). Otros
+# agregados (total_creditos, sum, cantidad...) no son conteos de filas y se
+# muestran como "Etiqueta: valor".
+_CONTEOS = ("count",)
+
+# Columnas técnicas que no se muestran al usuario
+_OCULTAS = ("id_", "imagen_url", "foto_url", "fecha_registro")
+
+RESPUESTA_VACIA = "No encontré registros sobre ese tema en el sistema. ¿Quieres intentar con otra pregunta?"
+
+
+def _etiqueta(col: str) -> str:
+    return ETIQUETAS.get(col, col.replace("_", " ").capitalize())
+
+
+def _valor(v) -> str:
+    if isinstance(v, datetime):
+        return v.strftime("%d/%m/%Y %H:%M")
+    if isinstance(v, date):
+        return v.strftime("%d/%m/%Y")
+    if isinstance(v, bool):
+        return "sí" if v else "no"
+    if isinstance(v, Decimal):
+        return format(v.normalize(), "f")
+    return str(v).strip()
+
+
+def _simple(v) -> bool:
+    return v is None or isinstance(v, (str, int, float, Decimal, date, bool))
+
+
+def _visibles(fila: dict) -> dict:
+    return {
+        c: v for c, v in fila.items()
+        if v not in (None, "") and not c.startswith(_OCULTAS)
+    }
+
+
+# --- Plantillas por tabla (se eligen según las columnas del resultado) ---
+
+def _ubicacion(f: dict) -> str:
+    texto = f"📍 {f.get('nombre', 'La ubicación')}"
+    partes = []
+    if f.get("pabellon"):
+        partes.append(f"en el pabellón {_valor(f['pabellon'])}")
+    if f.get("piso"):
+        partes.append(f"piso {_valor(f['piso'])}")
+    texto += " se encuentra " + ", ".join(partes) + "." if partes else "."
+    if f.get("referencia_llegada"):
+        texto += f" Cómo llegar: {_valor(f['referencia_llegada'])}"
+    if f.get("descripcion"):
+        texto += f"\n{_valor(f['descripcion'])}"
+    return texto
+
+
+def _docente(f: dict) -> str:
+    texto = f"👤 {f.get('nombres_completos', 'Docente')}"
+    if f.get("grado_academico"):
+        texto += f" ({_valor(f['grado_academico'])})"
+    if f.get("especialidad"):
+        texto += f" — {_valor(f['especialidad'])}"
+    if f.get("correo_institucional"):
+        texto += f"\nCorreo: {_valor(f['correo_institucional'])}"
+    return texto
+
+
+def _tramite(f: dict) -> str:
+    texto = f"📄 {f.get('titulo', 'Trámite')}"
+    if f.get("descripcion_general"):
+        texto += f"\n{_valor(f['descripcion_general'])}"
+    if f.get("pasos_guia"):
+        texto += f"\nPasos: {_valor(f['pasos_guia'])}"
+    if f.get("plataforma_asociada"):
+        texto += f"\nPlataforma: {_valor(f['plataforma_asociada'])}"
+    if f.get("enlace_externo"):
+        texto += f"\nEnlace: {_valor(f['enlace_externo'])}"
+    return texto
+
+
+PLANTILLAS = [
+    ({"pabellon", "piso", "referencia_llegada"}, "nombre", _ubicacion),
+    ({"nombres_completos", "correo_institucional", "especialidad"}, "nombres_completos", _docente),
+    ({"pasos_guia", "descripcion_general", "enlace_externo", "plataforma_asociada"}, "titulo", _tramite),
+]
+
+
+def _plantilla(columns):
+    cols = set(columns)
+    for firma, principal, fn in PLANTILLAS:
+        if principal in cols and cols & firma:
+            return fn
+    return None
+
+
+def _generica(f: dict) -> str:
+    return "\n".join(f"{_etiqueta(c)}: {_valor(v)}" for c, v in f.items())
+
+
+def renderizar(columns, rows, max_rows: int = 5, max_columns: int = 8):
+    """
+    Intenta responder sin LLM según la forma del resultado:
+      - sin filas            -> mensaje de "sin registros"
+      - un escalar           -> el valor (o el conteo) en una frase
+      - una fila             -> plantilla de la tabla o "Etiqueta: valor"
+      - lista corta          -> viñetas, una por fila
+    Devuelve None si el resultado es complejo y conviene usar el LLM.
+    """
+    if columns is None or rows is None:
+        return None
+    if not rows:
+        return RESPUESTA_VACIA
+    if len(rows) > max_rows or len(columns) > max_columns:
+        return None
+    if not all(_simple(v) for row in rows for v in row):
+        return None
+
+    filas = [_visibles(dict(zip(columns, row))) for row in rows]
+    if not any(filas):
+        return None
+
+    if len(rows) == 1 and len(columns) == 1:
+        col, valor = columns[0], rows[0][0]
+        if col.lower().startswith(_CONTEOS) and isinstance(valor, (int, Decimal)):
+            return f"Encontré {_valor(valor)} registro(s)."
+        return f"{_etiqueta(col)}: {_valor(valor)}" if valor is not None else RESPUESTA_VACIA
+
+    plantilla = _plantilla(columns) or _generica
+    if len(filas) == 1:
+        return plantilla(filas[0])
+
+    if len(columns) == 1 or all(len(f) == 1 for f in filas):
+        items = [_valor(next(iter(f.values()))) for f in filas if f]
+        return f"Encontré {len(items)} resultados:\n" + "\n".join(f"• {i}" for i in items)
+    bloques = [plantilla(f) for f in filas if f]
+    return f"Encontré {len(bloques)} resultados:\n\n" + "\n\n".join(bloques)
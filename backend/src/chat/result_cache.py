@@ -0,0 +1,134 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+_ESPACIOS = re.compile(r"\s+")
+_IDENTIFICADOR = re.compile(r"[a-z_][a-z0-9_]*")
+
+
+def canonical_sql(sql_query: str) -> str:
+    """Forma canónica de la consulta para usarla como clave de caché."""
+    return _ESPACIOS.sub(" ", sql_query).strip().rstrip(";").strip()
+
+
+def _clave(sql_query: str, params: dict = None) -> str:
+    # Una plantilla de SQL es la misma consulta con distintos valores enlazados
+    clave = canonical_sql(sql_query)
+    if params:
+        clave += " -- " + json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return clave
+
+
+def tablas_de_consulta(sql_query: str, tablas_conocidas) -> frozenset:
+    """
+    Tablas conocidas que aparecen en la consulta. Es una sobreaproximación
+    (un nombre de tabla usado como alias también cuenta), lo cual es seguro
+    para invalidar: como mucho se descarta una entrada de más.
+    """
+    identificadores = set(_IDENTIFICADOR.findall(sql_query.lower()))
+    return frozenset(identificadores & tablas_conocidas)
+
+
+class ResultCache:
+    """
+    Caché de resultados del paso 2 (SQL -> filas) con invalidación por
+    tabla. Cada entrada recuerda qué tablas lee su consulta; cuando se
+    escribe en una tabla (ver `database.al_modificar_tablas`) sólo se
+    descartan las entradas que dependen de ella. Acotada por número de
+    entradas, bytes aproximados (los que indica quien guarda) y TTL.
+    """
+
+    def __init__(self, tablas_conocidas, maxsize: int = 512,
+                 max_bytes: int = 8 * 1024 * 1024, ttl: float = 600):
+        self.tablas_conocidas = frozenset(t.lower() for t in tablas_conocidas)
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.bytes = 0
+        self._data = OrderedDict()  # clave -> (expira, valor, tablas, bytes)
+        self._por_tabla = {}        # tabla -> set(claves)
+        self._lock = threading.Lock()
+
+    def _quitar(self, key):
+        _, _, tablas, size = self._data.pop(key)
+        self.bytes -= size
+        for tabla in tablas:
+            claves = self._por_tabla.get(tabla)
+            if claves is not None:
+                claves.discard(key)
+                if not claves:
+                    del self._por_tabla[tabla]
+
+    def get(self, sql_query: str, params: dict = None):
+        key = _clave(sql_query, params)
+        now = time.monotonic()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    self._quitar(key)
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, sql_query: str, value, size: int, params: dict = None):
+        """Guarda `value`; `size` es el tamaño aproximado en bytes."""
+        if size > self.max_bytes:
+            return
+        key = _clave(sql_query, params)
+        tablas = tablas_de_consulta(canonical_sql(sql_query), self.tablas_conocidas)
+        with self._lock:
+            if key in self._data:
+                self._quitar(key)
+            self._data[key] = (time.monotonic() + self.ttl, value, tablas, size)
+            self.bytes += size
+            for tabla in tablas:
+                self._por_tabla.setdefault(tabla, set()).add(key)
+            while len(self._data) > self.maxsize or self.bytes > self.max_bytes:
+                self._quitar(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate_tables(self, tablas) -> int:
+        """Descarta las entradas que leen alguna de `tablas`."""
+        with self._lock:
+            claves = set()
+            for tabla in tablas:
+                claves |= self._por_tabla.get(tabla.lower(), set())
+            for key in claves:
+                self._quitar(key)
+            self.invalidations += len(claves)
+            return len(claves)
+
+    def clear(self) -> int:
+        with self._lock:
+            n = len(self._data)
+            self._data.clear()
+            self._por_tabla.clear()
+            self.bytes = 0
+            return n
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,409 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+
+from .cache import schema_fingerprint
+from .normalize import stem, normalizar_texto, tokenizar
+from .sql_guard import TABLAS_INTERNAS
+
+logger = logging.getLogger(__name__)
+
+# ----------------------------------------------------------
+# Lectura y renderizado del schema
+# ----------------------------------------------------------
+
+# Columnas y llaves foráneas de todo el schema en una sola consulta al
+# catálogo (una fila por columna y otra por columna de cada FK), en vez de
+# dos idas y vueltas por tabla con el inspector de SQLAlchemy.
+CATALOGO_POSTGRES = text("""
+    SELECT 'column' AS kind, c.table_name, NULL AS constraint_name, c.ordinal_position AS position,
+           c.column_name, c.data_type, c.udt_name, c.character_maximum_length,
+           c.numeric_precision, c.numeric_scale,
+           col_description(to_regclass(quote_ident(c.table_schema) || '.' || quote_ident(c.table_name)),
+                           c.ordinal_position) AS comment,
+           NULL AS ref_table, NULL AS ref_column
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = current_schema() AND t.table_type = 'BASE TABLE'
+    UNION ALL
+    SELECT 'fk', kcu.table_name, kcu.constraint_name, kcu.ordinal_position,
+           kcu.column_name, NULL, NULL, NULL, NULL, NULL, NULL,
+           rku.table_name, rku.column_name
+    FROM information_schema.referential_constraints rc
+    JOIN information_schema.key_column_usage kcu
+      ON kcu.constraint_schema = rc.constraint_schema AND kcu.constraint_name = rc.constraint_name
+    JOIN information_schema.key_column_usage rku
+      ON rku.constraint_schema = rc.unique_constraint_schema
+     AND rku.constraint_name = rc.unique_constraint_name
+     AND rku.ordinal_position = kcu.position_in_unique_constraint
+    WHERE kcu.table_schema = current_schema()
+    ORDER BY 2, 1, 3, 4
+""")
+
+
+def _tipo_postgres(fila) -> str:
+    """Nombre del tipo como lo mostraba el inspector (VARCHAR(150), NUMERIC(10, 2), ...)."""
+    tipo = fila.data_type
+    if tipo in ("USER-DEFINED", "ARRAY"):
+        return fila.udt_name.lstrip("_").upper() + ("[]" if tipo == "ARRAY" else "")
+    nombre = {"character varying": "VARCHAR", "character": "CHAR"}.get(tipo, tipo.upper())
+    if fila.character_maximum_length:
+        return f"{nombre}({fila.character_maximum_length})"
+    if tipo == "numeric" and fila.numeric_precision:
+        return f"{nombre}({fila.numeric_precision}, {fila.numeric_scale or 0})"
+    return nombre
+
+
+def _leer_schema_postgres(engine) -> list:
+    tablas, fks = {}, {}
+    with engine.connect() as conn:
+        filas = conn.execute(CATALOGO_POSTGRES).all()
+    for fila in filas:
+        tabla = tablas.setdefault(fila.table_name, {"name": fila.table_name, "columns": [], "fks": []})
+        if fila.kind == "column":
+            tabla["columns"].append((fila.column_name, _tipo_postgres(fila), fila.comment))
+        else:
+            cols, ref_table, ref_cols = fks.setdefault(
+                (fila.table_name, fila.constraint_name), ([], fila.ref_table, [])
+            )
+            cols.append(fila.column_name)
+            ref_cols.append(fila.ref_column)
+    for (table_name, _), fk in fks.items():
+        if table_name in tablas:
+            tablas[table_name]["fks"].append(fk)
+    return [t for t in tablas.values() if t["columns"]]
+
+
+def _leer_schema_inspector(engine) -> list:
+    inspector = inspect(engine)
+    tablas = []
+    for table_name in inspector.get_table_names():
+        columns = [
+            (c['name'], str(c['type']), c.get('comment'))
+            for c in inspector.get_columns(table_name)
+        ]
+        fks = [
+            (fk['constrained_columns'], fk['referred_table'], fk['referred_columns'])
+            for fk in inspector.get_foreign_keys(table_name)
+        ]
+        tablas.append({"name": table_name, "columns": columns, "fks": fks})
+    return tablas
+
+
+def excluir_tablas(tablas: list, excluir=TABLAS_INTERNAS) -> list:
+    """Quita las tablas de `excluir` y las llaves foráneas que apuntan a ellas."""
+    return [
+        {**t, "fks": [fk for fk in t["fks"] if fk[1] not in excluir]}
+        for t in tablas if t["name"] not in excluir
+    ]
+
+
+def leer_schema(engine, excluir=TABLAS_INTERNAS) -> list:
+    """
+    Lee tablas, columnas y llaves foráneas de la base de datos, sin las
+    tablas de `excluir` (por defecto las internas, que el LLM no debe ver).
+    Devuelve una lista de dicts:
+      {"name", "columns": [(nombre, tipo, comentario)], "fks": [(cols, tabla, cols_ref)]}
+    En PostgreSQL es una sola consulta a information_schema; en otros motores
+    (SQLite en desarrollo y benchmarks) se usa el inspector.
+    """
+    if engine.dialect.name == "postgresql":
+        tablas = _leer_schema_postgres(engine)
+    else:
+        tablas = _leer_schema_inspector(engine)
+    return excluir_tablas([
+        t for t in tablas
+        if not (t["name"].startswith('pg_') or t["name"].startswith('sql_'))
+    ], excluir)
+
+
+def render_schema(tablas: list) -> str:
+    """Texto del schema tal como se inserta en el prompt de generación de SQL."""
+    schema_string = ""
+    for tabla in tablas:
+        schema_string += f"TABLE: {tabla['name']}\n"
+        for name, type_, comment in tabla["columns"]:
+            schema_string += f"  - {name} ({type_})"
+            schema_string += f" -- {comment}\n" if comment else "\n"
+        if tabla["fks"]:
+            schema_string += "  FOREIGN KEYS:\n"
+            for cols, ref_table, ref_cols in tabla["fks"]:
+                schema_string += f"    - {cols} -> {ref_table}({ref_cols})\n"
+        schema_string += "\n"
+    return schema_string
+
+
+# ----------------------------------------------------------
+# Poda del schema por pregunta (BM25 sobre nombres y comentarios)
+# ----------------------------------------------------------
+
+# Palabras frecuentes en las preguntas -> términos que aparecen en el schema
+SINONIMOS = {
+    "profesor": ["docente"], "profesora": ["docente"], "profe": ["docente"],
+    "maestro": ["docente"], "ingeniero": ["docente"], "dicta": ["docente", "curso"],
+    "ensena": ["docente", "curso"],
+    "salon": ["ubicacion"], "aula": ["ubicacion"], "laboratorio": ["ubicacion"],
+    "oficina": ["ubicacion"], "donde": ["ubicacion"], "queda": ["ubicacion"],
+    "edificio": ["ubicacion", "pabellon"], "llegar": ["ubicacion", "referencia"],
+    "materia": ["curso"], "asignatura": ["curso"], "ciclo": ["curso"],
+    "matricula": ["tramite"], "constancia": ["tramite"], "certificado": ["tramite"],
+    "solicitud": ["tramite"], "procedimiento": ["tramite"], "requisito": ["tramite"],
+    "paso": ["tramite", "guia"],
+    "email": ["correo"], "mail": ["correo"], "contacto": ["correo"],
+    "faq": ["pregunta", "frecuente"], "duda": ["pregunta", "frecuente"],
+    "opinion": ["consejo"], "recomendacion": ["consejo"], "metodo": ["metodologia"],
+}
+
+# Códigos de curso como "CB-101" o "SI204"
+_CODIGO_CURSO = re.compile(r"\b[a-z]{2,3}-?\d{3}[a-z]?\b")
+
+
+_SINONIMOS_STEM = {
+    stem(k): [stem(v) for v in vs] for k, vs in SINONIMOS.items()
+}
+
+
+class SchemaIndex:
+    """
+    Índice BM25 en memoria sobre los nombres de tablas/columnas (y sus
+    comentarios). Para cada pregunta elige las `top_k` tablas más
+    relevantes más sus vecinas por llave foránea, y emite un schema
+    reducido. Si ninguna tabla supera `min_score` se usa el schema completo.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    # Peso extra del nombre de la tabla frente al de sus columnas
+    PESO_NOMBRE_TABLA = 3
+    # Una tabla sólo entra si su score es al menos esta fracción del mejor
+    FRACCION_MINIMA = 0.4
+
+    def __init__(self, tablas: list, top_k: int = 3, min_score: float = 1.0):
+        self.tablas = {t["name"]: t for t in tablas}
+        self.top_k = top_k
+        self.min_score = min_score
+        self.full_schema = render_schema(tablas)
+
+        self._docs = {}
+        for t in tablas:
+            tokens = tokenizar(t["name"]) * self.PESO_NOMBRE_TABLA
+            for name, _, comment in t["columns"]:
+                tokens += tokenizar(name)
+                if comment:
+                    tokens += tokenizar(comment)
+            self._docs[t["name"]] = Counter(tokens)
+
+        n = len(self._docs) or 1
+        self._avgdl = sum(sum(c.values()) for c in self._docs.values()) / n or 1.0
+        df = Counter()
+        for counts in self._docs.values():
+            df.update(counts.keys())
+        self._idf = {
+            term: math.log(1 + (n - f + 0.5) / (f + 0.5)) for term, f in df.items()
+        }
+
+        # Vecinos por llave foránea, en ambos sentidos
+        self._vecinos = {name: set() for name in self.tablas}
+        for t in tablas:
+            for _, ref_table, _ in t["fks"]:
+                if ref_table in self._vecinos:
+                    self._vecinos[t["name"]].add(ref_table)
+                    self._vecinos[ref_table].add(t["name"])
+
+    def _terminos(self, pregunta: str) -> list:
+        terminos = tokenizar(pregunta)
+        if _CODIGO_CURSO.search(normalizar_texto(pregunta)):
+            terminos.append(stem("curso"))
+        for t in list(terminos):
+            terminos += _SINONIMOS_STEM.get(t, [])
+        return terminos
+
+    def puntuar(self, pregunta: str) -> dict:
+        terminos = self._terminos(pregunta)
+        scores = {}
+        for name, counts in self._docs.items():
+            dl = sum(counts.values())
+            score = 0.0
+            for term in terminos:
+                tf = counts.get(term)
+                if not tf:
+                    continue
+                score += self._idf[term] * tf * (self.K1 + 1) / (
+                    tf + self.K1 * (1 - self.B + self.B * dl / self._avgdl)
+                )
+            if score > 0:
+                scores[name] = score
+        return scores
+
+    def podar(self, pregunta: str):
+        """
+        Devuelve (schema, tablas_elegidas). `tablas_elegidas` es None cuando
+        la confianza es baja y se devuelve el schema completo.
+        """
+        scores = self.puntuar(pregunta)
+        ranking = sorted(scores, key=scores.get, reverse=True)[:self.top_k]
+        if not ranking or scores[ranking[0]] < self.min_score:
+            return self.full_schema, None
+
+        corte = scores[ranking[0]] * self.FRACCION_MINIMA
+        elegidas = {name for name in ranking if scores[name] >= corte}
+        for name in list(elegidas):
+            elegidas |= self._vecinos[name]
+        # Se conserva el orden original de las tablas
+        tablas = [t for name, t in self.tablas.items() if name in elegidas]
+        return render_schema(tablas), [t["name"] for t in tablas]
+
+
+# ----------------------------------------------------------
+# Snapshot del schema en disco
+# ----------------------------------------------------------
+
+class SchemaSnapshot:
+    """
+    Schema renderizado para el prompt, su huella y su índice de poda. Se
+    guarda en un archivo JSON para que los demás workers y los reinicios lo
+    reutilicen sin volver a leer el catálogo; se relee si el archivo es de
+    otra base, si tiene más de `max_age` segundos (0 = sin vencimiento) o
+    al llamar a `refrescar()`. Si otro worker reescribe el archivo, este lo
+    recarga en la siguiente consulta a `vigente()` (como mucho cada
+    `check_interval` segundos). Las tablas de `excluir` nunca entran, ni
+    siquiera desde un snapshot escrito antes de excluirlas.
+    """
+
+    def __init__(self, engine, path: str, max_age: float = 0, check_interval: float = 30.0,
+                 top_k: int = 3, min_score: float = 1.0, excluir=TABLAS_INTERNAS):
+        self.engine = engine
+        self.excluir = excluir
+        self.path = path
+        self.max_age = max_age
+        self.check_interval = check_interval
+        self.top_k = top_k
+        self.min_score = min_score
+        # La contraseña no entra en la huella del origen
+        self.origen_db = hashlib.sha256(
+            engine.url.render_as_string(hide_password=True).encode()
+        ).hexdigest()[:16]
+
+        self.tablas = []
+        self.texto = ""
+        self.fingerprint = ""
+        self.index = None
+        self.generado_en = None
+        self.fuente = None  # "snapshot" o "catalog"
+        self.lectura_ms = 0.0
+        self._mtime = None
+        self._ultimo_chequeo = 0.0
+
+    def _aplicar(self, tablas: list, generado_en: str, fuente: str):
+        tablas = excluir_tablas(tablas, self.excluir)
+        self.tablas = tablas
+        self.texto = render_schema(tablas)
+        self.fingerprint = schema_fingerprint(self.texto)
+        self.index = SchemaIndex(tablas, top_k=self.top_k, min_score=self.min_score)
+        self.generado_en = generado_en
+        self.fuente = fuente
+
+    def _leer_archivo(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                datos = json.load(f)
+            mtime = os.path.getmtime(self.path)
+        except (OSError, ValueError):
+            return None, None
+        if datos.get("database") != self.origen_db:
+            return None, None
+        # Las tuplas se guardan como listas en JSON
+        tablas = [
+            {"name": t["name"], "columns": [tuple(c) for c in t["columns"]],
+             "fks": [tuple(fk) for fk in t["fks"]]}
+            for t in datos.get("tables", [])
+        ]
+        return {"tablas": tablas, "generado_en": datos.get("generated_at"),
+                "fingerprint": datos.get("fingerprint")}, mtime
+
+    def _escribir_archivo(self):
+        datos = {
+            "database": self.origen_db,
+            "fingerprint": self.fingerprint,
+            "generated_at": self.generado_en,
+            "tables": self.tablas,
+        }
+        directorio = os.path.dirname(os.path.abspath(self.path))
+        temporal = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(directorio, exist_ok=True)
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(datos, f, ensure_ascii=False)
+            # Reemplazo atómico: ningún worker lee un archivo a medias
+            os.replace(temporal, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            logger.warning("No se pudo guardar el snapshot del schema en %s: %s", self.path, e)
+
+    def cargar(self) -> str:
+        """Usa el snapshot si sirve; si no, lee el catálogo y lo guarda. Devuelve la fuente."""
+        inicio = time.perf_counter()
+        datos, mtime = self._leer_archivo()
+        vencido = False
+        if datos is not None and self.max_age:
+            vencido = time.time() - mtime > self.max_age
+        if datos is not None and not vencido:
+            self._aplicar(datos["tablas"], datos["generado_en"], "snapshot")
+            self._mtime = mtime
+            self.lectura_ms = (time.perf_counter() - inicio) * 1000
+            return self.fuente
+        return self.refrescar()
+
+    def refrescar(self) -> str:
+        """Vuelve a leer el catálogo de la base y reescribe el snapshot."""
+        inicio = time.perf_counter()
+        tablas = leer_schema(self.engine, self.excluir)
+        self._aplicar(tablas, datetime.now(timezone.utc).isoformat(timespec="seconds"), "catalog")
+        self._escribir_archivo()
+        self.lectura_ms = (time.perf_counter() - inicio) * 1000
+        return self.fuente
+
+    def vigente(self) -> bool:
+        """
+        Recarga el snapshot si otro worker lo reescribió. Devuelve True si
+        hubo cambio. Es barato: un stat cada `check_interval` segundos.
+        """
+        ahora = time.monotonic()
+        if ahora - self._ultimo_chequeo < self.check_interval:
+            return False
+        self._ultimo_chequeo = ahora
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return False
+        if self._mtime is not None and mtime <= self._mtime:
+            return False
+        datos, mtime = self._leer_archivo()
+        if datos is None:
+            return False
+        self._mtime = mtime
+        if datos["fingerprint"] == self.fingerprint:
+            return False
+        self._aplicar(datos["tablas"], datos["generado_en"], "snapshot")
+        logger.info("Schema recargado del snapshot escrito por otro worker (huella %s)", self.fingerprint)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "tables": len(self.tablas),
+            "chars": len(self.texto),
+            "source": self.fuente,
+            "generated_at": self.generado_en,
+            "load_ms": round(self.lectura_ms, 1),
+            "path": self.path,
+        }
@@ -0,0 +1,77 @@
+import csv
+import io
+import sys
+
+
+def leer_filas(result, max_rows: int, chunk_size: int = 100, count_limit: int = 10000):
+    """
+    Lee el resultado por bloques (`chunk_size`) y conserva como máximo
+    `max_rows` filas. Las filas restantes sólo se cuentan, sin guardarlas,
+    hasta `count_limit`; así la memoria no depende del tamaño del resultado.
+    Devuelve (filas, omitidas, conteo_exacto).
+    """
+    filas = []
+    omitidas = 0
+    try:
+        for bloque in result.partitions(chunk_size):
+            libres = max_rows - len(filas)
+            if libres > 0:
+                filas.extend(bloque[:libres])
+                omitidas += max(len(bloque) - libres, 0)
+            else:
+                omitidas += len(bloque)
+            if omitidas >= count_limit:
+                return filas, omitidas, False
+    finally:
+        result.close()
+    return filas, omitidas, True
+
+
+def tamano_filas(rows) -> int:
+    """Bytes aproximados que ocupan en memoria las filas (0 si no hay)."""
+    if not rows:
+        return 0
+    return sum(sys.getsizeof(row) + sum(sys.getsizeof(v) for v in row) for row in rows)
+
+
+def _celda(v) -> str:
+    if v is None:
+        return ""
+    return str(v).replace("\r", " ").replace("\n", " ")
+
+
+def serializar(columns, rows, omitidas: int = 0, conteo_exacto: bool = True,
+               max_bytes: int = 16000):
+    """
+    Codifica el resultado como CSV compacto (primera línea = columnas) para
+    el prompt de respuesta, sin pasar de `max_bytes`. Si no caben todas las
+    filas se agrega un marcador explícito de truncado.
+    Devuelve (texto, filas_incluidas).
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+
+    def linea(values) -> str:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(values)
+        return buffer.getvalue()
+
+    lineas = [linea(columns)]
+    usados = len(lineas[0].encode())
+    incluidas = 0
+    for row in rows:
+        texto_fila = linea([_celda(v) for v in row])
+        tam = len(texto_fila.encode())
+        if usados + tam > max_bytes:
+            break
+        lineas.append(texto_fila)
+        usados += tam
+        incluidas += 1
+
+    restantes = omitidas + (len(rows) - incluidas)
+    texto = "".join(lineas)
+    if restantes:
+        mas = "" if conteo_exacto else "al menos "
+        texto += f"... (truncado, {mas}{restantes} filas más)\n"
+    return texto, incluidas
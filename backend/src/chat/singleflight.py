@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+
+class SingleFlight:
+    """
+    Agrupa peticiones concurrentes con la misma clave: la primera (líder)
+    ejecuta el trabajo y las demás (seguidoras) esperan su resultado en vez
+    de repetir las llamadas al LLM y a la base de datos.
+
+    El trabajo corre en su propia tarea, así que si el cliente del líder se
+    desconecta las seguidoras igual reciben la respuesta. Una seguidora no
+    espera más de `timeout` segundos: si el líder tarda demasiado lanza
+    `asyncio.TimeoutError` y el llamador decide (normalmente, hacerlo solo).
+    """
+
+    def __init__(self, timeout: float = 30.0):
+        self.timeout = timeout
+        self._en_vuelo = {}  # clave -> asyncio.Task
+        self.leaders = 0
+        self.deduplicated = 0
+        self.timeouts = 0
+        self.total_wait_ms = 0.0
+
+    def lanzar(self, clave, trabajo):
+        """
+        Como `do`, pero sin esperar: si no hay nada en vuelo con `clave`,
+        arranca `trabajo` como líder. Devuelve (tarea, es_lider).
+        """
+        tarea = self._en_vuelo.get(clave)
+        if tarea is not None:
+            return tarea, False
+        self.leaders += 1
+        tarea = asyncio.ensure_future(trabajo())
+        self._en_vuelo[clave] = tarea
+        tarea.add_done_callback(lambda t: self._terminar(clave, t))
+        return tarea, True
+
+    async def do(self, clave, trabajo):
+        """
+        Devuelve (resultado, es_lider). `trabajo` es una función sin
+        argumentos que devuelve una corrutina.
+        """
+        tarea, es_lider = self.lanzar(clave, trabajo)
+        if es_lider:
+            return await asyncio.shield(tarea), True
+
+        inicio = time.perf_counter()
+        try:
+            resultado = await asyncio.wait_for(asyncio.shield(tarea), self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.total_wait_ms += (time.perf_counter() - inicio) * 1000
+        self.deduplicated += 1
+        return resultado, False
+
+    def en_curso(self, clave) -> bool:
+        return clave in self._en_vuelo
+
+    def _terminar(self, clave, tarea):
+        if self._en_vuelo.get(clave) is tarea:
+            del self._en_vuelo[clave]
+        if not tarea.cancelled():
+            tarea.exception()  # evita el aviso de "exception was never retrieved"
+
+    def stats(self) -> dict:
+        esperas = self.deduplicated + self.timeouts
+        return {
+            "in_flight": len(self._en_vuelo),
+            "leaders": self.leaders,
+            "deduplicated": self.deduplicated,
+            "timeouts": self.timeouts,
+            "timeout_seconds": self.timeout,
+            "avg_wait_ms": round(self.total_wait_ms / esperas, 3) if esperas else 0.0,
+        }
+
+
+class Difusion:
+    """
+    Eventos que produce la tarea de un líder, para que quien los lea los
+    reciba a medida que llegan (p. ej. el stream del líder) aunque la
+    tarea siga corriendo después de que el lector se vaya.
+    """
+
+    def __init__(self):
+        self.eventos = []
+        self.terminada = False
+        self._aviso = asyncio.Event()
+
+    def publicar(self, evento):
+        self.eventos.append(evento)
+        self._avisar()
+
+    def cerrar(self):
+        self.terminada = True
+        self._avisar()
+
+    def _avisar(self):
+        aviso, self._aviso = self._aviso, asyncio.Event()
+        aviso.set()
+
+    async def leer(self):
+        vistos = 0
+        while True:
+            aviso = self._aviso
+            if vistos < len(self.eventos):
+                evento = self.eventos[vistos]
+                vistos += 1
+                yield evento
+            elif self.terminada:
+                return
+            else:
+                await aviso.wait()
@@ -0,0 +1,205 @@
+import json
+import re
+
+from sqlalchemy import text
+
+# Palabras que no pueden aparecer en una consulta de sólo lectura. Como la
+# sentencia debe empezar por SELECT/WITH, basta con vetar las que pueden
+# colarse dentro de ella (CTEs que modifican datos, SELECT INTO, etc.).
+PALABRAS_PROHIBIDAS = {
+    "insert", "update", "delete", "merge", "drop", "alter", "create",
+    "truncate", "grant", "revoke", "copy", "call", "execute", "vacuum",
+    "lock", "into",
+}
+
+# Funciones con efectos secundarios o que leen del servidor
+FUNCIONES_PROHIBIDAS = {
+    "pg_sleep", "pg_read_file", "pg_read_binary_file", "pg_ls_dir",
+    "pg_stat_file", "lo_import", "lo_export", "dblink", "dblink_exec",
+    "pg_terminate_backend", "pg_cancel_backend", "set_config",
+    "pg_reload_conf",
+}
+
+# Tablas internas u operativas (cuentas, historial de chats, métricas,
+# lotes y sincronización entre workers): no entran en el schema que ve el
+# LLM y el SQL generado no puede leerlas.
+TABLAS_INTERNAS = frozenset({
+    "tipos_usuario", "usuarios", "sistema_chatbot", "chats", "consultas",
+    "respuestas", "metricas_consulta", "resumenes_chat", "lotes_chat",
+    "versiones_datos",
+})
+
+_TOKEN = re.compile(
+    r"""
+      (?P<espacio>\s+)
+    | (?P<comentario>--[^\n]*|/\*.*?\*/)
+    | (?P<cadena>'(?:[^']|'')*')
+    | (?P<dolar>\$(?P<tag>[A-Za-z_]*)\$.*?\$(?P=tag)\$)
+    | (?P<identificador>"(?:[^"]|"")*")
+    | (?P<numero>\d+(?:\.\d+)?)
+    | (?P<palabra>[A-Za-z_][A-Za-z0-9_$]*)
+    | (?P<simbolo>.)
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class SQLRechazada(Exception):
+    """Consulta rechazada por el guardián, con un motivo estructurado."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+    def to_dict(self) -> dict:
+        return {"code": self.code, "message": self.message}
+
+
+def _tokens(sql: str) -> list:
+    """
+    Tokeniza la consulta. Devuelve tuplas (tipo, valor, profundidad,
+    inicio, fin); la profundidad cuenta paréntesis abiertos. Los
+    comentarios y espacios se descartan.
+    """
+    tokens = []
+    profundidad = 0
+    pos = 0
+    while pos < len(sql):
+        m = _TOKEN.match(sql, pos)
+        if m.group("simbolo") and m.group("simbolo") in "'\"$" and m.end() == pos + 1:
+            # Cadena o identificador sin cerrar
+            raise SQLRechazada("parse_error", "La consulta tiene comillas sin cerrar.")
+        pos = m.end()
+        tipo = m.lastgroup if m.lastgroup != "tag" else "dolar"
+        if tipo in ("espacio", "comentario"):
+            continue
+        valor = m.group(0)
+        if valor == ")":
+            profundidad -= 1
+            if profundidad < 0:
+                raise SQLRechazada("parse_error", "Paréntesis desbalanceados.")
+        tokens.append((tipo, valor.lower() if tipo == "palabra" else valor, profundidad, m.start(), m.end()))
+        if valor == "(":
+            profundidad += 1
+    if profundidad != 0:
+        raise SQLRechazada("parse_error", "Paréntesis desbalanceados.")
+    return tokens
+
+
+def literales(sql: str) -> list:
+    """
+    Cadenas y números de la consulta como (tipo, valor, inicio, fin,
+    palabra_previa); `palabra_previa` es la palabra clave anterior (p. ej.
+    "limit"), o None.
+    """
+    resultado = []
+    previa = None
+    for tipo, valor, _, inicio, fin in _tokens(sql):
+        if tipo in ("cadena", "numero"):
+            resultado.append((tipo, valor, inicio, fin, previa))
+        previa = valor if tipo == "palabra" else None
+    return resultado
+
+
+def _sin_comentarios(sql: str) -> str:
+    """Quita los comentarios (respetando cadenas) para poder agregar el LIMIT al final."""
+    partes = []
+    pos = 0
+    while pos < len(sql):
+        m = _TOKEN.match(sql, pos)
+        partes.append(" " if m.lastgroup == "comentario" else m.group(0))
+        pos = m.end()
+    return "".join(partes)
+
+
+def _nombre(tipo: str, valor: str) -> str:
+    """Nombre de un identificador, sin comillas ni mayúsculas."""
+    if tipo == "identificador":
+        return valor[1:-1].replace('""', '"').lower()
+    return valor
+
+
+def validar_sql(sql: str, max_limit: int = 1000, tablas_prohibidas=TABLAS_INTERNAS) -> str:
+    """
+    Verifica que `sql` sea una única consulta SELECT de sólo lectura que no
+    toque `tablas_prohibidas` y la reescribe con un LIMIT acotado a
+    `max_limit` (lo agrega si falta o lo reduce si es mayor). Lanza
+    SQLRechazada con el motivo si no es válida.
+    """
+    sql = _sin_comentarios(sql).strip().rstrip(";").strip()
+    if not sql:
+        raise SQLRechazada("empty", "La consulta está vacía.")
+
+    tokens = _tokens(sql)
+    if not tokens:
+        raise SQLRechazada("empty", "La consulta está vacía.")
+
+    if any(t[1] == ";" for t in tokens):
+        raise SQLRechazada("multiple_statements", "Sólo se permite una sentencia.")
+
+    primera = tokens[0][1]
+    if primera not in ("select", "with") and not (primera == "(" and len(tokens) > 1 and tokens[1][1] == "select"):
+        raise SQLRechazada("not_select", "Operación no permitida. Solo se permiten consultas SELECT.")
+
+    palabras = [t for t in tokens if t[0] == "palabra"]
+    for i, (_, palabra, _, _, _) in enumerate(palabras):
+        if palabra in PALABRAS_PROHIBIDAS:
+            raise SQLRechazada("forbidden_keyword", f"La consulta contiene '{palabra.upper()}', que no está permitido.")
+        if palabra == "for" and i + 1 < len(palabras) and palabras[i + 1][1] in ("share", "update", "no", "key"):
+            raise SQLRechazada("locking_clause", "No se permiten cláusulas FOR UPDATE/SHARE.")
+    for i, token in enumerate(tokens[:-1]):
+        if token[0] == "palabra" and token[1] in FUNCIONES_PROHIBIDAS and tokens[i + 1][1] == "(":
+            raise SQLRechazada("forbidden_function", f"La función '{token[1]}' no está permitida.")
+    # Cualquier mención basta (también "public.usuarios" o "Usuarios" entre
+    # comillas): un alias con el mismo nombre también se rechaza
+    for tipo, valor, _, _, _ in tokens:
+        if tipo in ("palabra", "identificador") and _nombre(tipo, valor) in tablas_prohibidas:
+            raise SQLRechazada("forbidden_table", f"La tabla '{_nombre(tipo, valor)}' no está disponible para consultas.")
+
+    # --- LIMIT a nivel superior ---
+    nivel0 = [(i, t) for i, t in enumerate(tokens) if t[2] == 0]
+    limites = [(i, t) for i, t in nivel0 if t[0] == "palabra" and t[1] == "limit"]
+    if limites:
+        i, _ = limites[-1]
+        siguiente = tokens[i + 1] if i + 1 < len(tokens) else None
+        if siguiente is None:
+            raise SQLRechazada("parse_error", "LIMIT sin valor.")
+        if siguiente[0] == "numero" and "." not in siguiente[1] and int(siguiente[1]) <= max_limit:
+            return sql
+        # LIMIT ALL, LIMIT grande o expresión: se reemplaza por el máximo
+        return sql[:siguiente[3]] + str(max_limit) + sql[siguiente[4]:]
+    if any(t[0] == "palabra" and t[1] == "fetch" for _, t in nivel0):
+        raise SQLRechazada("unsupported_fetch", "Usa LIMIT en lugar de FETCH FIRST.")
+    return f"{sql} LIMIT {max_limit}"
+
+
+def aplicar_limites(db, timeout_ms: int):
+    """
+    Prepara la transacción del SQL generado (PostgreSQL): la marca como de
+    sólo lectura, aunque la conexión tenga permisos de escritura, y limita
+    la duración de la sentencia.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    db.execute(text("SET TRANSACTION READ ONLY"))
+    if timeout_ms:
+        db.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+
+
+def verificar_costo(db, sql: str, max_cost: float, params: dict = None):
+    """
+    Ejecuta EXPLAIN y rechaza la consulta si el costo estimado del plan
+    supera `max_cost` (PostgreSQL; con max_cost=0 no se verifica).
+    """
+    if not max_cost or db.get_bind().dialect.name != "postgresql":
+        return
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params or {}).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    costo = plan[0]["Plan"]["Total Cost"]
+    if costo > max_cost:
+        raise SQLRechazada(
+            "cost_exceeded",
+            f"El costo estimado de la consulta ({costo:.0f}) supera el máximo permitido ({max_cost:.0f}).",
+        )
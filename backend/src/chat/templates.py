@@ -0,0 +1,312 @@
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from src.models import Curso, Docente, Ubicacion
+from .normalize import normalizar_texto
+from .sql_guard import literales
+
+# Tablas cuyos nombres se reconocen como entidades en las preguntas
+TABLAS_ENTIDADES = {"ubicaciones", "docentes", "cursos"}
+
+
+def _sin_tildes(texto: str) -> str:
+    texto = unicodedata.normalize("NFKD", texto)
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+# Cómo pudo escribir el LLM el nombre en el literal: (minúsculas,
+# mayúsculas, sin_tildes), de la más fiel a la menos fiel
+FORMAS = (
+    (False, False, False),
+    (True, False, False),
+    (False, True, False),
+    (False, False, True),
+    (True, False, True),
+    (False, True, True),
+)
+
+
+def _aplicar_forma(valor: str, forma: tuple) -> str:
+    minusculas, mayusculas, sin_tildes = forma
+    if sin_tildes:
+        valor = _sin_tildes(valor)
+    if minusculas:
+        valor = valor.lower()
+    elif mayusculas:
+        valor = valor.upper()
+    return valor
+
+
+class SQLTemplate:
+    """Consulta parametrizada aprendida para un patrón de pregunta."""
+
+    def __init__(self, patron: str, sql: str, parametros: list, ejemplos: set):
+        self.patron = patron
+        self.sql = sql
+        # Por parámetro: (índice de la entidad, prefijo, sufijo, forma)
+        self.parametros = parametros
+        self.ejemplos = ejemplos
+        self.hits = 0
+        self.aprendido = time.time()
+        self.ultimo_hit = None
+
+    def enlazar(self, valores: list) -> dict:
+        params = {}
+        for i, (slot, prefijo, sufijo, forma) in enumerate(self.parametros):
+            tipo, valor = valores[slot]
+            if tipo == "numero":
+                params[f"p{i}"] = int(valor)
+            else:
+                params[f"p{i}"] = f"{prefijo}{_aplicar_forma(valor, forma)}{sufijo}"
+        return params
+
+
+class TemplateLibrary:
+    """
+    Plantillas de SQL aprendidas de las salidas exitosas del paso 1.
+
+    Cada pregunta se reduce a un patrón reemplazando las entidades
+    conocidas (nombres de `ubicaciones`, `docentes` y `cursos`, códigos de
+    curso y números) por marcadores: "¿Dónde queda el Aula B12?" ->
+    "donde queda el {ubicacion}". Si el SQL que generó el LLM usa esas
+    entidades como literales, se guarda con parámetros (:p0, :p1...) en vez
+    de los literales. El patrón se activa cuando `min_examples` preguntas
+    con valores distintos produjeron la misma consulta parametrizada; desde
+    entonces las preguntas con ese patrón se responden con la consulta y
+    los valores enlazados, sin llamar al LLM.
+
+    Sólo se aprende si todas las entidades de la pregunta quedan como
+    parámetros y si, al enlazar el ejemplo, se obtiene exactamente el
+    literal original; así la plantilla nunca ejecuta algo distinto de lo
+    que el LLM generó para ese ejemplo. Una plantilla cuyo SQL falla al
+    ejecutarse se retira (`degradar`) y el patrón vuelve a aprenderse.
+
+    Los patrones aún sin activar se guardan hasta `max_candidates` (se
+    descartan los que no se vieron hace más tiempo), con a lo sumo
+    `MAX_VARIANTES` consultas distintas por patrón.
+    """
+
+    MAX_VARIANTES = 4
+
+    def __init__(self, min_examples: int = 2, max_templates: int = 500, max_candidates: int = 2000):
+        self.min_examples = min_examples
+        self.max_templates = max_templates
+        self.max_candidates = max_candidates
+        self.lookups = 0
+        self.hits = 0
+        self.learned = 0
+        self.conflicts = 0
+        self.demoted = 0
+        self.obsoleto = False
+        self._plantillas = {}   # patrón -> SQLTemplate activa
+        self._candidatas = OrderedDict()  # patrón -> {(sql parametrizado, parámetros): (parámetros, ejemplos)}
+        self._entidades = {}    # primer token -> [(tokens, tipo, nombre)] del más largo al más corto
+        self._n_entidades = 0
+        self._fingerprint = None
+        self._lock = threading.Lock()
+
+    # --- Entidades conocidas ---
+
+    def cargar_entidades(self, db) -> int:
+        """Reconstruye el diccionario de entidades desde la base de datos."""
+        # Antes de leer: una escritura durante la carga vuelve a marcarlo
+        self.obsoleto = False
+        fuentes = (
+            ("curso", db.query(Curso.codigo_curso)),
+            ("curso", db.query(Curso.nombre)),
+            ("docente", db.query(Docente.nombres_completos)),
+            ("ubicacion", db.query(Ubicacion.nombre)),
+        )
+        vistos = set()
+        entidades = {}
+        for tipo, consulta in fuentes:
+            for (nombre,) in consulta:
+                tokens = tuple(normalizar_texto(nombre or "").split())
+                # Un nombre repetido en dos tablas se queda con la primera
+                if not tokens or tokens in vistos:
+                    continue
+                vistos.add(tokens)
+                entidades.setdefault(tokens[0], []).append((tokens, tipo, nombre))
+        for lista in entidades.values():
+            lista.sort(key=lambda e: len(e[0]), reverse=True)
+        self._entidades = entidades
+        self._n_entidades = len(vistos)
+        return self._n_entidades
+
+    def marcar_obsoleto(self, tablas):
+        """Callback de escritura: las entidades se recargan en la siguiente búsqueda."""
+        if TABLAS_ENTIDADES & {t.lower() for t in tablas}:
+            self.obsoleto = True
+
+    def patron(self, pregunta: str):
+        """
+        Devuelve (patrón, valores): la pregunta normalizada con las
+        entidades reemplazadas por {tipo} y la lista de (tipo, valor).
+        """
+        tokens = normalizar_texto(pregunta).split()
+        partes, valores = [], []
+        i = 0
+        while i < len(tokens):
+            for candidato, tipo, nombre in self._entidades.get(tokens[i], ()):
+                if tuple(tokens[i:i + len(candidato)]) == candidato:
+                    partes.append("{" + tipo + "}")
+                    valores.append((tipo, nombre))
+                    i += len(candidato)
+                    break
+            else:
+                if tokens[i].isdigit():
+                    partes.append("{numero}")
+                    valores.append(("numero", tokens[i]))
+                else:
+                    partes.append(tokens[i])
+                i += 1
+        return " ".join(partes), valores
+
+    def _verificar_schema(self, fingerprint: str):
+        # Con otro schema las consultas aprendidas pueden no ser válidas
+        if fingerprint != self._fingerprint:
+            self._plantillas.clear()
+            self._candidatas.clear()
+            self._fingerprint = fingerprint
+
+    # --- Aprendizaje ---
+
+    def _parametrizar(self, sql: str, valores: list):
+        """SQL con parámetros y su especificación, o None si no se puede aprender."""
+        partes, parametros, usados = [], [], set()
+        pos = 0
+        for tipo, literal, inicio, fin, previa in literales(sql):
+            if previa in ("limit", "offset"):
+                continue  # el tope de filas lo fija el guardián, no la pregunta
+            slot = forma = None
+            prefijo = sufijo = ""
+            if tipo == "numero":
+                slot = next((i for i, (t, v) in enumerate(valores) if t == "numero" and v == literal), None)
+            else:
+                contenido = literal[1:-1].replace("''", "'")
+                nucleo = contenido.strip("%")
+                prefijo = contenido[:len(contenido) - len(contenido.lstrip("%"))]
+                sufijo = contenido[len(contenido.rstrip("%")):]
+                slot, forma = next(
+                    ((i, f) for i, (t, v) in enumerate(valores) if t != "numero"
+                     for f in FORMAS if _aplicar_forma(v, f) == nucleo),
+                    (None, None),
+                )
+            if slot is None:
+                continue  # literal propio de la intención (p. ej. estado = 'validado')
+            partes.append(sql[pos:inicio])
+            partes.append(f":p{len(parametros)}")
+            parametros.append((slot, prefijo, sufijo, forma))
+            usados.add(slot)
+            pos = fin
+        # Una entidad que no llega al SQL no influye en la respuesta: no es plantilla
+        if not parametros or len(usados) != len(valores):
+            return None
+        partes.append(sql[pos:])
+        return "".join(partes), parametros
+
+    def aprender(self, pregunta: str, sql: str, fingerprint: str) -> bool:
+        """
+        Registra un par pregunta -> SQL exitoso. Devuelve True si con él se
+        activó una plantilla nueva.
+        """
+        if self.obsoleto:
+            return False
+        patron, valores = self.patron(pregunta)
+        if not valores or all(p.startswith("{") for p in patron.split()):
+            return False
+        resultado = self._parametrizar(sql, valores)
+        if resultado is None:
+            return False
+        sql_param, parametros = resultado
+        with self._lock:
+            self._verificar_schema(fingerprint)
+            activa = self._plantillas.get(patron)
+            if activa is not None:
+                if activa.sql != sql_param:
+                    self.conflicts += 1
+                return False
+            # Los ejemplos cuentan juntos sólo si coinciden SQL y forma de los literales
+            candidatas = self._candidatas.setdefault(patron, {})
+            self._candidatas.move_to_end(patron)
+            while len(self._candidatas) > self.max_candidates:
+                self._candidatas.popitem(last=False)
+            clave = (sql_param, tuple(parametros))
+            if clave not in candidatas and len(candidatas) >= self.MAX_VARIANTES:
+                del candidatas[next(iter(candidatas))]
+            _, ejemplos = candidatas.setdefault(clave, (parametros, set()))
+            ejemplos.add(tuple(v for _, v in valores))
+            if len(ejemplos) < self.min_examples:
+                return False
+            if len(self._plantillas) >= self.max_templates:
+                # Se descarta la plantilla menos usada
+                menos_usada = min(self._plantillas.values(), key=lambda t: t.hits)
+                del self._plantillas[menos_usada.patron]
+            self._plantillas[patron] = SQLTemplate(patron, sql_param, parametros, ejemplos)
+            del self._candidatas[patron]
+            self.learned += 1
+            return True
+
+    def degradar(self, pregunta: str) -> bool:
+        """
+        Retira la plantilla activa del patrón de `pregunta` (su SQL falló al
+        ejecutarse). Devuelve True si había una.
+        """
+        patron, _ = self.patron(pregunta)
+        with self._lock:
+            if self._plantillas.pop(patron, None) is None:
+                return False
+            self.demoted += 1
+            return True
+
+    # --- Búsqueda ---
+
+    def buscar(self, pregunta: str, fingerprint: str):
+        """Devuelve (sql, params, patrón) si la pregunta tiene una plantilla activa, o None."""
+        patron, valores = self.patron(pregunta)
+        with self._lock:
+            self._verificar_schema(fingerprint)
+            self.lookups += 1
+            plantilla = self._plantillas.get(patron) if valores else None
+            if plantilla is None:
+                return None
+            self.hits += 1
+            plantilla.hits += 1
+            plantilla.ultimo_hit = time.time()
+        return plantilla.sql, plantilla.enlazar(valores), patron
+
+    def __len__(self):
+        return len(self._plantillas)
+
+    def stats(self) -> dict:
+        return {
+            "templates": len(self._plantillas),
+            "candidates": len(self._candidatas),
+            "entities": self._n_entidades,
+            "min_examples": self.min_examples,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+            "learned": self.learned,
+            "conflicts": self.conflicts,
+            "demoted": self.demoted,
+        }
+
+    def listar(self) -> list:
+        """Plantillas activas, de la más usada a la menos usada."""
+        with self._lock:
+            plantillas = sorted(self._plantillas.values(), key=lambda t: t.hits, reverse=True)
+        return [
+            {
+                "pattern": t.patron,
+                "sql": t.sql,
+                "hits": t.hits,
+                "hit_share": round(t.hits / self.hits, 4) if self.hits else 0.0,
+                "examples": len(t.ejemplos),
+                "learned_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t.aprendido)),
+                "last_hit_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t.ultimo_hit)) if t.ultimo_hit else None,
+            }
+            for t in plantillas
+        ]
@@ -1,24 +1,111 @@
+import logging
 import os
+import threading
+import time
 from pathlib import Path
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.ext.declarative import declarative_base
+from .observability.logs import configurar_logging
 BASE_DIR = Path(__file__).resolve().parent.parent
-env_path = BASE_DIR / ".env"
+# ENV_FILE permite usar otro archivo (p.ej. los benchmarks, que no deben
+# tomar la base de datos real del .env)
+env_path = Path(os.getenv("ENV_FILE") or BASE_DIR / ".env")
 load_dotenv(dotenv_path=env_path, override=True)
+configurar_logging()  # después del .env: LOG_LEVEL y LOG_FORMAT pueden venir de ahí
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-print(f"DEBUG: Cargando configuración desde: {env_path}")
-print(f"DEBUG: Base de datos objetivo: {DATABASE_URL}")
-
 if not DATABASE_URL:
     raise ValueError(" Error: No se encontró DATABASE_URL en el archivo .env")
 
+# Réplica o rol de sólo lectura para el SQL generado por el chat y los
+# listados. Si no se define, las lecturas usan la base principal.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or DATABASE_URL
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mide cuánto se espera por una conexión libre."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._metrics_lock = threading.Lock()
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            with self._metrics_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            espera = time.perf_counter() - inicio
+            with self._metrics_lock:
+                self.checkouts += 1
+                self.wait_seconds_total += espera
+                self.wait_seconds_max = max(self.wait_seconds_max, espera)
+
+    def metrics(self) -> dict:
+        capacidad = self.size() + self._max_overflow
+        return {
+            "size": self.size(),
+            "max_overflow": self._max_overflow,
+            "checked_out": self.checkedout(),
+            "overflow": self.overflow(),
+            "saturation": round(self.checkedout() / capacidad, 4) if capacidad > 0 else 0.0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "avg_wait_ms": round(self.wait_seconds_total / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+            "max_wait_ms": round(self.wait_seconds_max * 1000, 3),
+        }
+
+
+def _crear_engine(url: str, prefijo: str, pool_size: int, max_overflow: int):
+    """
+    Crea un engine con pool configurable por variables de entorno
+    (`{prefijo}_POOL_SIZE`, `_MAX_OVERFLOW`, `_POOL_TIMEOUT`, `_POOL_RECYCLE`,
+    `_POOL_PRE_PING`). SQLite (desarrollo) usa su pool por defecto.
+    """
+    if url.startswith("sqlite"):
+        return create_engine(url)
+    return create_engine(
+        url,
+        poolclass=MeteredQueuePool,
+        pool_size=int(os.getenv(f"{prefijo}_POOL_SIZE", str(pool_size))),
+        max_overflow=int(os.getenv(f"{prefijo}_MAX_OVERFLOW", str(max_overflow))),
+        pool_timeout=float(os.getenv(f"{prefijo}_POOL_TIMEOUT", "10")),
+        pool_recycle=int(os.getenv(f"{prefijo}_POOL_RECYCLE", "1800")),
+        pool_pre_ping=os.getenv(f"{prefijo}_POOL_PRE_PING", "true").lower() == "true",
+    )
+
+
 # 3. Configurar la conexión
-engine = create_engine(DATABASE_URL)
+# Escrituras (logins, registros) en la principal; lecturas en su propio pool
+# para que las consultas analíticas del chat no acaparen las conexiones.
+engine = _crear_engine(DATABASE_URL, "DB", pool_size=5, max_overflow=10)
+if DATABASE_READ_URL == DATABASE_URL and DATABASE_URL.startswith("sqlite"):
+    read_engine = engine
+else:
+    read_engine = _crear_engine(DATABASE_READ_URL, "DB_READ", pool_size=10, max_overflow=10)
+
+# Sin la contraseña: estos logs pueden terminar en un agregador
+logger.info("Configuración cargada desde %s", env_path)
+logger.info(
+    "Base de datos: %s (lectura: %s)",
+    engine.url.render_as_string(hide_password=True),
+    read_engine.url.render_as_string(hide_password=True),
+)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
 def get_db():
@@ -26,4 +113,80 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_read_db():
+    """Sesión de sólo lectura (réplica / rol read-only si está configurado)."""
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def pool_metrics() -> dict:
+    """Tiempo de espera y saturación de cada pool de conexiones."""
+    pools = {"write": engine.pool}
+    if read_engine is not engine:
+        pools["read"] = read_engine.pool
+    return {
+        nombre: pool.metrics() if isinstance(pool, MeteredQueuePool) else {"status": pool.status()}
+        for nombre, pool in pools.items()
+    }
+
+
+# --- Tablas modificadas ---
+# Cada escritura confirmada con el ORM avisa a los interesados (cachés,
+# índices) qué tablas tocó. Las cargas que no pasan por el ORM deben llamar
+# a `marcar_modificadas`. Es un aviso local a este proceso: lo que hay que
+# compartir entre workers no debe depender sólo de él (ver
+# `al_confirmar_escritura`).
+_listeners_tablas = []
+_listeners_commits = []
+
+
+def al_modificar_tablas(callback):
+    """Registra `callback(tablas)` para cada escritura confirmada."""
+    _listeners_tablas.append(callback)
+    return callback
+
+
+def al_confirmar_escritura(callback):
+    """
+    Registra `callback(tablas)` sólo para las escrituras del ORM confirmadas
+    en este proceso, no para los avisos de `marcar_modificadas` (que pueden
+    venir de otro proceso): sirve para reenviarlas a los demás workers sin
+    rebotar los avisos que llegaron de ellos.
+    """
+    _listeners_commits.append(callback)
+    return callback
+
+
+def marcar_modificadas(tablas):
+    tablas = set(tablas)
+    for callback in _listeners_tablas:
+        callback(tablas)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _anotar_tablas(session, flush_context):
+    tablas = session.info.setdefault("tablas_modificadas", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        tabla = getattr(obj, "__tablename__", None)
+        if tabla:
+            tablas.add(tabla)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _notificar_tablas(session):
+    tablas = session.info.pop("tablas_modificadas", None)
+    if tablas:
+        marcar_modificadas(tablas)
+        for callback in _listeners_commits:
+            callback(tablas)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar_tablas(session):
+    session.info.pop("tablas_modificadas", None)
@@ -0,0 +1,85 @@
+"""
+Carga masiva de datos de referencia desde CSV o JSONL.
+
+Uso (desde backend/):
+    python -m src.ingest cursos cursos.csv
+    python -m src.ingest docente_curso_info asignaciones.jsonl --batch-size 2000
+    python -m src.ingest preguntas_frecuentes faq.csv --notify http://localhost:8000
+
+La cabecera del CSV (o las llaves del JSONL) son los nombres de las
+columnas. En docente_curso_info se puede usar `correo_docente` en lugar de
+`id_docente`.
+
+Al terminar, la carga sube la versión de la tabla en `versiones_datos`;
+cada worker de la API la revisa cada INGEST_POLL_INTERVAL segundos e
+invalida sus cachés e índices (FAQ, búsqueda, plantillas de SQL,
+resultados). Con --notify además se avisa de inmediato al worker que
+atienda la petición; requiere un token de administrador (--token o la
+variable TRIKABOT_ADMIN_TOKEN).
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.request
+
+from src.database import SessionLocal, engine
+from src.models import VersionDatos
+
+from .loader import TABLAS, BulkLoader, detectar_formato
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def notificar(url_api: str, tabla: str, token: str):
+    peticion = urllib.request.Request(
+        url_api.rstrip("/") + "/api/admin/ingest/refresh",
+        data=json.dumps({"tables": [tabla]}).encode(),
+        headers={"Content-Type": "application/json", "Authorization": f"Bearer {token}"},
+        method="POST",
+    )
+    with urllib.request.urlopen(peticion, timeout=30) as respuesta:
+        return json.load(respuesta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("tabla", choices=list(TABLAS))
+    parser.add_argument("archivo")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="por defecto, según la extensión")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--notify", metavar="URL_API",
+                        help="URL de la API para que refresque al terminar sin esperar a INGEST_POLL_INTERVAL")
+    parser.add_argument("--token", default=os.getenv("TRIKABOT_ADMIN_TOKEN"),
+                        help="token de un administrador para --notify (por defecto, TRIKABOT_ADMIN_TOKEN)")
+    args = parser.parse_args()
+    if args.notify and not args.token:
+        parser.error("--notify requiere un token de administrador (--token o TRIKABOT_ADMIN_TOKEN)")
+
+    VersionDatos.__table__.create(bind=engine, checkfirst=True)
+
+    formato = args.format or detectar_formato(args.archivo)
+    loader = BulkLoader(SessionLocal, args.tabla, batch_size=args.batch_size)
+    with open(args.archivo, encoding="utf-8-sig", newline="") as archivo:
+        reporte = loader.cargar(archivo, formato)
+
+    print(f"{reporte['table']}: {reporte['rows_read']} filas leídas, {reporte['inserted']} nuevas, "
+          f"{reporte['updated']} actualizadas, {reporte['rejected']} rechazadas "
+          f"en {reporte['seconds']}s ({reporte['rows_per_second']} filas/s, {reporte['batches']} lotes)")
+    if resource is not None:
+        # ru_maxrss está en KB en Linux
+        print(f"Memoria máxima del proceso: {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    for error in reporte["errors"]:
+        print(f"  línea {error['line']}: {error['error']}", file=sys.stderr)
+    if reporte["rejected"] > len(reporte["errors"]):
+        print(f"  ... y {reporte['rejected'] - len(reporte['errors'])} filas rechazadas más", file=sys.stderr)
+
+    if args.notify and (reporte["inserted"] or reporte["updated"]):
+        print("API notificada:", notificar(args.notify, args.tabla, args.token))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,396 @@
+import csv
+import json
+import logging
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from sqlalchemy import String, bindparam, insert, select, tuple_, update
+
+from src.database import marcar_modificadas
+from src.models import (
+    Curso,
+    Docente,
+    DocenteCursoInfo,
+    FuenteInformacion,
+    PreguntaFrecuente,
+    Tramite,
+    Ubicacion,
+)
+
+from .versions import publicar_cambios
+
+logger = logging.getLogger(__name__)
+
+# Por tabla: modelo, llave natural para el upsert, campos obligatorios,
+# referencias que se traducen a una FK (campo de entrada -> columna destino,
+# columna de búsqueda, columna del valor) y FKs que se validan.
+TABLAS = {
+    "cursos": {
+        "modelo": Curso,
+        "clave": ("codigo_curso",),
+        "requeridos": ("codigo_curso", "nombre"),
+    },
+    "docentes": {
+        "modelo": Docente,
+        "clave": ("correo_institucional",),
+        "requeridos": ("nombres_completos", "correo_institucional"),
+    },
+    "docente_curso_info": {
+        "modelo": DocenteCursoInfo,
+        "clave": ("id_docente", "codigo_curso"),
+        "requeridos": ("id_docente", "codigo_curso"),
+        # El archivo puede traer el correo del docente en vez de su id
+        "referencias": {"correo_docente": ("id_docente", Docente.correo_institucional, Docente.id_docente)},
+        "fks": {"id_docente": Docente.id_docente, "codigo_curso": Curso.codigo_curso},
+    },
+    "ubicaciones": {
+        "modelo": Ubicacion,
+        "clave": ("nombre",),
+        "requeridos": ("nombre", "tipo"),
+    },
+    "tramites": {
+        "modelo": Tramite,
+        "clave": ("titulo",),
+        "requeridos": ("titulo",),
+    },
+    "preguntas_frecuentes": {
+        "modelo": PreguntaFrecuente,
+        "clave": ("pregunta",),
+        "requeridos": ("pregunta", "respuesta"),
+        "fks": {"id_fuente": FuenteInformacion.id_fuente},
+    },
+}
+
+MAX_ERRORES_REPORTADOS = 50
+
+
+class FilaInvalida(ValueError):
+    pass
+
+
+# --- Conversión de valores por tipo de columna ---
+# `tipo(valor)` no sirve para todos: bool("false") es True, datetime no
+# acepta un texto e int(3.7) trunca en silencio.
+
+_BOOLEANOS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def _a_booleano(valor) -> bool:
+    if isinstance(valor, bool):
+        return valor
+    clave = str(valor).strip().lower()
+    if clave not in _BOOLEANOS:
+        raise ValueError(valor)
+    return _BOOLEANOS[clave]
+
+
+def _a_decimal(valor) -> Decimal:
+    # bool es subclase de int: true no es un número
+    if isinstance(valor, bool):
+        raise ValueError(valor)
+    try:
+        numero = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(valor)
+    if not numero.is_finite():
+        raise ValueError(valor)
+    return numero
+
+
+def _a_entero(valor) -> int:
+    numero = _a_decimal(valor)
+    if numero != numero.to_integral_value():
+        raise ValueError(valor)
+    return int(numero)
+
+
+def _a_fecha_hora(valor) -> datetime:
+    return valor if isinstance(valor, datetime) else datetime.fromisoformat(valor)
+
+
+def _a_fecha(valor) -> date:
+    if isinstance(valor, datetime):
+        raise ValueError(valor)
+    return valor if isinstance(valor, date) else date.fromisoformat(valor)
+
+
+# tipo de Python de la columna -> (conversor, lo que se esperaba)
+CONVERSORES = {
+    bool: (_a_booleano, "true/false/1/0"),
+    int: (_a_entero, "un entero"),
+    float: (lambda v: float(_a_decimal(v)), "un número"),
+    Decimal: (_a_decimal, "un número"),
+    datetime: (_a_fecha_hora, "fecha y hora ISO 8601 (AAAA-MM-DDTHH:MM:SS)"),
+    date: (_a_fecha, "fecha ISO 8601 (AAAA-MM-DD)"),
+}
+
+
+def convertir_valor(tipo: type, valor):
+    """Convierte `valor` (texto del CSV o valor del JSONL) al tipo de la columna."""
+    conversor, _ = CONVERSORES.get(tipo, (tipo, None))
+    if conversor is tipo and isinstance(valor, tipo):
+        return valor
+    return conversor(valor)
+
+
+def detectar_formato(nombre_archivo: str) -> str:
+    nombre = (nombre_archivo or "").lower()
+    if nombre.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    if nombre.endswith(".csv"):
+        return "csv"
+    raise ValueError("Formato no reconocido: usa un archivo .csv o .jsonl")
+
+
+def leer_filas(archivo, formato: str):
+    """
+    Recorre el archivo (ya abierto en modo texto) sin cargarlo entero.
+    Devuelve pares (número de línea, dict).
+    """
+    if formato == "csv":
+        lector = csv.DictReader(archivo)
+        for fila in lector:
+            yield lector.line_num, fila
+    elif formato == "jsonl":
+        for numero, linea in enumerate(archivo, start=1):
+            if not linea.strip():
+                continue
+            try:
+                fila = json.loads(linea)
+            except ValueError as e:
+                yield numero, FilaInvalida(f"JSON inválido: {e}")
+                continue
+            yield numero, fila if isinstance(fila, dict) else FilaInvalida("Se esperaba un objeto JSON")
+    else:
+        raise ValueError(f"Formato desconocido: {formato}")
+
+
+class BulkLoader:
+    """
+    Carga masiva de una tabla de referencia desde CSV o JSONL.
+
+    Lee el archivo por lotes de `batch_size` filas (la memoria no depende
+    del tamaño del archivo) y, por lote: convierte y valida cada fila,
+    traduce referencias y valida FKs con una consulta por columna, busca
+    las llaves naturales existentes con una sola consulta, y hace UPDATE e
+    INSERT con executemany. Cada lote se confirma por separado. Las filas
+    inválidas se cuentan y se reportan (hasta MAX_ERRORES_REPORTADOS) sin
+    detener la carga.
+
+    Al terminar (aunque falle a mitad) marca la tabla como modificada para
+    que se invaliden las cachés y los índices derivados del proceso, y sube
+    su versión en `versiones_datos` para que los demás procesos lo noten.
+    """
+
+    def __init__(self, session_factory, tabla: str, batch_size: int = 1000):
+        if tabla not in TABLAS:
+            raise ValueError(f"Tabla no soportada: {tabla}. Opciones: {', '.join(TABLAS)}")
+        self.session_factory = session_factory
+        self.tabla = tabla
+        self.batch_size = batch_size
+        spec = TABLAS[tabla]
+        self.modelo = spec["modelo"]
+        self.clave = spec["clave"]
+        self.requeridos = spec["requeridos"]
+        self.referencias = spec.get("referencias", {})
+        self.fks = spec.get("fks", {})
+        self.columnas = {c.name: c for c in self.modelo.__table__.columns}
+        self.pk = self.modelo.__table__.primary_key.columns.values()[0]
+
+        self.leidas = 0
+        self.insertadas = 0
+        self.actualizadas = 0
+        self.rechazadas = 0
+        self.lotes = 0
+        self.errores = []
+
+    # --- Validación por fila ---
+
+    def _convertir(self, fila: dict) -> dict:
+        limpia = {}
+        for campo, valor in fila.items():
+            if campo is None:
+                raise FilaInvalida("La fila tiene más columnas que la cabecera")
+            campo = campo.strip()
+            if isinstance(valor, str):
+                valor = valor.strip()
+            if valor == "" or valor is None:
+                valor = None
+            if campo in self.referencias:
+                limpia[campo] = valor
+                continue
+            columna = self.columnas.get(campo)
+            if columna is None:
+                raise FilaInvalida(f"Columna desconocida: {campo}")
+            if columna.primary_key and campo not in self.clave:
+                continue  # los ids los asigna la base
+            if valor is not None:
+                tipo = columna.type.python_type
+                try:
+                    valor = convertir_valor(tipo, valor)
+                except (TypeError, ValueError):
+                    esperado = CONVERSORES[tipo][1] if tipo in CONVERSORES else tipo.__name__
+                    raise FilaInvalida(f"{campo}: se esperaba {esperado}")
+                if isinstance(columna.type, String) and columna.type.length and len(valor) > columna.type.length:
+                    raise FilaInvalida(f"{campo}: supera {columna.type.length} caracteres")
+            limpia[campo] = valor
+        return limpia
+
+    def _rechazar(self, linea: int, motivo: str):
+        self.rechazadas += 1
+        if len(self.errores) < MAX_ERRORES_REPORTADOS:
+            self.errores.append({"line": linea, "error": motivo})
+
+    # --- Validación por lote ---
+
+    def _resolver_referencias(self, db, lote: list) -> list:
+        for campo, (destino, buscar, valor) in self.referencias.items():
+            buscados = {f[campo] for _, f in lote if f.get(campo) is not None}
+            mapa = dict(db.execute(select(buscar, valor).where(buscar.in_(buscados))).all()) if buscados else {}
+            validas = []
+            for linea, fila in lote:
+                referencia = fila.pop(campo, None)
+                if referencia is not None:
+                    if referencia not in mapa:
+                        self._rechazar(linea, f"{campo} no existe: {referencia}")
+                        continue
+                    fila[destino] = mapa[referencia]
+                validas.append((linea, fila))
+            lote = validas
+        return lote
+
+    def _validar_fks(self, db, lote: list) -> list:
+        for campo, referida in self.fks.items():
+            valores = {f[campo] for _, f in lote if f.get(campo) is not None}
+            if not valores:
+                continue
+            existentes = set(db.execute(select(referida).where(referida.in_(valores))).scalars())
+            faltantes = valores - existentes
+            if faltantes:
+                validas = []
+                for linea, fila in lote:
+                    if fila.get(campo) in faltantes:
+                        self._rechazar(linea, f"{campo} no existe: {fila[campo]}")
+                    else:
+                        validas.append((linea, fila))
+                lote = validas
+        return lote
+
+    def _procesar_lote(self, lote: list):
+        with self.session_factory() as db:
+            lote = self._resolver_referencias(db, lote)
+            faltan = []
+            for linea, fila in lote:
+                vacios = [c for c in self.requeridos if fila.get(c) is None]
+                if vacios:
+                    self._rechazar(linea, f"Faltan campos obligatorios: {', '.join(vacios)}")
+                else:
+                    faltan.append((linea, fila))
+            lote = self._validar_fks(db, faltan)
+            if not lote:
+                return
+
+            # Una llave repetida dentro del lote: gana la última fila
+            por_clave = {}
+            for _, fila in lote:
+                por_clave[tuple(fila[c] for c in self.clave)] = fila
+
+            columnas_clave = [self.columnas[c] for c in self.clave]
+            if len(columnas_clave) == 1:
+                filtro = columnas_clave[0].in_([k[0] for k in por_clave])
+            else:
+                filtro = tuple_(*columnas_clave).in_(list(por_clave))
+            existentes = {
+                tuple(fila[:-1]): fila[-1]
+                for fila in db.execute(select(*columnas_clave, self.pk).where(filtro))
+            }
+
+            nuevas, cambios = [], []
+            for clave, fila in por_clave.items():
+                if clave in existentes:
+                    cambios.append({**fila, "_pk": existentes[clave]})
+                else:
+                    nuevas.append(fila)
+            if nuevas:
+                # Las filas pueden traer columnas distintas; se agrupan por forma
+                for grupo in _agrupar_por_columnas(nuevas):
+                    db.execute(insert(self.modelo.__table__), grupo)
+            if cambios:
+                for grupo in _agrupar_por_columnas(cambios):
+                    campos = [c for c in grupo[0] if c != "_pk" and c != self.pk.name]
+                    if not campos:
+                        continue
+                    # SQLAlchemy reserva el nombre de la columna para el SET: se prefija
+                    db.execute(
+                        update(self.modelo.__table__)
+                        .where(self.pk == bindparam("_pk"))
+                        .values({c: bindparam(f"v_{c}") for c in campos}),
+                        [{"_pk": f["_pk"], **{f"v_{c}": f[c] for c in campos}} for f in grupo],
+                    )
+            db.commit()
+        self.insertadas += len(nuevas)
+        self.actualizadas += len(cambios)
+
+    # --- Carga ---
+
+    def _publicar(self):
+        try:
+            with self.session_factory() as db:
+                publicar_cambios(db, {self.tabla})
+        except Exception as e:
+            # Los datos ya están cargados; los demás workers no lo notarán hasta
+            # la próxima carga o un POST /api/admin/ingest/refresh
+            logger.warning("No se pudo publicar la carga de %s: %s", self.tabla, e)
+
+    def cargar(self, archivo, formato: str) -> dict:
+        inicio = time.perf_counter()
+        filas = leer_filas(archivo, formato)
+        try:
+            while True:
+                crudas = list(islice(filas, self.batch_size))
+                if not crudas:
+                    break
+                lote = []
+                for linea, fila in crudas:
+                    self.leidas += 1
+                    try:
+                        if isinstance(fila, FilaInvalida):
+                            raise fila
+                        lote.append((linea, self._convertir(fila)))
+                    except FilaInvalida as e:
+                        self._rechazar(linea, str(e))
+                self._procesar_lote(lote)
+                self.lotes += 1
+        finally:
+            if self.insertadas or self.actualizadas:
+                # Las escrituras con Core no pasan por los eventos del ORM
+                marcar_modificadas({self.tabla})
+                self._publicar()
+        segundos = time.perf_counter() - inicio
+        reporte = {
+            "table": self.tabla,
+            "format": formato,
+            "rows_read": self.leidas,
+            "inserted": self.insertadas,
+            "updated": self.actualizadas,
+            "rejected": self.rechazadas,
+            "batches": self.lotes,
+            "batch_size": self.batch_size,
+            "seconds": round(segundos, 3),
+            "rows_per_second": round(self.leidas / segundos, 1) if segundos else 0.0,
+            "errors": self.errores,
+        }
+        logger.info(
+            "Carga de %s: %d filas (%d nuevas, %d actualizadas, %d rechazadas) en %.2fs",
+            self.tabla, self.leidas, self.insertadas, self.actualizadas, self.rechazadas, segundos,
+        )
+        return reporte
+
+
+def _agrupar_por_columnas(filas: list) -> list:
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(tuple(sorted(fila)), []).append(fila)
+    return list(grupos.values())
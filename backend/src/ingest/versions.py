@@ -0,0 +1,94 @@
+"""
+Aviso de cargas masivas entre procesos.
+
+`marcar_modificadas` sólo alcanza al proceso que hizo la carga. Para que
+todos los workers de la API (y los que corran en otras máquinas) se
+enteren, cada carga sube el número de versión de su tabla en
+`versiones_datos`, y cada worker revisa esa tabla cada pocos segundos con
+un `VersionWatcher`: si otro proceso la cambió, invalida lo suyo.
+"""
+import asyncio
+import logging
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from src.models import VersionDatos
+
+logger = logging.getLogger(__name__)
+
+# Versiones que publicó este mismo proceso: ya las aplicó al cargar
+_publicadas = {}
+
+
+def publicar_cambios(db, tablas) -> dict:
+    """Sube la versión de cada tabla y devuelve {tabla: versión nueva}."""
+    tabla_versiones = VersionDatos.__table__
+    versiones = {}
+    for tabla in sorted(set(tablas)):
+        for _ in range(2):
+            resultado = db.execute(
+                update(tabla_versiones)
+                .where(tabla_versiones.c.tabla == tabla)
+                .values(version=tabla_versiones.c.version + 1)
+            )
+            if resultado.rowcount:
+                break
+            try:
+                with db.begin_nested():
+                    db.execute(insert(tabla_versiones).values(tabla=tabla, version=1))
+                break
+            except IntegrityError:
+                # Otro proceso la insertó a la vez: basta con subirla
+                continue
+        # Se lee antes del commit: la fila sigue bloqueada por nuestro UPDATE
+        versiones[tabla] = db.execute(
+            select(tabla_versiones.c.version).where(tabla_versiones.c.tabla == tabla)
+        ).scalar_one()
+    db.commit()
+    _publicadas.update(versiones)
+    return versiones
+
+
+class VersionWatcher:
+    """
+    Compara `versiones_datos` con lo último que vio y llama a
+    `al_cambiar(tablas)` con las tablas que otro proceso cargó desde
+    entonces. La primera revisión sólo toma la línea base.
+    """
+
+    def __init__(self, session_factory, al_cambiar, intervalo: float = 5.0):
+        self.session_factory = session_factory
+        self.al_cambiar = al_cambiar
+        self.intervalo = intervalo
+        self._vistas = None
+        self.revisiones = 0
+        self.cambios = 0
+
+    def revisar(self) -> set:
+        with self.session_factory() as db:
+            actuales = dict(db.execute(select(VersionDatos.tabla, VersionDatos.version)).all())
+        self.revisiones += 1
+        if self._vistas is None:
+            self._vistas = actuales
+            return set()
+        cambiadas = {
+            tabla for tabla, version in actuales.items()
+            if version != self._vistas.get(tabla) and version != _publicadas.get(tabla)
+        }
+        self._vistas = actuales
+        if cambiadas:
+            self.cambios += 1
+            logger.info("Tablas cargadas por otro proceso: %s", ", ".join(sorted(cambiadas)))
+            self.al_cambiar(cambiadas)
+        return cambiadas
+
+    async def correr(self):
+        """Revisa cada `intervalo` segundos hasta que se cancele la tarea."""
+        while True:
+            try:
+                await run_in_threadpool(self.revisar)
+            except Exception as e:
+                logger.warning("No se pudo revisar versiones_datos: %s", e)
+            await asyncio.sleep(self.intervalo)
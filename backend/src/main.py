@@ -1,25 +1,89 @@
+import time
+
+_INICIO_IMPORT = time.perf_counter()  # para reportar cuánto tarda importar la app
+
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import logging
 import os
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
 from dotenv import load_dotenv
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, Query, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware # Agregado para el permiso
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
-from sqlalchemy import text, inspect
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, or_, text
+from .ai.base import iniciar_conteo_tokens
 from .ai.gemini import Gemini
-# from .auth.dependencies import get_user_identifier # Descomentar cuando agregues login
-# from .auth.throttling import apply_rate_limit # Descomentar cuando agregues limitación de tasa
-from .database import get_db, engine, Base
+from .ai.resilience import CircuitBreaker, ResilientPlatform
+from .auth.throttling import login_rate_limited, rate_limited
+from .database import get_db, get_read_db, engine, Base, SessionLocal, ReadSessionLocal
+from .database import al_confirmar_escritura, al_modificar_tablas, marcar_modificadas, pool_metrics
 from fastapi import HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
-from src.auth.utils import get_user_by_email, verify_password, create_access_token
+from src.auth.utils import SECRET_KEY, get_user_by_email, create_access_token
+from src.auth.cache import instalar_invalidacion
+from src.auth.dependencies import Principal, get_current_admin, get_current_principal, get_optional_principal
+from src.auth.dependencies import rol_de, token_cache, user_cache
+from src.auth.hashing import HashQueueFull, password_hasher, service_unavailable
 from .models import Ubicacion, Usuario
-from .models import Docente, DocenteCursoInfo
+from .models import Docente, DocenteCursoInfo, MetricaConsulta
+from .models import Chat, Consulta, ResumenChat, SistemaChatbot
+from .ingest.loader import TABLAS as TABLAS_INGESTA, BulkLoader, detectar_formato
+from .ingest.versions import VersionWatcher, publicar_cambios
+from .batch.jobs import BatchJobs
+from .batch.runner import leer_preguntas
+from .migrations.schema import migrar, pendientes
+from .search.index import MODELOS as TABLAS_BUSQUEDA, SearchIndex
+from .search.index import instalar_refresco as instalar_refresco_busqueda
+from .chat.cache import SQLCache
+from .chat.result_cache import ResultCache
+from .chat.schema import SchemaSnapshot
+from .chat.faq import FAQIndex, instalar_refresco
+from .chat.conversation import Conversacion, ConversationStore
+from .chat.history import HistoryWriter, RegistroChat
+from .chat.normalize import normalizar_texto
+from .chat.singleflight import Difusion, SingleFlight
+from .chat.templates import TemplateLibrary
+from .chat.renderer import renderizar
+from .chat.serializer import leer_filas, serializar, tamano_filas
+from .chat.sql_guard import TABLAS_INTERNAS, SQLRechazada, aplicar_limites, validar_sql, verificar_costo
+from .observability.logs import detener_logging
+from .observability.metrics import CHAT_RESPONSES, REGISTRY, registrar_gauge, span
+from .observability.middleware import RequestContextMiddleware
 
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
 # --- App Initialization ---
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Todo lo que toca la red o la base se hace aquí y no al importar
+    tiempos_arranque["startup_ms"] = await run_in_threadpool(arrancar)
+    historial.start()
+    vigilancia = asyncio.create_task(vigia_versiones.correr()) if INGEST_POLL_INTERVAL > 0 else None
+    logger.info(
+        "App lista: importación %.0f ms, arranque %.0f ms",
+        tiempos_arranque["import_ms"], tiempos_arranque["startup_ms"],
+    )
+    yield
+    if vigilancia is not None:
+        vigilancia.cancel()
+    await lotes.detener()
+    # Lo encolado y aún no escrito se guarda antes de salir
+    await run_in_threadpool(historial.close, HISTORY_SHUTDOWN_TIMEOUT)
+    detener_logging()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # 1. PERMISOS CORS (NECESARIO para que el frontend hable)
 app.add_middleware(
@@ -28,39 +92,24 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Request-ID"],
 )
+app.add_middleware(RequestContextMiddleware)
 
 
 # Base.metadata.create_all(bind=engine) # Descomenta si usas modelos
 
 # --- Funciones de Carga de Prompts ---
-
-def get_dynamic_schema(engine):
-    inspector = inspect(engine)
-    schema_string = ""
-    table_names = inspector.get_table_names()
-    for table_name in table_names:
-        if table_name.startswith('pg_') or table_name.startswith('sql_'):
-            continue
-        schema_string += f"TABLE: {table_name}\n"
-        columns = inspector.get_columns(table_name)
-        for column in columns:
-            schema_string += f"  - {column['name']} ({column['type']})\n"
-        fks = inspector.get_foreign_keys(table_name)
-        if fks:
-            schema_string += "  FOREIGN KEYS:\n"
-            for fk in fks:
-                schema_string += f"    - {fk['constrained_columns']} -> {fk['referred_table']}({fk['referred_columns']})\n"
-        schema_string += "\n"
-    return schema_string
+# Rutas relativas al paquete: no dependen del directorio desde donde se lance uvicorn
+PROMPTS_DIR = Path(__file__).resolve().parent / "prompts"
 
 def load_system_prompt():
     try:
-        with open("src/prompts/system_prompt.md", "r") as f:
+        with open(PROMPTS_DIR / "system_prompt.md", encoding="utf-8") as f:
             return f.read()
     except FileNotFoundError:
         # Esto detendrá la app si no se encuentra, lo cual es bueno.
-        print("Error: 'src/prompts/system_prompt.md' no encontrado.")
+        logger.error("'src/prompts/system_prompt.md' no encontrado.")
         raise
         
 # --- 1. FUNCIÓN MODIFICADA: Sin plantilla de respaldo ---
@@ -70,36 +119,633 @@ def load_response_prompt():
     Si el archivo no existe, la aplicación fallará al iniciar.
     """
     try:
-        with open("src/prompts/response_prompt.md", "r") as f:
+        with open(PROMPTS_DIR / "response_prompt.md", encoding="utf-8") as f:
             return f.read()
     except FileNotFoundError:
-        print("Error: 'src/prompts/response_prompt.md' no encontrado.")
+        logger.error("'src/prompts/response_prompt.md' no encontrado.")
         raise # Vuelve a lanzar el error para detener la app
 
-# --- AI & Schema Configuration (Se ejecuta al inicio) ---
+def load_summary_prompt():
+    """Plantilla con la que se pliegan los turnos viejos de un chat en su resumen."""
+    try:
+        with open(PROMPTS_DIR / "summary_prompt.md", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        logger.error("'src/prompts/summary_prompt.md' no encontrado.")
+        raise
+
+# --- AI & Schema Configuration ---
+# Al importar sólo se leen los prompts y la configuración. El cliente de
+# Gemini, el modelo configurado en la base, el schema y la FAQ se cargan en
+# `arrancar()`, dentro del lifespan.
 system_prompt = load_system_prompt()
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY environment variable not set.")
-ai_platform = Gemini(api_key=gemini_api_key, system_prompt=system_prompt)
 
-print("Generando schema dinámico de la base de datos...")
-DATABASE_SCHEMA = get_dynamic_schema(engine)
-print("--- Schema Detectado ---")
-print(DATABASE_SCHEMA)
-print("------------------------")
+
+# --- Modelos y controles de latencia del LLM ---
+# Cada paso elige su modelo: variable de entorno > sistema_chatbot.modelo_ia
+# > gemini-2.5-flash. Las llamadas tienen plazo, reintentos con jitter,
+# circuit breaker y (opcional) hedging; ver ai/resilience.py.
+def modelo_configurado() -> str | None:
+    try:
+        with SessionLocal() as _db:
+            return _db.query(SistemaChatbot.modelo_ia).order_by(SistemaChatbot.id_config).limit(1).scalar()
+    except Exception as e:
+        logger.warning("No se pudo leer sistema_chatbot.modelo_ia: %s", e)
+        return None
+
+
+GEMINI_SQL_MODEL = os.getenv("GEMINI_SQL_MODEL")
+GEMINI_ANSWER_MODEL = os.getenv("GEMINI_ANSWER_MODEL")
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_TOTAL_DEADLINE_SECONDS = float(os.getenv("LLM_TOTAL_DEADLINE_SECONDS", "45"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "2"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "0.5"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "4"))
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"  # duplica llamadas lentas (más tokens)
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "1"))
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+
+def envolver_llm(plataforma, step: str) -> ResilientPlatform:
+    return ResilientPlatform(
+        plataforma,
+        step=step,
+        timeout=LLM_TIMEOUT_SECONDS,
+        max_retries=LLM_MAX_RETRIES,
+        retry_base_delay=LLM_RETRY_BASE_DELAY,
+        retry_max_delay=LLM_RETRY_MAX_DELAY,
+        total_deadline=LLM_TOTAL_DEADLINE_SECONDS,
+        hedge=LLM_HEDGE_ENABLED,
+        hedge_min_delay=LLM_HEDGE_MIN_DELAY,
+        breaker=CircuitBreaker(LLM_BREAKER_THRESHOLD, LLM_BREAKER_COOLDOWN),
+    )
+
+
+# Paso 1 (texto -> SQL) y paso 3 (datos -> respuesta; también los resúmenes).
+# Se crean en el arranque; si ya se asignaron (benchmarks), se respetan.
+ai_sql_platform = None
+ai_platform = None
+
+
+def configurar_llm():
+    global ai_sql_platform, ai_platform
+    if ai_sql_platform is not None and ai_platform is not None:
+        return
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("GEMINI_API_KEY environment variable not set.")
+    por_defecto = modelo_configurado() or "gemini-2.5-flash"
+    modelo_sql = GEMINI_SQL_MODEL or por_defecto
+    modelo_respuesta = GEMINI_ANSWER_MODEL or por_defecto
+    ai_sql_platform = envolver_llm(
+        Gemini(api_key=gemini_api_key, system_prompt=system_prompt, model_name=modelo_sql, timeout=LLM_TIMEOUT_SECONDS),
+        "sql",
+    )
+    ai_platform = envolver_llm(
+        Gemini(api_key=gemini_api_key, system_prompt=system_prompt, model_name=modelo_respuesta, timeout=LLM_TIMEOUT_SECONDS),
+        "answer",
+    )
+    logger.info("Modelos: SQL=%s, respuesta=%s", modelo_sql, modelo_respuesta)
+
+
+# --- Schema para el prompt de SQL ---
+# Se lee del catálogo una vez y se guarda en un snapshot que reutilizan los
+# demás workers y los reinicios (hasta SCHEMA_SNAPSHOT_MAX_AGE segundos;
+# 0 = sin vencimiento). Tras una migración: POST /api/admin/schema/refresh.
+# El prompt de SQL sólo lleva las tablas relevantes (y sus vecinas por FK).
+SCHEMA_SNAPSHOT_PATH = os.getenv(
+    "SCHEMA_SNAPSHOT_PATH", os.path.join(tempfile.gettempdir(), "trikabot_schema_snapshot.json")
+)
+SCHEMA_SNAPSHOT_MAX_AGE = float(os.getenv("SCHEMA_SNAPSHOT_MAX_AGE", "86400"))
+SCHEMA_PRUNING_ENABLED = os.getenv("SCHEMA_PRUNING_ENABLED", "true").lower() == "true"
+SCHEMA_PRUNING_TOP_K = int(os.getenv("SCHEMA_PRUNING_TOP_K", "3"))
+SCHEMA_PRUNING_MIN_SCORE = float(os.getenv("SCHEMA_PRUNING_MIN_SCORE", "1.0"))
+schema_snapshot = SchemaSnapshot(
+    engine,
+    SCHEMA_SNAPSHOT_PATH,
+    max_age=SCHEMA_SNAPSHOT_MAX_AGE,
+    top_k=SCHEMA_PRUNING_TOP_K,
+    min_score=SCHEMA_PRUNING_MIN_SCORE,
+)
+
+
+def cargar_schema(refrescar: bool = False):
+    fuente = schema_snapshot.refrescar() if refrescar else schema_snapshot.cargar()
+    logger.info(
+        "Schema (%s): %d tablas, %d caracteres, huella %s, %.0f ms",
+        fuente, len(schema_snapshot.tablas), len(schema_snapshot.texto),
+        schema_snapshot.fingerprint, schema_snapshot.lectura_ms,
+    )
+    logger.debug("Schema detectado:\n%s", schema_snapshot.texto)
+
+
+# --- Caché de SQL generado (paso 1) ---
+# Evita repetir la llamada a Gemini para preguntas ya vistas.
+SQL_CACHE_MAXSIZE = int(os.getenv("SQL_CACHE_MAXSIZE", "1024"))
+SQL_CACHE_TTL_SECONDS = float(os.getenv("SQL_CACHE_TTL_SECONDS", "3600"))
+sql_cache = SQLCache(maxsize=SQL_CACHE_MAXSIZE, ttl=SQL_CACHE_TTL_SECONDS)
+
+# --- Caché de resultados (paso 2) ---
+# Las escrituras hechas con el ORM invalidan sólo las entradas de las
+# tablas que tocan (ver database.al_modificar_tablas), en este worker y,
+# vía versiones_datos, en los demás. El SQL generado no lee las tablas
+# internas, así que sus escrituras no la afectan.
+RESULT_CACHE_MAXSIZE = int(os.getenv("RESULT_CACHE_MAXSIZE", "512"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+RESULT_CACHE_TTL_SECONDS = float(os.getenv("RESULT_CACHE_TTL_SECONDS", "600"))
+result_cache = ResultCache(
+    tablas_conocidas=Base.metadata.tables.keys() - TABLAS_INTERNAS,
+    maxsize=RESULT_CACHE_MAXSIZE,
+    max_bytes=RESULT_CACHE_MAX_BYTES,
+    ttl=RESULT_CACHE_TTL_SECONDS,
+)
+al_modificar_tablas(result_cache.invalidate_tables)
+
+
+def publicar_escrituras(tablas):
+    # Los demás workers lo ven en su VersionWatcher y descartan lo suyo
+    tablas = set(tablas) & result_cache.tablas_conocidas
+    if not tablas:
+        return
+    try:
+        with SessionLocal() as _db:
+            publicar_cambios(_db, tablas)
+    except Exception as e:
+        logger.warning("No se pudo publicar la escritura en %s: %s", ", ".join(sorted(tablas)), e)
+
+
+al_confirmar_escritura(publicar_escrituras)
+
+# --- Respuestas directas desde preguntas_frecuentes ---
+# Si la pregunta coincide con una FAQ por encima del umbral, /chat responde
+# con la respuesta guardada sin llamar al LLM.
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.7"))
+faq_index = FAQIndex(threshold=FAQ_MATCH_THRESHOLD)
+instalar_refresco(SessionLocal, faq_index)
+# Un cambio de estado o de rol de un usuario invalida su identidad en caché
+instalar_invalidacion(SessionLocal, user_cache)
+
+# --- Búsqueda mientras se escribe (/api/search) ---
+# Índice en memoria de ubicaciones, docentes, cursos y trámites; se carga al
+# arrancar y se actualiza con cada escritura confirmada con el ORM.
+SEARCH_MIN_SIMILARITY = float(os.getenv("SEARCH_MIN_SIMILARITY", "0.6"))  # para coincidencias con errores de tipeo
+search_index = SearchIndex(min_similarity=SEARCH_MIN_SIMILARITY)
+instalar_refresco_busqueda(SessionLocal, search_index)
+
+# --- Plantillas de SQL aprendidas (paso 1 sin LLM) ---
+# Preguntas que sólo cambian en una entidad conocida (ubicación, docente,
+# curso o un número) reutilizan la consulta parametrizada aprendida de las
+# anteriores. Al arrancar se aprende del historial reciente.
+SQL_TEMPLATES_ENABLED = os.getenv("SQL_TEMPLATES_ENABLED", "true").lower() == "true"
+SQL_TEMPLATES_MIN_EXAMPLES = int(os.getenv("SQL_TEMPLATES_MIN_EXAMPLES", "2"))  # valores distintos antes de activar
+SQL_TEMPLATES_MAX = int(os.getenv("SQL_TEMPLATES_MAX", "500"))
+SQL_TEMPLATES_MAX_CANDIDATES = int(os.getenv("SQL_TEMPLATES_MAX_CANDIDATES", "2000"))  # patrones aún sin activar
+SQL_TEMPLATES_WARMUP_ROWS = int(os.getenv("SQL_TEMPLATES_WARMUP_ROWS", "2000"))
+plantillas_sql = TemplateLibrary(
+    min_examples=SQL_TEMPLATES_MIN_EXAMPLES,
+    max_templates=SQL_TEMPLATES_MAX,
+    max_candidates=SQL_TEMPLATES_MAX_CANDIDATES,
+)
+al_modificar_tablas(plantillas_sql.marcar_obsoleto)
+
+
+def cargar_plantillas():
+    """Carga las entidades conocidas y aprende del historial de preguntas sin chat."""
+    with SessionLocal() as _db:
+        entidades = plantillas_sql.cargar_entidades(_db)
+        filas = (
+            _db.query(Consulta.contenido, MetricaConsulta.sql_generado)
+            .join(MetricaConsulta, MetricaConsulta.id_consulta == Consulta.id_mensaje)
+            .filter(
+                Consulta.id_chat.is_(None),
+                MetricaConsulta.sql_generado.isnot(None),
+                MetricaConsulta.origen.in_(("llm", "template")),
+                MetricaConsulta.filas_resultado > 0,  # sólo SQL que se ejecutó y devolvió filas
+            )
+            .order_by(Consulta.id_mensaje.desc())
+            .limit(SQL_TEMPLATES_WARMUP_ROWS)
+            .all()
+        ) if SQL_TEMPLATES_WARMUP_ROWS else []
+    for pregunta, sql_query in reversed(filas):
+        plantillas_sql.aprender(pregunta, sql_query, schema_snapshot.fingerprint)
+    logger.info(
+        "Plantillas de SQL: %d entidades, %d plantillas aprendidas de %d consultas previas",
+        entidades, len(plantillas_sql), len(filas),
+    )
+
+
+# Las tablas propias del backend se crean con `python -m src.migrations`,
+# una vez por despliegue. Cada worker sólo revisa que no falte nada; con
+# DB_MIGRATE_ON_STARTUP=true (desarrollo, un solo proceso) las crea él.
+DB_MIGRATE_ON_STARTUP = os.getenv("DB_MIGRATE_ON_STARTUP", "false").lower() == "true"
+
+
+def arrancar() -> float:
+    """
+    Trabajo de arranque que necesita la red o la base de datos. Corre una
+    vez por worker desde el lifespan (en el threadpool) y devuelve cuánto
+    tardó en milisegundos.
+    """
+    inicio = time.perf_counter()
+    try:
+        if DB_MIGRATE_ON_STARTUP:
+            migrar(engine)
+        else:
+            faltan = pendientes(engine)
+            if faltan:
+                logger.error("Faltan tablas o columnas del backend (%s): corre 'python -m src.migrations'",
+                             ", ".join(faltan))
+    except Exception as e:
+        logger.error("No se pudo revisar el schema propio del backend: %s", e)
+    try:
+        # Línea base antes de cargar los índices: lo que se cargue desde ahora se verá
+        vigia_versiones.revisar()
+    except Exception as e:
+        logger.error("No se pudo leer 'versiones_datos': %s", e)
+    configurar_llm()
+    cargar_schema()
+    try:
+        with SessionLocal() as _db:
+            logger.info("Índice de FAQ: %d preguntas cargadas.", faq_index.cargar(_db))
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice de FAQ: %s", e)
+    try:
+        with SessionLocal() as _db:
+            logger.info("Índice de búsqueda: %d registros cargados.", search_index.cargar(_db))
+    except Exception as e:
+        logger.warning("No se pudo cargar el índice de búsqueda: %s", e)
+    if SQL_TEMPLATES_ENABLED:
+        try:
+            cargar_plantillas()
+        except Exception as e:
+            logger.warning("No se pudieron cargar las plantillas de SQL: %s", e)
+    return (time.perf_counter() - inicio) * 1000
+
+# --- Respuestas por plantilla para resultados simples ---
+# Un escalar, una fila o una lista corta se redactan sin el segundo LLM.
+RENDER_ENABLED = os.getenv("RENDER_ENABLED", "true").lower() == "true"
+RENDER_MAX_ROWS = int(os.getenv("RENDER_MAX_ROWS", "5"))
 
 # --- 2. CARGAMOS EL NUEVO TEMPLATE ---
 # Si el archivo no existe, la app se detendrá aquí.
 response_prompt_template = load_response_prompt()
 
 
+# --- Límites del resultado que se envía al prompt de respuesta ---
+SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "200"))
+SQL_RESULT_MAX_BYTES = int(os.getenv("SQL_RESULT_MAX_BYTES", "16000"))
+SQL_FETCH_CHUNK_SIZE = int(os.getenv("SQL_FETCH_CHUNK_SIZE", "100"))
+SQL_RESULT_COUNT_LIMIT = int(os.getenv("SQL_RESULT_COUNT_LIMIT", "10000"))
+
+# --- Guardián de SQL (entre los pasos 1 y 2) ---
+SQL_GUARD_MAX_LIMIT = int(os.getenv("SQL_GUARD_MAX_LIMIT", "1000"))  # LIMIT inyectado/máximo
+SQL_GUARD_RETRIES = int(os.getenv("SQL_GUARD_RETRIES", "1"))  # reintentos con el motivo del rechazo
+SQL_STATEMENT_TIMEOUT_MS = int(os.getenv("SQL_STATEMENT_TIMEOUT_MS", "5000"))
+SQL_MAX_PLAN_COST = float(os.getenv("SQL_MAX_PLAN_COST", "0"))  # 0 = sin EXPLAIN
+
+# --- Historial del chat (write-behind) ---
+# Pregunta, SQL, respuesta, latencias y tokens se encolan al terminar cada
+# petición y un hilo los inserta por lotes en consultas/respuestas/metricas_consulta.
+HISTORY_BATCH_SIZE = int(os.getenv("HISTORY_BATCH_SIZE", "50"))
+HISTORY_FLUSH_INTERVAL = float(os.getenv("HISTORY_FLUSH_INTERVAL", "2"))
+HISTORY_QUEUE_MAX = int(os.getenv("HISTORY_QUEUE_MAX", "5000"))
+HISTORY_SHUTDOWN_TIMEOUT = float(os.getenv("HISTORY_SHUTDOWN_TIMEOUT", "10"))
+historial = HistoryWriter(
+    SessionLocal,
+    batch_size=HISTORY_BATCH_SIZE,
+    flush_interval=HISTORY_FLUSH_INTERVAL,
+    queue_max=HISTORY_QUEUE_MAX,
+)
+
+# --- Conversaciones (chat_id) ---
+# Ventana de los últimos turnos + resumen incremental de los anteriores,
+# acotados a CHAT_CONTEXT_TOKEN_BUDGET tokens por prompt.
+CHAT_HISTORY_TURNS = int(os.getenv("CHAT_HISTORY_TURNS", "4"))
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1200"))
+CHAT_MAX_CONVERSATIONS = int(os.getenv("CHAT_MAX_CONVERSATIONS", "1000"))
+summary_prompt_template = load_summary_prompt()
+
+
+async def resumir_turnos(resumen_previo: str, turnos: list) -> str:
+    texto = "\n".join(f"Usuario: {p}\nAsistente: {r}" for p, r in turnos)
+    return await ai_platform.achat(summary_prompt_template.format(
+        resumen_previo=resumen_previo,
+        turnos=texto,
+        max_palabras=max(30, int(conversaciones.summary_budget * 0.75)),
+    ))
+
+
+def guardar_resumen(id_chat: int, resumen: str, resumidos: int):
+    with SessionLocal() as db:
+        db.merge(ResumenChat(id_chat=id_chat, resumen=resumen, turnos_resumidos=resumidos))
+        db.commit()
+
+
+conversaciones = ConversationStore(
+    resumir_turnos,
+    max_turns=CHAT_HISTORY_TURNS,
+    token_budget=CHAT_CONTEXT_TOKEN_BUDGET,
+    max_chats=CHAT_MAX_CONVERSATIONS,
+    guardar_resumen=guardar_resumen,
+)
+
+
+# --- Coalescencia de preguntas idénticas en vuelo ---
+# Preguntas con el mismo texto normalizado, el mismo contexto de conversación
+# (vacío en el primer turno de un chat) y la misma versión del schema
+# comparten una sola ejecución del pipeline (SQL, consulta y respuesta), ya
+# lleguen por /chat o por /chat/stream.
+CHAT_COALESCE_ENABLED = os.getenv("CHAT_COALESCE_ENABLED", "true").lower() == "true"
+CHAT_COALESCE_TIMEOUT = float(os.getenv("CHAT_COALESCE_TIMEOUT", "30"))
+coalescer = SingleFlight(timeout=CHAT_COALESCE_TIMEOUT)
+
+
+def clave_coalescencia(pregunta: str, contexto: str = "", previas: str = ""):
+    return (schema_snapshot.fingerprint, normalizar_texto(pregunta), contexto, previas)
+
+
+# Un chat se identifica con su id y una clave firmada que sólo recibe quien
+# lo abrió: sin ella (o con el token de otro usuario, si el chat tiene dueño)
+# el chat no existe para quien pregunta.
+def clave_chat(id_chat: int) -> str:
+    return hmac.new(SECRET_KEY.encode(), f"chat:{id_chat}".encode(), hashlib.sha256).hexdigest()[:32]
+
+
+def turnos_de_contexto(db: Session, id_chat: int):
+    # Sólo los turnos respondidos (sin errores ni rechazos), como los que agrega agregar_turno
+    return (
+        db.query(Consulta)
+        .outerjoin(MetricaConsulta)
+        .filter(Consulta.id_chat == id_chat)
+        .filter(or_(MetricaConsulta.origen.is_(None), MetricaConsulta.origen.in_(("llm", "faq", "template"))))
+    )
+
+
+def contar_turnos(id_chat: int) -> int:
+    with SessionLocal() as db:
+        return turnos_de_contexto(db, id_chat).count()
+
+
+def cargar_conversacion(id_chat: int, max_turns: int):
+    """Resumen guardado y turnos siguientes de un chat, o None si el chat no existe."""
+    with SessionLocal() as db:
+        chat = db.get(Chat, id_chat)
+        if chat is None:
+            return None
+        guardado = db.get(ResumenChat, id_chat)
+        resumidos = guardado.turnos_resumidos if guardado else 0
+        total = turnos_de_contexto(db, id_chat).count()
+        consultas = (
+            turnos_de_contexto(db, id_chat)
+            .options(selectinload(Consulta.respuestas))
+            .order_by(Consulta.id_mensaje.desc())
+            .limit(max(0, min(total - resumidos, max_turns)))
+            .all()
+        )
+        turnos = [
+            (c.contenido, c.respuestas[0].contenido if c.respuestas else "")
+            for c in reversed(consultas)
+        ]
+        return Conversacion(id_chat, turnos, guardado.resumen if guardado else "", id_usuario=chat.id_usuario,
+                            resumidos=total - len(turnos), vistos=total)
+
+
+async def obtener_conversacion(chat_id: int | None, chat_key: str | None, principal: Principal | None):
+    if chat_id is None:
+        return None
+    conv = None
+    if chat_key and hmac.compare_digest(chat_key, clave_chat(chat_id)):
+        conv = await conversaciones.obtener(chat_id, cargar_conversacion, contar_turnos)
+    if conv is not None and conv.id_usuario is not None and (principal is None or principal.id != conv.id_usuario):
+        conv = None
+    if conv is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Chat no encontrado")
+    return conv
+
+
+def ejecutar_sql(db: Session, sql_query: str, params: dict = None):
+    """
+    Ejecuta la consulta generada leyendo por bloques (cursor del lado del
+    servidor) y devuelve (columnas, filas, omitidas, conteo_exacto). Es
+    bloqueante: desde el endpoint async se llama con `run_in_threadpool`.
+    `params` son los valores enlazados de una plantilla de SQL.
+    """
+    aplicar_limites(db, SQL_STATEMENT_TIMEOUT_MS)
+    verificar_costo(db, sql_query, SQL_MAX_PLAN_COST, params)
+    result = db.execute(
+        text(sql_query + ";"),
+        params or {},
+        execution_options={"stream_results": True, "max_row_buffer": SQL_FETCH_CHUNK_SIZE},
+    )
+    columns = list(result.keys())
+    rows, omitidas, exacto = leer_filas(
+        result, SQL_RESULT_MAX_ROWS, SQL_FETCH_CHUNK_SIZE, SQL_RESULT_COUNT_LIMIT
+    )
+    # Si se llegó al LIMIT inyectado, puede haber más filas que las contadas
+    exacto = exacto and len(rows) + omitidas < SQL_GUARD_MAX_LIMIT
+    return columns, rows, omitidas, exacto
+
+
+# --- Pasos del pipeline de chat (compartidos por /chat y /chat/stream) ---
+
+def recargar_entidades():
+    with SessionLocal() as _db:
+        plantillas_sql.cargar_entidades(_db)
+
+
+async def buscar_plantilla(pregunta: str):
+    if plantillas_sql.obsoleto:
+        # Cambiaron ubicaciones, docentes o cursos: se recargan los nombres
+        await run_in_threadpool(recargar_entidades)
+    return plantillas_sql.buscar(pregunta, schema_snapshot.fingerprint)
+
+
+def aprender_plantilla(pregunta: str, sql_query: str, params: dict, filas: int | None, contexto: str = ""):
+    """
+    Tras el paso 2: un SQL del LLM que devolvió filas puede volverse
+    plantilla; una plantilla cuyo SQL falló al ejecutarse se retira.
+    """
+    if not SQL_TEMPLATES_ENABLED or contexto:
+        return
+    if params is not None:
+        if filas is None and plantillas_sql.degradar(pregunta):
+            logger.warning("Plantilla de SQL retirada por fallar al ejecutarse",
+                           extra={"pattern": plantillas_sql.patron(pregunta)[0]})
+        return
+    if filas and plantillas_sql.aprender(pregunta, sql_query, schema_snapshot.fingerprint):
+        logger.info("Plantilla de SQL aprendida", extra={"pattern": plantillas_sql.patron(pregunta)[0]})
+
+
+def sql_para_historial(sql_query: str, params: dict) -> str:
+    if params is None:
+        return sql_query
+    return f"{sql_query} -- {json.dumps(params, ensure_ascii=False)}"
+
+
+async def generar_sql(pregunta: str, contexto: str = "", preguntas_previas: str = "", usar_cache: bool = True):
+    """
+    Paso 1: traduce la pregunta del usuario a una consulta SQL validada por
+    el guardián (SELECT único, de sólo lectura y con LIMIT). Si el guardián
+    la rechaza se reintenta indicando el motivo; si se agotan los intentos
+    se lanza SQLRechazada. Consulta primero la caché, que sólo guarda SQL
+    ya validado, y luego las plantillas aprendidas.
+
+    Devuelve (sql, params); `params` es None salvo que el SQL venga de una
+    plantilla, en cuyo caso trae los valores a enlazar.
+
+    En una conversación, `contexto` permite resolver referencias ("¿y su
+    correo?"); esas preguntas dependen del chat y no pasan por la caché.
+    Con `usar_cache=False` se ignoran caché y plantillas y el SQL nuevo
+    reemplaza al guardado (lotes de evaluación tras editar los prompts).
+    """
+    schema_snapshot.vigente()  # por si otro worker refrescó el snapshot
+    if not contexto and usar_cache:
+        cached = sql_cache.get_sql(pregunta, schema_snapshot.fingerprint)
+        if cached is not None:
+            logger.debug("SQL desde caché", extra={"sql": cached})
+            return cached, None
+        if SQL_TEMPLATES_ENABLED:
+            with span("sql_template"):
+                plantilla = await buscar_plantilla(pregunta)
+            if plantilla is not None:
+                sql_query, params, patron = plantilla
+                logger.debug("SQL desde plantilla", extra={"pattern": patron, "sql": sql_query})
+                return sql_query, params
+
+    schema_completo = schema = schema_snapshot.texto
+    if SCHEMA_PRUNING_ENABLED:
+        schema, tablas = schema_snapshot.index.podar(f"{preguntas_previas} {pregunta}".strip())
+        if tablas is None:
+            logger.debug("Schema completo (confianza baja para podar)")
+        else:
+            ahorro = 100 * (1 - len(schema) / len(schema_completo))
+            logger.debug("Schema podado a %s: %d -> %d caracteres (-%.0f%%)", tablas, len(schema_completo), len(schema), ahorro)
+
+    prompt_para_sql = (
+        "Eres un experto en PostgreSQL. Basado en el siguiente schema de base de datos:\n"
+        f"<schema>{schema}</schema>\n"
+        "Traduce la siguiente pregunta del usuario a una consulta SQL válida. "
+        "Responde SÓLO con la consulta SQL, sin explicaciones ni comillas (```).\n"
+    )
+    if contexto:
+        prompt_para_sql += f"Conversación previa (úsala para resolver referencias):\n{contexto}\n"
+    prompt_para_sql += f"Pregunta del usuario: {pregunta}"
+    for intento in range(SQL_GUARD_RETRIES + 1):
+        sql_query = (await ai_sql_platform.achat(prompt_para_sql)).strip()
+        sql_query = sql_query.replace("```sql", "").replace("```", "").replace(";", "").strip()
+        try:
+            with span("sql_validation"):
+                sql_query = validar_sql(sql_query, max_limit=SQL_GUARD_MAX_LIMIT)
+            break
+        except SQLRechazada as e:
+            logger.warning("SQL rechazado (%s): %s", e.code, e.message)
+            if intento == SQL_GUARD_RETRIES:
+                raise
+            prompt_para_sql += (
+                f"\nTu consulta anterior fue rechazada: {e.message} "
+                "Genera una única consulta SELECT de sólo lectura."
+            )
+    if not contexto:
+        sql_cache.set_sql(pregunta, schema_snapshot.fingerprint, sql_query)
+    return sql_query, None
+
+
+async def obtener_datos(db: Session, sql_query: str, params: dict = None):
+    """
+    Paso 2: ejecuta la consulta (con `params` enlazados si viene de una
+    plantilla) y devuelve (columnas, filas, datos_en_texto, total_filas);
+    `total_filas` es cuántas filas devolvió la consulta, o None si falló.
+    Los datos van como CSV acotado por SQL_RESULT_MAX_ROWS/MAX_BYTES.
+    Si la consulta falla o el resultado se truncó, columnas y filas son
+    None (el paso 3 usa entonces el LLM con el texto); en caso de error el
+    texto describe el error para que el paso 3 pueda explicarlo al usuario.
+    Si el plan supera SQL_MAX_PLAN_COST se lanza SQLRechazada, como los
+    rechazos del guardián en el paso 1.
+    """
+    columns = rows = total = None
+    try:
+        cached = result_cache.get(sql_query, params)
+        if cached is not None:
+            logger.debug("Resultado desde caché")
+            columns, rows, omitidas, data_result, total = cached
+        else:
+            with span("db_execution"):
+                columns, rows, omitidas, exacto = await run_in_threadpool(ejecutar_sql, db, sql_query, params)
+            total = len(rows) + omitidas
+            with span("serialization"):
+                data_result, incluidas = serializar(
+                    columns, rows, omitidas, exacto, max_bytes=SQL_RESULT_MAX_BYTES
+                )
+            omitidas += len(rows) - incluidas
+            if omitidas:
+                # Truncado: el paso 3 sólo usa el texto, las filas no se guardan
+                columns = rows = None
+            result_cache.set(
+                sql_query, (columns, rows, omitidas, data_result, total),
+                size=len(data_result.encode()) + tamano_filas(rows),
+                params=params,
+            )
+        logger.debug("Datos serializados", extra={"rows": total, "bytes": len(data_result.encode()), "omitted": omitidas})
+    except SQLRechazada:
+        raise
+    except Exception as e:
+        logger.error("Falló la Base de Datos: %s", e)
+        columns = rows = total = None
+        data_result = f"Error al ejecutar la consulta: {str(e)}"
+        # AQUI FALLÓ LA CONEXIÓN: Si esto falla, el mensaje se va al frontend.
+    return columns, rows, data_result, total
+
+
+def descartar_sql_rechazado(pregunta: str, e: SQLRechazada, contexto: str = ""):
+    """
+    El paso 2 rechazó el SQL (costo del plan): se olvida el SQL guardado
+    para que la próxima vez se genere de nuevo en vez de rechazarlo otra vez.
+    """
+    logger.warning("SQL rechazado al ejecutar (%s): %s", e.code, e.message)
+    if not contexto:
+        sql_cache.discard_sql(pregunta, schema_snapshot.fingerprint)
+
+
+def respuesta_por_plantilla(columns, rows):
+    """Paso 3 sin LLM: redacta la respuesta si el resultado es simple."""
+    if not RENDER_ENABLED:
+        return None
+    return renderizar(columns, rows, max_rows=RENDER_MAX_ROWS)
+
+
+def construir_prompt_respuesta(pregunta: str, data_result: str, contexto: str = "") -> str:
+    """Paso 3: arma el prompt de respuesta natural a partir de los datos."""
+    prompt = response_prompt_template.format(
+        pregunta_original=pregunta,
+        datos_sql=data_result
+    )
+    if contexto:
+        prompt = f"Conversación previa con el usuario:\n{contexto}\n\n{prompt}"
+    return prompt
+
+
+MENSAJE_SQL_RECHAZADO = (
+    "No pude construir una consulta segura para tu pregunta. "
+    "¿Puedes reformularla de otra manera?"
+)
+
+
+def sse_event(event: str, data: dict) -> str:
+    """Serializa un evento en formato Server-Sent Events."""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
 # --- Pydantic Models ---
 class ChatRequest(BaseModel):
     prompt: str
+    chat_id: int | None = None  # con un chat (POST /api/chats) las preguntas tienen contexto
+    chat_key: str | None = None  # la clave que devolvió POST /api/chats para ese chat
 
 class ChatResponse(BaseModel):
     response: str
+    source: str = "llm"  # "llm", "faq", "template" o "rejected"
+    rejection: dict | None = None  # motivo estructurado si el guardián rechazó el SQL
 
 
 class RegistrationRequest(BaseModel):
@@ -113,70 +759,354 @@ class RegistrationRequest(BaseModel):
 
 
 # --- API Endpoints ---
-# RUTA CHAT (SIN LOGIN TEMPORALMENTE)
+# RUTA CHAT (SIN LOGIN TEMPORALMENTE: sin token se aplica el límite por IP)
 @app.post("/chat", response_model=ChatResponse)
 async def chat(
     request: ChatRequest, 
-    # user_id: str = Depends(get_user_identifier), # COMENTADO: Desactivamos el login
-    db: Session = Depends(get_db)
+    user_id: str = Depends(rate_limited), # aplica el límite y agrega cabeceras RateLimit-*
+    principal: Principal | None = Depends(get_optional_principal),
+    db: Session = Depends(get_read_db)
 ):
-    print("--- [DEBUG] INICIO DEL CHAT ---")
-    # print(f"--- [DEBUG] Usuario: {user_id}") # COMENTADO
-    print(f"--- [DEBUG] Pregunta: {request.prompt}")
-    
-    # apply_rate_limit(user_id) # COMENTADO
+    logger.debug("Pregunta recibida", extra={"prompt": request.prompt, "chat_id": request.chat_id, "user": user_id})
+
+    conv = await obtener_conversacion(request.chat_id, request.chat_key, principal)
+    registro = RegistroChat(request.prompt, id_chat=request.chat_id)
+    uso = iniciar_conteo_tokens()
+    respuesta = None
+    if CHAT_COALESCE_ENABLED:
+        contexto = conversaciones.contexto(conv) if conv is not None else ""
+        previas = conv.preguntas_recientes() if conv is not None else ""
+        try:
+            inicio = time.perf_counter()
+            (respuesta, lider), es_lider = await coalescer.do(
+                clave_coalescencia(request.prompt, contexto, previas), lambda: responder_aislado(request, conv)
+            )
+            if es_lider:
+                registro = lider
+            else:
+                logger.debug("Pregunta idéntica en curso: se reutiliza su respuesta")
+                registro.etapas["coalesced"] = round((time.perf_counter() - inicio) * 1000, 3)
+                registro.sql, registro.origen, registro.filas = lider.sql, lider.origen, lider.filas
+                uso = None  # la seguidora no consumió tokens
+        except asyncio.TimeoutError:
+            logger.info("La pregunta idéntica en curso tarda demasiado; se procesa aparte")
+    if respuesta is None:
+        respuesta = await responder_chat(request, db, registro, conv)
+    registro.cerrar(respuesta.response, respuesta.source, uso)
+    CHAT_RESPONSES.inc(source=registro.origen)
+    historial.registrar(registro)  # solo encola; no espera a la base de datos
+    if conv is not None and registro.origen in ("llm", "faq", "template"):
+        conversaciones.agregar_turno(conv, request.prompt, respuesta.response)
+    return respuesta
+
+
+async def responder_aislado(request: ChatRequest, conv=None):
+    """
+    Pipeline del líder de una coalescencia: usa su propia sesión porque
+    puede seguir corriendo para las seguidoras aunque el líder se desconecte.
+    Las seguidoras tienen el mismo contexto de conversación (está en la clave).
+    """
+    registro = RegistroChat(request.prompt)
+    db = ReadSessionLocal()
+    try:
+        respuesta = await responder_chat(request, db, registro, conv)
+    finally:
+        db.close()
+    return respuesta, registro
+
+
+async def responder_chat(request: ChatRequest, db: Session, registro: RegistroChat, conv=None,
+                         usar_cache: bool = True) -> ChatResponse:
+    contexto = conversaciones.contexto(conv) if conv is not None else ""
+    previas = conv.preguntas_recientes() if conv is not None else ""
+
+    # --- PASO 0: Pregunta frecuente (sin LLM) ---
+    with span("faq"):
+        faq = faq_index.buscar(request.prompt)
+    if faq is not None:
+        logger.debug("Respondida desde FAQ #%s (confianza %.2f)", faq["id_pregunta"], faq["confianza"])
+        return ChatResponse(response=faq["respuesta"], source="faq")
     
     # --- PASO 1: Generar SQL ---
-    print("--- [DEBUG] Paso 1: Generando SQL con Gemini...")
-    prompt_para_sql = (
-        "Eres un experto en PostgreSQL. Basado en el siguiente schema de base de datos:\n"
-        f"<schema>{DATABASE_SCHEMA}</schema>\n"
-        "Traduce la siguiente pregunta del usuario a una consulta SQL válida. "
-        "Responde SÓLO con la consulta SQL, sin explicaciones ni comillas (```).\n"
-        f"Pregunta del usuario: {request.prompt}"
-    )
-
     try:
-        sql_query = ai_platform.chat(prompt_para_sql).strip()
-        sql_query = sql_query.replace("```sql", "").replace("```", "").replace(";", "").strip()
-        print(f"--- [DEBUG] SQL Generado: {sql_query}")
+        with span("sql_generation"):
+            sql_query, params = await generar_sql(request.prompt, contexto, previas, usar_cache)
+        registro.sql = sql_para_historial(sql_query, params)
+        logger.debug("SQL generado", extra={"sql": registro.sql})
+    except SQLRechazada as e:
+        return ChatResponse(response=MENSAJE_SQL_RECHAZADO, source="rejected", rejection=e.to_dict())
     except Exception as e:
-        print(f"--- [ERROR] Falló al generar SQL: {e}")
+        logger.error("Falló al generar SQL: %s", e)
+        registro.origen = "error"
         return ChatResponse(response=f"ERROR TÉCNICO DETALLADO: Falló la IA. {str(e)}") # Devolvemos el error
 
     # --- PASO 2: Ejecutar SQL ---
-    print("--- [DEBUG] Paso 2: Ejecutando en Base de Datos...")
-    data_result = ""
     try:
-        if not sql_query.upper().startswith("SELECT"):
-            print("--- [ERROR] Intento de consulta no SELECT")
-            raise ValueError("Operación no permitida. Solo se permiten consultas SELECT.")
-        
-        result = db.execute(text(sql_query + ";")).fetchall()
-        data_result = str(result)
-        print(f"--- [DEBUG] Datos obtenidos de BD: {data_result}")
-        
-    except Exception as e:
-        print(f"--- [ERROR] Falló la Base de Datos: {e}")
-        data_result = f"Error al ejecutar la consulta: {str(e)}"
-        # AQUI FALLÓ LA CONEXIÓN: Si esto falla, el mensaje se va al frontend.
+        with span("query"):
+            columns, rows, data_result, registro.filas = await obtener_datos(db, sql_query, params)
+    except SQLRechazada as e:
+        descartar_sql_rechazado(request.prompt, e, contexto)
+        return ChatResponse(response=MENSAJE_SQL_RECHAZADO, source="rejected", rejection=e.to_dict())
+    aprender_plantilla(request.prompt, sql_query, params, registro.filas, contexto)
 
     # --- PASO 3: Generar Respuesta Final ---
-    print("--- [DEBUG] Paso 3: Generando respuesta natural...")
+    respuesta = respuesta_por_plantilla(columns, rows)
+    if respuesta is not None:
+        logger.debug("Respuesta por plantilla (sin LLM)")
+        return ChatResponse(response=respuesta, source="template")
+
     try:
-        prompt_para_respuesta = response_prompt_template.format(
-            pregunta_original=request.prompt,
-            datos_sql=data_result
-        )
-        response_text = ai_platform.chat(prompt_para_respuesta)
-        print("--- [DEBUG] ¡Respuesta generada con éxito!")
+        prompt_para_respuesta = construir_prompt_respuesta(request.prompt, data_result, contexto)
+        with span("answer_generation"):
+            response_text = await ai_platform.achat(prompt_para_respuesta)
     except Exception as e:
-        print(f"--- [ERROR] Falló al generar respuesta final: {e}")
+        logger.error("Falló al generar respuesta final: %s", e)
+        registro.origen = "error"
         response_text = f"Lo siento, hubo un error interno procesando la respuesta final: {str(e)}"
     
     return ChatResponse(response=response_text)
 
 
+# RUTA CHAT EN STREAMING (Server-Sent Events)
+# Eventos: "progress" (etapa actual), "token" (fragmento de la respuesta),
+# "error" y "done".
+@app.post("/chat/stream", dependencies=[Depends(rate_limited)])
+async def chat_stream(request: ChatRequest, principal: Principal | None = Depends(get_optional_principal)):
+    conv = await obtener_conversacion(request.chat_id, request.chat_key, principal)  # 404 antes del stream
+    contexto = conversaciones.contexto(conv) if conv is not None else ""
+    previas = conv.preguntas_recientes() if conv is not None else ""
+
+    async def eventos():
+        registro = RegistroChat(request.prompt, id_chat=request.chat_id)
+        uso = iniciar_conteo_tokens()
+        if not CHAT_COALESCE_ENABLED:
+            async for evento in transmitir_chat(request, conv, contexto, previas, registro, uso):
+                yield evento
+            return
+
+        # El pipeline corre en su propia tarea: si este cliente se desconecta,
+        # las peticiones que se unieron a ella igual reciben la respuesta
+        clave = clave_coalescencia(request.prompt, contexto, previas)
+        difusion = Difusion()
+
+        async def trabajo():
+            try:
+                async for evento in transmitir_chat(request, conv, contexto, previas, registro, uso):
+                    difusion.publicar(evento)
+            finally:
+                difusion.cerrar()
+            return respuesta_de_registro(registro), registro
+
+        _, es_lider = coalescer.lanzar(clave, trabajo)
+        if es_lider:
+            async for evento in difusion.leer():
+                yield evento
+            return
+
+        # Otra petición ya está respondiendo lo mismo: se espera su resultado
+        try:
+            with span("coalesced"):
+                (respuesta, lider), _ = await coalescer.do(clave, None)
+        except asyncio.TimeoutError:
+            logger.info("La pregunta idéntica en curso tarda demasiado; se procesa aparte")
+            async for evento in transmitir_chat(request, conv, contexto, previas, registro, uso):
+                yield evento
+            return
+        registro.sql, registro.filas = lider.sql, lider.filas
+        origen = lider.origen or respuesta.source
+        try:
+            if origen == "rejected":
+                yield sse_event("error", {"message": respuesta.response, "rejection": respuesta.rejection})
+            elif origen == "error":
+                yield sse_event("error", {"message": respuesta.response})
+            else:
+                yield sse_event("token", {"text": respuesta.response, "source": respuesta.source})
+                yield sse_event("done", {"source": respuesta.source})
+        finally:
+            cerrar_registro(registro, respuesta.response, origen, None, conv)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def respuesta_de_registro(registro: RegistroChat) -> ChatResponse:
+    """Lo que recibe una seguidora de un stream ya terminado."""
+    fuente = registro.origen if registro.origen in ("faq", "template", "rejected") else "llm"
+    return ChatResponse(response=registro.respuesta or "", source=fuente, rejection=registro.rechazo)
+
+
+def cerrar_registro(registro: RegistroChat, respuesta: str, origen: str, uso, conv):
+    registro.cerrar(respuesta, origen, uso)
+    CHAT_RESPONSES.inc(source=registro.origen)
+    historial.registrar(registro)  # solo encola; no espera a la base de datos
+    if conv is not None and registro.origen in ("llm", "faq", "template"):
+        conversaciones.agregar_turno(conv, registro.pregunta, respuesta)
+
+
+async def transmitir_chat(request: ChatRequest, conv, contexto: str, previas: str,
+                          registro: RegistroChat, uso):
+    """Pipeline de /chat/stream como eventos SSE; al final registra la pregunta."""
+    # La sesión se abre aquí y no con Depends(get_read_db): el cuerpo de la
+    # respuesta se genera después de que FastAPI cierra las dependencias.
+    db = ReadSessionLocal()
+    partes, origen = [], "llm"
+    try:
+        with span("faq"):
+            faq = faq_index.buscar(request.prompt)
+        if faq is not None:
+            partes.append(faq["respuesta"])
+            origen = "faq"
+            yield sse_event("token", {"text": faq["respuesta"], "source": "faq"})
+            yield sse_event("done", {"source": "faq"})
+            return
+
+        yield sse_event("progress", {"stage": "sql", "message": "Generando SQL..."})
+        try:
+            with span("sql_generation"):
+                sql_query, params = await generar_sql(request.prompt, contexto, previas)
+            registro.sql = sql_para_historial(sql_query, params)
+        except SQLRechazada as e:
+            partes.append(MENSAJE_SQL_RECHAZADO)
+            origen, registro.rechazo = "rejected", e.to_dict()
+            yield sse_event("error", {"message": MENSAJE_SQL_RECHAZADO, "rejection": registro.rechazo})
+            return
+        except Exception as e:
+            logger.error("Falló al generar SQL: %s", e)
+            mensaje = f"ERROR TÉCNICO DETALLADO: Falló la IA. {str(e)}"
+            partes.append(mensaje)
+            origen = "error"
+            yield sse_event("error", {"message": mensaje})
+            return
+
+        yield sse_event("progress", {"stage": "query", "message": "Consultando la base de datos..."})
+        try:
+            with span("query"):
+                columns, rows, data_result, registro.filas = await obtener_datos(db, sql_query, params)
+        except SQLRechazada as e:
+            descartar_sql_rechazado(request.prompt, e, contexto)
+            partes.append(MENSAJE_SQL_RECHAZADO)
+            origen, registro.rechazo = "rejected", e.to_dict()
+            yield sse_event("error", {"message": MENSAJE_SQL_RECHAZADO, "rejection": registro.rechazo})
+            return
+        aprender_plantilla(request.prompt, sql_query, params, registro.filas, contexto)
+
+        respuesta = respuesta_por_plantilla(columns, rows)
+        if respuesta is not None:
+            partes.append(respuesta)
+            origen = "template"
+            yield sse_event("token", {"text": respuesta, "source": "template"})
+            yield sse_event("done", {"source": "template"})
+            return
+
+        yield sse_event("progress", {"stage": "answer", "message": "Redactando la respuesta..."})
+        try:
+            prompt_para_respuesta = construir_prompt_respuesta(request.prompt, data_result, contexto)
+            with span("answer_generation"):
+                async for fragmento in ai_platform.astream(prompt_para_respuesta):
+                    partes.append(fragmento)
+                    yield sse_event("token", {"text": fragmento})
+        except Exception as e:
+            logger.error("Falló al generar respuesta final: %s", e)
+            mensaje = f"Lo siento, hubo un error interno procesando la respuesta final: {str(e)}"
+            partes.append(mensaje)
+            origen = "error"
+            yield sse_event("error", {"message": mensaje})
+            return
+
+        yield sse_event("done", {"source": "llm"})
+    finally:
+        db.close()
+        # También se registra si el cliente cortó la conexión a mitad de camino
+        cerrar_registro(registro, "".join(partes), origen, uso, conv)
+
+
+# --- Lotes de preguntas (evaluación y precalentamiento de cachés) ---
+# Un JSONL de preguntas pasa por el mismo pipeline que /chat, sin repetir
+# las preguntas iguales, con concurrencia acotada y un presupuesto de
+# llamadas al LLM por minuto para no agotar la cuota del chat en vivo.
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+CHAT_BATCH_MAX_CONCURRENCY = int(os.getenv("CHAT_BATCH_MAX_CONCURRENCY", "16"))
+CHAT_BATCH_RPM = float(os.getenv("CHAT_BATCH_RPM", "60"))  # 0 = sin presupuesto
+CHAT_BATCH_MAX_QUESTIONS = int(os.getenv("CHAT_BATCH_MAX_QUESTIONS", "2000"))
+CHAT_BATCH_FLUSH_INTERVAL = float(os.getenv("CHAT_BATCH_FLUSH_INTERVAL", "5"))  # avance guardado cada N s
+lotes = BatchJobs(SessionLocal, flush_interval=CHAT_BATCH_FLUSH_INTERVAL)
+
+
+async def responder_pregunta_lote(prompt: str, refrescar: bool = False) -> dict:
+    """
+    Una pregunta de un lote: pipeline completo con su propia sesión, sin
+    coalescencia ni historial (no es tráfico de estudiantes). Con
+    `refrescar` el SQL se vuelve a generar con el LLM.
+    """
+    registro = RegistroChat(prompt)
+    uso = iniciar_conteo_tokens()
+    db = ReadSessionLocal()
+    try:
+        respuesta = await responder_chat(ChatRequest(prompt=prompt), db, registro, usar_cache=not refrescar)
+    finally:
+        db.close()
+    registro.cerrar(respuesta.response, respuesta.source, uso)
+    return {
+        "source": registro.origen,
+        "sql": registro.sql,
+        "response": respuesta.response,
+        "rejection": respuesta.rejection,
+        "error": respuesta.response if registro.origen == "error" else None,
+        "stages_ms": registro.etapas,
+        "total_ms": registro.total_ms,
+        "llm_calls": registro.llamadas_llm,
+        "tokens": registro.tokens_entrada + registro.tokens_salida,
+    }
+
+
+@app.post("/chat/batch", status_code=status.HTTP_202_ACCEPTED)
+async def chat_batch(
+    archivo: UploadFile,
+    concurrency: int = Query(CHAT_BATCH_CONCURRENCY, ge=1),
+    rpm: float = Query(CHAT_BATCH_RPM, ge=0),
+    refresh: bool = False,
+    principal: Principal = Depends(get_current_admin),
+):
+    # Sube un JSONL ({"id": ..., "prompt": ...} por línea) y lanza el lote en
+    # segundo plano: puede tardar más que cualquier timeout de un proxy. SQL,
+    # respuesta, tiempos por etapa y errores se consultan en GET /chat/batch/{id}.
+    texto = io.TextIOWrapper(archivo.file, encoding="utf-8-sig")
+    try:
+        preguntas, invalidas = leer_preguntas(texto)
+    except UnicodeDecodeError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Archivo inválido: {e}")
+    finally:
+        texto.detach()
+    if not preguntas:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El archivo no tiene preguntas")
+    if len(preguntas) > CHAT_BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Máximo {CHAT_BATCH_MAX_QUESTIONS} preguntas por lote",
+        )
+    lote = await lotes.lanzar(
+        preguntas,
+        invalidas,
+        lambda prompt: responder_pregunta_lote(prompt, refrescar=refresh),
+        concurrency=min(concurrency, CHAT_BATCH_MAX_CONCURRENCY),
+        rpm=rpm,
+        id_usuario=principal.id,
+    )
+    return {**lote, "status_url": f"/chat/batch/{lote['job_id']}"}
+
+
+@app.get("/chat/batch/{job_id}", dependencies=[Depends(get_current_admin)])
+async def chat_batch_status(job_id: str):
+    # Estado y avance de un lote; los resultados son parciales mientras corre
+    lote = await run_in_threadpool(lotes.consultar, job_id)
+    if lote is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Lote no encontrado")
+    return lote
+
+
 @app.get("/")
 async def root(db: Session = Depends(get_db)):
     try:
@@ -185,28 +1115,264 @@ async def root(db: Session = Depends(get_db)):
     except Exception as e:
         return {"message": "API is running", "db_status": "error", "detail": str(e)}
     
+# --- Métricas (formato Prometheus) ---
+# Los componentes ya llevan sus contadores; aquí sólo se leen al hacer scrape.
+registrar_gauge(
+    "trikabot_db_pool_connections", "Conexiones por pool y estado.", ("pool", "state"),
+    lambda: [((pool, estado), m[estado]) for pool, m in pool_metrics().items()
+             for estado in ("size", "checked_out", "overflow") if estado in m],
+)
+registrar_gauge(
+    "trikabot_db_pool_saturation", "Fracción de la capacidad del pool en uso.", ("pool",),
+    lambda: [((pool,), m["saturation"]) for pool, m in pool_metrics().items() if "saturation" in m],
+)
+registrar_gauge(
+    "trikabot_db_pool_timeouts_total", "Esperas por conexión que agotaron el timeout.", ("pool",),
+    lambda: [((pool,), m["timeouts"]) for pool, m in pool_metrics().items() if "timeouts" in m],
+    tipo="counter",
+)
+registrar_gauge(
+    "trikabot_cache_entries", "Entradas en cada caché/índice del chat.", ("cache",),
+    lambda: [(("sql",), len(sql_cache)), (("results",), len(result_cache)), (("faq",), faq_index.stats()["size"]),
+             (("sql_templates",), len(plantillas_sql)), (("search",), len(search_index))],
+)
+registrar_gauge(
+    "trikabot_cache_requests_total", "Búsquedas en las cachés del chat.", ("cache", "result"),
+    lambda: [((nombre, r), getattr(c, r)) for nombre, c in (("sql", sql_cache), ("results", result_cache))
+             for r in ("hits", "misses")]
+            + [(("sql_templates", "hits"), plantillas_sql.hits),
+               (("sql_templates", "misses"), plantillas_sql.lookups - plantillas_sql.hits)],
+    tipo="counter",
+)
+registrar_gauge(
+    "trikabot_history_backlog", "Registros del historial pendientes de escribir.", (),
+    lambda: [((), historial.stats()["backlog"])],
+)
+registrar_gauge(
+    "trikabot_history_records_total", "Registros del historial por resultado.", ("outcome",),
+    lambda: [((r,), getattr(historial, r)) for r in ("written", "dropped", "failed")],
+    tipo="counter",
+)
+registrar_gauge(
+    "trikabot_chat_coalesced_total", "Preguntas respondidas con el resultado de otra idéntica en curso.", (),
+    lambda: [((), coalescer.deduplicated)],
+    tipo="counter",
+)
+registrar_gauge(
+    "trikabot_llm_circuit_open", "1 si el circuit breaker del paso está abierto o semiabierto.", ("step",),
+    lambda: [((p.step,), int(p.breaker.estado != "closed")) for p in (ai_sql_platform, ai_platform)
+             if isinstance(p, ResilientPlatform)],
+)
+registrar_gauge(
+    "trikabot_startup_seconds", "Duración de la importación y del arranque del worker.", ("phase",),
+    lambda: [((fase,), ms / 1000) for fase, ms in (("import", tiempos_arranque["import_ms"]),
+                                                   ("startup", tiempos_arranque["startup_ms"])) if ms is not None],
+)
+registrar_gauge(
+    "trikabot_password_hash_pending", "Hashes de contraseña en cola o en curso.", (),
+    lambda: [((), password_hasher.stats()["pending"])],
+)
+registrar_gauge(
+    "trikabot_password_hash_rejected_total", "Hashes rechazados por cola llena (503).", (),
+    lambda: [((), password_hasher.stats()["rejected"])],
+    tipo="counter",
+)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+# Los endpoints /api/admin/* exigen el token de un administrador (401 sin
+# token, 403 si el usuario no es admin)
+@app.get("/api/admin/cache", dependencies=[Depends(get_current_admin)])
+def get_cache_stats():
+    # Contadores de aciertos/fallos de las cachés del chat
+    return {
+        "sql": sql_cache.stats(),
+        "results": result_cache.stats(),
+        "faq": faq_index.stats(),
+        "search": search_index.stats(),
+        "auth_tokens": token_cache.stats(),
+        "auth_users": user_cache.stats(),
+        "conversations": conversaciones.stats(),
+        "coalescing": coalescer.stats(),
+        "batch_jobs": lotes.stats(),
+    }
+
+
+class ChatCreateRequest(BaseModel):
+    titulo: str | None = None
+
+
+@app.post("/api/chats", status_code=status.HTTP_201_CREATED)
+def create_chat(
+    payload: ChatCreateRequest | None = None,
+    principal: Principal | None = Depends(get_optional_principal),
+    db: Session = Depends(get_db),
+):
+    # Abre una conversación; su id_chat y su chat_key se envían en /chat. Con
+    # token, el chat queda además a nombre del usuario.
+    chat = Chat(
+        titulo=(payload.titulo[:100] if payload and payload.titulo else None) or "Nueva conversación",
+        id_usuario=principal.id if principal else None,
+    )
+    db.add(chat)
+    db.commit()
+    db.refresh(chat)
+    return {"id_chat": chat.id_chat, "chat_key": clave_chat(chat.id_chat), "titulo": chat.titulo}
+
+
+@app.get("/api/admin/history", dependencies=[Depends(get_current_admin)])
+def get_history_stats():
+    # Estado de la cola write-behind del historial (pendientes, descartados, lotes)
+    return historial.stats()
+
+
+@app.get("/api/admin/llm", dependencies=[Depends(get_current_admin)])
+def get_llm_status():
+    # Modelo, estado del circuit breaker y retardo de hedging de cada paso
+    return [p.stats() for p in (ai_sql_platform, ai_platform) if isinstance(p, ResilientPlatform)]
+
+
+@app.get("/api/admin/templates", dependencies=[Depends(get_current_admin)])
+def get_sql_templates():
+    # Plantillas de SQL aprendidas y su tasa de aciertos
+    return {**plantillas_sql.stats(), "items": plantillas_sql.listar()}
+
+
+@app.get("/api/admin/schema", dependencies=[Depends(get_current_admin)])
+def get_schema_status():
+    # Huella y origen del schema en uso (snapshot o catálogo) y tiempos de arranque
+    return {**schema_snapshot.stats(), "startup": tiempos_arranque}
+
+
+@app.post("/api/admin/schema/refresh", dependencies=[Depends(get_current_admin)])
+def refresh_schema():
+    # Relee el catálogo (p. ej. tras una migración) y reescribe el snapshot.
+    # Los demás workers lo recargan en su siguiente pregunta; como la huella
+    # entra en las claves de la caché de SQL, el SQL viejo deja de usarse.
+    anterior = schema_snapshot.fingerprint
+    cargar_schema(refrescar=True)
+    return {**schema_snapshot.stats(), "changed": schema_snapshot.fingerprint != anterior}
+
+
+@app.get("/api/admin/db/pools", dependencies=[Depends(get_current_admin)])
+def get_pool_metrics():
+    # Espera por conexión y saturación de los pools de escritura y lectura
+    return pool_metrics()
+
+
+@app.delete("/api/admin/cache/results", dependencies=[Depends(get_current_admin)])
+def flush_result_cache():
+    # Vacía la caché de resultados (p.ej. tras cargas manuales de datos)
+    return {"flushed": result_cache.clear()}
+
+
+# --- Carga masiva de datos de referencia (ver src/ingest) ---
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+# Cada cuántos segundos un worker revisa si otro proceso cargó datos (0 = nunca)
+INGEST_POLL_INTERVAL = float(os.getenv("INGEST_POLL_INTERVAL", "5"))
+
+
+def refrescar_derivados(tablas) -> list:
+    """
+    Reconstruye los índices en memoria que no se actualizan solos tras una
+    carga con Core (la caché de resultados y las entidades de las plantillas
+    ya reaccionan a marcar_modificadas).
+    """
+    refrescados = []
+    if "preguntas_frecuentes" in tablas:
+        with SessionLocal() as _db:
+            faq_index.cargar(_db)
+        refrescados.append("faq")
+    if TABLAS_BUSQUEDA.keys() & set(tablas):
+        with SessionLocal() as _db:
+            search_index.cargar(_db, tablas)
+        refrescados.append("search")
+    return refrescados
+
+
+def aplicar_carga_externa(tablas):
+    # Una carga hecha por otro proceso (CLI u otro worker) vista en versiones_datos
+    marcar_modificadas(tablas)
+    refrescar_derivados(tablas)
+
+
+vigia_versiones = VersionWatcher(SessionLocal, aplicar_carga_externa, intervalo=INGEST_POLL_INTERVAL)
+
+
+class IngestRefreshRequest(BaseModel):
+    tables: list[str]
+
+
+@app.post("/api/admin/ingest/refresh", dependencies=[Depends(get_current_admin)])
+async def refresh_after_ingest(payload: IngestRefreshRequest):
+    # Para cargas hechas fuera del proceso (python -m src.ingest --notify, o
+    # cambios manuales en la base): este worker refresca de inmediato y los
+    # demás al ver la nueva versión en versiones_datos.
+    tablas = {t for t in payload.tables if t in TABLAS_INGESTA}
+    if not tablas:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Ninguna tabla soportada")
+    marcar_modificadas(tablas)
+    refrescados = await run_in_threadpool(refrescar_derivados, tablas)
+    with SessionLocal() as _db:
+        versiones = await run_in_threadpool(publicar_cambios, _db, tablas)
+    return {"tables": sorted(tablas), "refreshed": refrescados, "versions": versiones}
+
+
+@app.post("/api/admin/ingest/{tabla}", dependencies=[Depends(get_current_admin)])
+async def ingest_table(tabla: str, archivo: UploadFile, formato: str | None = None):
+    # Sube un CSV o JSONL y lo carga por lotes con upsert por llave natural
+    try:
+        formato = formato or detectar_formato(archivo.filename)
+        loader = BulkLoader(SessionLocal, tabla, batch_size=INGEST_BATCH_SIZE)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    texto = io.TextIOWrapper(archivo.file, encoding="utf-8-sig", newline="")
+    try:
+        reporte = await run_in_threadpool(loader.cargar, texto, formato)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Archivo inválido: {e}")
+    finally:
+        texto.detach()
+    if reporte["inserted"] or reporte["updated"]:
+        reporte["refreshed"] = await run_in_threadpool(refrescar_derivados, {tabla})
+    return reporte
+
+
+@app.get("/api/search")
+async def search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    types: str | None = Query(None, description="Tipos separados por coma: location, teacher, course, procedure"),
+):
+    # Búsqueda para autocompletar en cada tecla: sin tildes, por prefijo de
+    # palabra y tolerante a errores de tipeo. Se resuelve en memoria.
+    tipos = {t.strip() for t in types.split(",")} if types else None
+    return {"query": q, "results": search_index.buscar(q, limit, tipos)}
+
+
 @app.get("/api/locations")
-def get_locations(db: Session = Depends(get_db)):
+def get_locations(db: Session = Depends(get_read_db)):
     # Consulta todas las ubicaciones en la base de datos
     locations = db.query(Ubicacion).all()
     return locations
 
 
 @app.post("/api/register")
-def register_user(payload: RegistrationRequest, db: Session = Depends(get_db)):
+async def register_user(payload: RegistrationRequest, db: Session = Depends(get_db)):
     # Validaciones básicas
-    existing = db.query(Usuario).filter(Usuario.correo == payload.email).first()
+    existing = await run_in_threadpool(get_user_by_email, db, payload.email)
     if existing:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="El correo ya está registrado")
 
-    # Intentar hashear la contraseña con bcrypt si está disponible
+    # bcrypt corre en su propio pool (ver auth/hashing.py); si está saturado, 503
     try:
-        import bcrypt
-        hashed = bcrypt.hashpw(payload.password.encode(), bcrypt.gensalt()).decode()
-    except Exception:
-        # Fallback (solo para entornos de desarrollo)
-        hashed = payload.password
-        print("WARNING: bcrypt no disponible. Almacenando contraseña en texto plano (solo dev).")
+        hashed = await password_hasher.hash(payload.password)
+    except HashQueueFull as e:
+        raise service_unavailable(e)
 
     # Creamos el usuario como tipo 2 (estudiante)
     new_user = Usuario(
@@ -217,9 +1383,13 @@ def register_user(payload: RegistrationRequest, db: Session = Depends(get_db)):
         estado=True,
         id_tipo_usuario=2,
     )
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+
+    def guardar():
+        db.add(new_user)
+        db.commit()
+        db.refresh(new_user)
+
+    await run_in_threadpool(guardar)
 
     # Generar token para uso inmediato en frontend
     token_data = {"sub": new_user.correo, "id_usuario": new_user.id_usuario, "id_tipo_usuario": new_user.id_tipo_usuario}
@@ -229,15 +1399,52 @@ def register_user(payload: RegistrationRequest, db: Session = Depends(get_db)):
 
 
 @app.get("/api/teachers")
-def get_teachers(db: Session = Depends(get_db)):
-    # Devuelve docentes con información agregada de cursos/metodología/consejos
-    docentes = db.query(Docente).all()
+def get_teachers(
+    request: Request,
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: int | None = Query(None, description="id_docente del último docente de la página anterior"),
+    q: str | None = Query(None, description="Busca en nombre, correo y especialidad"),
+    course: str | None = Query(None, description="Código de curso que dicta"),
+    validated: bool | None = None,
+    db: Session = Depends(get_read_db),
+):
+    # Devuelve docentes con información agregada de cursos/metodología/consejos.
+    # Paginación por cursor: si hay más resultados, la cabecera X-Next-Cursor
+    # trae el cursor de la siguiente página. El ETag es un hash de la página
+    # servida, así que cualquier cambio en los datos (venga del ORM, de una
+    # carga masiva, de SQL manual o de otro worker) lo cambia y una página
+    # sin cambios responde 304 sin reenviar el cuerpo.
+    # info_cursos se carga en una sola consulta adicional (no una por docente)
+    query = db.query(Docente).options(selectinload(Docente.info_cursos)).order_by(Docente.id_docente)
+    if cursor is not None:
+        query = query.filter(Docente.id_docente > cursor)
+    if q:
+        patron = f"%{q}%"
+        query = query.filter(or_(
+            Docente.nombres_completos.ilike(patron),
+            Docente.correo_institucional.ilike(patron),
+            Docente.especialidad.ilike(patron),
+        ))
+    if course:
+        query = query.filter(Docente.info_cursos.any(DocenteCursoInfo.codigo_curso.ilike(course)))
+    if validated is not None:
+        es_validado = Docente.info_cursos.any(func.lower(DocenteCursoInfo.estado_validacion) == 'validado')
+        query = query.filter(es_validado if validated else ~es_validado)
+    docentes = query.limit(limit + 1).all()
+
+    headers = {"Cache-Control": "no-cache"}
+    if len(docentes) > limit:
+        docentes = docentes[:limit]
+        headers["X-Next-Cursor"] = str(docentes[-1].id_docente)
+
     result = []
     for d in docentes:
-        cursos = [info.codigo_curso for info in (d.info_cursos or []) if info.codigo_curso]
-        metodos = [info.metodologia for info in (d.info_cursos or []) if info.metodologia]
-        consejos = [info.consejos for info in (d.info_cursos or []) if info.consejos]
-        validated = any((info.estado_validacion or '').lower() == 'validado' for info in (d.info_cursos or []))
+        info_cursos = d.info_cursos or []
+        cursos = [info.codigo_curso for info in info_cursos if info.codigo_curso]
+        metodos = [info.metodologia for info in info_cursos if info.metodologia]
+        consejos = [info.consejos for info in info_cursos if info.consejos]
+        validado = any((info.estado_validacion or '').lower() == 'validado' for info in info_cursos)
         result.append({
             "id": d.id_docente,
             "name": d.nombres_completos,
@@ -246,26 +1453,53 @@ def get_teachers(db: Session = Depends(get_db)):
             "courses": cursos,
             "methodology": '\n'.join(metodos) if metodos else '',
             "tips": '\n'.join(consejos) if consejos else '',
-            "validated": validated,
+            "validated": validado,
             "status": "active",
         })
+
+    pagina = json.dumps([result, headers.get("X-Next-Cursor")], ensure_ascii=False, sort_keys=True)
+    headers["ETag"] = 'W/"teachers-{}"'.format(hashlib.sha256(pagina.encode()).hexdigest()[:20])
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
     return result
 
 
-@app.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+@app.get("/api/me")
+async def read_current_user(principal: Principal = Depends(get_current_principal)):
+    # Identidad del token; con las cachés calientes no toca la base ni verifica la firma
+    return principal
+
+
+@app.post("/token", dependencies=[Depends(login_rate_limited)])
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     # OAuth2PasswordRequestForm usa el campo 'username' para el correo
     email = form_data.username
     password = form_data.password
 
-    user = get_user_by_email(db, email)
-    if not user or not verify_password(password, user.contrasenia):
+    user = await run_in_threadpool(get_user_by_email, db, email)
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
+    try:
+        valida, nuevo_hash = await password_hasher.verify(password, user.contrasenia)
+    except HashQueueFull as e:
+        raise service_unavailable(e)
+    if not valida:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect email or password")
 
+    # El hash guardado usa otro costo (o no es bcrypt): se actualiza
+    if nuevo_hash:
+        user.contrasenia = nuevo_hash
+        await run_in_threadpool(db.commit)
+
     # Generamos token con información mínima
     token_data = {"sub": user.correo, "id_usuario": user.id_usuario, "id_tipo_usuario": user.id_tipo_usuario}
     access_token = create_access_token(token_data)
 
     # Respondemos también con metadatos para que el frontend sepa la ruta a usar
-    role = "admin" if user.id_tipo_usuario == 1 else "student"
-    return {"access_token": access_token, "token_type": "bearer", "role": role, "email": user.correo, "name": user.nombre_completo, "id_tipo_usuario": user.id_tipo_usuario}
\ No newline at end of file
+    role = rol_de(user.id_tipo_usuario)
+    return {"access_token": access_token, "token_type": "bearer", "role": role, "email": user.correo, "name": user.nombre_completo, "id_tipo_usuario": user.id_tipo_usuario}
+
+
+# Importar la app no toca la red ni la base; el resto del arranque se mide en el lifespan
+tiempos_arranque = {"import_ms": (time.perf_counter() - _INICIO_IMPORT) * 1000, "startup_ms": None}
@@ -0,0 +1,35 @@
+"""
+Crea las tablas y columnas propias del backend que falten en la base.
+
+Uso (desde backend/), una vez por despliegue y antes de arrancar los workers:
+    python -m src.migrations
+    python -m src.migrations --check   # sólo lista lo pendiente (sale con 1 si hay algo)
+"""
+import argparse
+import sys
+
+from src.database import engine
+
+from .schema import migrar, pendientes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--check", action="store_true", help="no cambia nada; sólo lista lo pendiente")
+    args = parser.parse_args()
+
+    if args.check:
+        faltan = pendientes(engine)
+        for nombre in faltan:
+            print(f"pendiente: {nombre}")
+        print("Schema al día." if not faltan else f"{len(faltan)} cambios pendientes.")
+        sys.exit(1 if faltan else 0)
+
+    aplicados = migrar(engine)
+    for nombre in aplicados:
+        print(f"creado: {nombre}")
+    print(f"{len(aplicados)} cambios aplicados." if aplicados else "Schema al día.")
+
+
+if __name__ == "__main__":
+    main()
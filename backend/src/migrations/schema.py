@@ -0,0 +1,69 @@
+"""
+Tablas y columnas propias del backend.
+
+Las tablas del dominio ya existen en la base; las que agregó el backend
+(métricas, resúmenes, lotes, versiones) se crean aquí, junto con las
+columnas que les falten si se crearon con una versión anterior. Corre una
+vez por despliegue (`python -m src.migrations`), no en cada worker: es
+idempotente y en PostgreSQL se serializa con un advisory lock, así dos
+despliegues simultáneos no chocan.
+"""
+import logging
+
+from sqlalchemy import inspect, text
+
+from src.models import LoteChat, MetricaConsulta, ResumenChat, VersionDatos
+
+logger = logging.getLogger(__name__)
+
+# En orden de creación (las llaves foráneas apuntan a tablas del dominio)
+TABLAS_PROPIAS = (MetricaConsulta, ResumenChat, LoteChat, VersionDatos)
+
+# Llave del advisory lock de PostgreSQL (cualquier entero fijo del proyecto)
+LLAVE_BLOQUEO = 7_214_014
+
+
+def _faltantes(inspector) -> list:
+    """[(tabla, columna o None)] de lo que falta; None = falta la tabla entera."""
+    faltan = []
+    for modelo in TABLAS_PROPIAS:
+        tabla = modelo.__table__
+        if not inspector.has_table(tabla.name):
+            faltan.append((tabla, None))
+            continue
+        existentes = {c["name"] for c in inspector.get_columns(tabla.name)}
+        faltan += [(tabla, c) for c in tabla.columns if c.name not in existentes]
+    return faltan
+
+
+def _nombre(tabla, columna) -> str:
+    return tabla.name if columna is None else f"{tabla.name}.{columna.name}"
+
+
+def pendientes(engine) -> list:
+    """Tablas ("tabla") y columnas ("tabla.columna") que faltan, sin tocar nada."""
+    return [_nombre(t, c) for t, c in _faltantes(inspect(engine))]
+
+
+def migrar(engine) -> list:
+    """Crea lo que falte y devuelve qué se creó (vacío si ya estaba al día)."""
+    with engine.begin() as conexion:
+        postgres = conexion.dialect.name == "postgresql"
+        if postgres:
+            # Se libera al terminar la transacción; el segundo proceso espera
+            # y luego ya no encuentra nada pendiente
+            conexion.execute(text("SELECT pg_advisory_xact_lock(:llave)"), {"llave": LLAVE_BLOQUEO})
+        aplicados = []
+        for tabla, columna in _faltantes(inspect(conexion)):
+            if columna is None:
+                tabla.create(bind=conexion, checkfirst=True)
+            else:
+                # SQLite no acepta IF NOT EXISTS aquí; ahí no hay workers en paralelo
+                si_no_existe = "IF NOT EXISTS " if postgres else ""
+                conexion.execute(text(
+                    f"ALTER TABLE {tabla.name} ADD COLUMN {si_no_existe}"
+                    f"{columna.name} {columna.type.compile(conexion.dialect)}"
+                ))
+            aplicados.append(_nombre(tabla, columna))
+            logger.info("Migración aplicada: %s", _nombre(tabla, columna))
+    return aplicados
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Boolean, DateTime, Float, ForeignKey
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from src.database import Base
@@ -71,6 +71,7 @@ class Consulta(Base):
     # Relaciones
     chat = relationship("Chat", back_populates="consultas")
     respuestas = relationship("Respuesta", back_populates="consulta", cascade="all, delete-orphan")
+    metrica = relationship("MetricaConsulta", back_populates="consulta", uselist=False, cascade="all, delete-orphan")
 
 class Respuesta(Base):
     __tablename__ = "respuestas"
@@ -84,6 +85,46 @@ class Respuesta(Base):
     # Relaciones
     consulta = relationship("Consulta", back_populates="respuestas")
 
+class MetricaConsulta(Base):
+    __tablename__ = "metricas_consulta"
+
+    id_metrica = Column(Integer, primary_key=True, index=True)
+    id_consulta = Column(Integer, ForeignKey("consultas.id_mensaje"), unique=True)
+    sql_generado = Column(Text)
+    origen = Column(String(20)) # llm, faq, template, rejected, error
+    tokens_entrada = Column(Integer, default=0)
+    tokens_salida = Column(Integer, default=0)
+    llamadas_llm = Column(Integer, default=0)
+    latencia_total_ms = Column(Float)
+    latencias_etapas = Column(Text) # JSON: {"faq": ms, "sql": ms, "query": ms, "answer": ms}
+    filas_resultado = Column(Integer) # filas que devolvió el SQL; NULL si no se ejecutó o falló
+
+    # Relaciones
+    consulta = relationship("Consulta", back_populates="metrica")
+
+class LoteChat(Base):
+    __tablename__ = "lotes_chat"
+
+    id_lote = Column(String(32), primary_key=True)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"))
+    estado = Column(String(20), nullable=False, default="running") # running, done, failed, interrupted
+    preguntas = Column(Integer, nullable=False)
+    unicas = Column(Integer, nullable=False)
+    hechas = Column(Integer, nullable=False, default=0)
+    resultados = Column(Text) # JSON: resultados hasta ahora (todos al terminar)
+    resumen = Column(Text) # JSON: resumen del lote al terminar
+    error = Column(Text)
+    creado_en = Column(DateTime(timezone=True), server_default=func.now())
+    actualizado_en = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+class ResumenChat(Base):
+    __tablename__ = "resumenes_chat"
+
+    id_chat = Column(Integer, ForeignKey("chats.id_chat", ondelete="CASCADE"), primary_key=True)
+    resumen = Column(Text, nullable=False, default="") # turnos viejos plegados por el LLM
+    turnos_resumidos = Column(Integer, nullable=False, default=0) # cuántos turnos ya no van enteros al prompt
+    actualizado_en = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 # ----------------------------------------------------------
 # Módulo de Gestión de Conocimiento (Fuentes)
 # ----------------------------------------------------------
@@ -175,4 +216,14 @@ class Tramite(Base):
     descripcion_general = Column(Text)
     pasos_guia = Column(Text)
     plataforma_asociada = Column(String(50))
-    enlace_externo = Column(String(255))
\ No newline at end of file
+    enlace_externo = Column(String(255))
+# ----------------------------------------------------------
+# Módulo interno (sincronización entre workers)
+# ----------------------------------------------------------
+
+class VersionDatos(Base):
+    __tablename__ = "versiones_datos"
+
+    tabla = Column(String(63), primary_key=True)
+    version = Column(Integer, nullable=False, default=0) # sube con cada carga masiva de la tabla
+    actualizado_en = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,79 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+from contextvars import ContextVar
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+
+request_id_var: ContextVar = ContextVar("request_id", default="-")
+
+# Atributos propios de LogRecord; lo demás llegó por `extra=` y se emite como campo
+_ATRIBUTOS_BASE = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Copia el id de la petición al registro en el hilo/tarea que loguea."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        datos = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for clave, valor in vars(record).items():
+            if clave not in _ATRIBUTOS_BASE:
+                datos[clave] = valor
+        if record.exc_info:
+            datos["exc"] = self.formatException(record.exc_info)
+        return json.dumps(datos, ensure_ascii=False, default=str)
+
+
+_listener = None
+
+
+def configurar_logging():
+    """
+    Logs de la app (logger "src") sin bloquear el event loop: quien loguea
+    sólo encola el registro y un hilo lo formatea y escribe a stdout.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    salida = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "json":
+        salida.setFormatter(JsonFormatter())
+    else:
+        salida.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s] %(name)s: %(message)s"))
+
+    cola = logging.handlers.QueueHandler(queue.SimpleQueue())
+    cola.addFilter(RequestIdFilter())  # se evalúa antes de encolar, en el contexto de la petición
+    _listener = logging.handlers.QueueListener(cola.queue, salida, respect_handler_level=True)
+    _listener.start()
+    atexit.register(detener_logging)
+
+    raiz = logging.getLogger("src")
+    raiz.setLevel(LOG_LEVEL)
+    raiz.addHandler(cola)
+    raiz.propagate = False
+
+
+def detener_logging():
+    """Escribe lo pendiente y detiene el hilo de logs."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
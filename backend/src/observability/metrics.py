@@ -0,0 +1,175 @@
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Buckets en segundos: cubren desde una FAQ (sub-milisegundo) hasta una
+# respuesta completa del LLM.
+BUCKETS_LATENCIA = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _etiquetas(labelnames, valores) -> str:
+    if not labelnames:
+        return ""
+    pares = []
+    for nombre, valor in zip(labelnames, valores):
+        valor = str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pares.append(f'{nombre}="{valor}"')
+    return "{" + ",".join(pares) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        clave = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + amount
+
+    def collect(self) -> list:
+        lineas = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for clave, valor in sorted(self._valores.items()):
+                lineas.append(f"{self.name}{_etiquetas(self.labelnames, clave)} {valor}")
+        return lineas
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=BUCKETS_LATENCIA):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # etiquetas -> [conteos por bucket, suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        clave = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                serie[0][i] += 1
+            serie[1] += value
+            serie[2] += 1
+
+    def collect(self) -> list:
+        lineas = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        nombres_le = self.labelnames + ("le",)
+        with self._lock:
+            for clave, (conteos, suma, total) in sorted(self._series.items()):
+                acumulado = 0
+                for limite, conteo in zip(self.buckets, conteos):
+                    acumulado += conteo
+                    lineas.append(f"{self.name}_bucket{_etiquetas(nombres_le, clave + (limite,))} {acumulado}")
+                lineas.append(f"{self.name}_bucket{_etiquetas(nombres_le, clave + ('+Inf',))} {total}")
+                lineas.append(f"{self.name}_sum{_etiquetas(self.labelnames, clave)} {suma}")
+                lineas.append(f"{self.name}_count{_etiquetas(self.labelnames, clave)} {total}")
+        return lineas
+
+
+class GaugeCallback:
+    """
+    Métrica que se lee en el momento del scrape a partir de los contadores
+    que ya llevan los componentes (pools, colas, cachés). `tipo` es "gauge"
+    o "counter" según la semántica del valor.
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames, funcion, tipo: str = "gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.funcion = funcion  # -> iterable de (valores_de_etiquetas, valor)
+        self.tipo = tipo
+
+    def collect(self) -> list:
+        lineas = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.tipo}"]
+        try:
+            for clave, valor in self.funcion():
+                lineas.append(f"{self.name}{_etiquetas(self.labelnames, clave)} {valor}")
+        except Exception:
+            logger.exception("No se pudo leer el gauge %s", self.name)
+        return lineas
+
+
+class Registry:
+    def __init__(self):
+        self._metricas = []
+
+    def register(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def render(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.extend(metrica.collect())
+        return "\n".join(lineas) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    "trikabot_http_request_duration_seconds",
+    "Latencia de las peticiones HTTP por endpoint.",
+    ("method", "route", "status"),
+))
+STAGE_SECONDS = REGISTRY.register(Histogram(
+    "trikabot_chat_stage_duration_seconds",
+    "Latencia de cada etapa del pipeline del chat.",
+    ("stage",),
+))
+LLM_CALLS = REGISTRY.register(Counter(
+    "trikabot_llm_calls_total",
+    "Llamadas al LLM con respuesta.",
+))
+LLM_TOKENS = REGISTRY.register(Counter(
+    "trikabot_llm_tokens_total",
+    "Tokens consumidos en el LLM.",
+    ("kind",),
+))
+CHAT_RESPONSES = REGISTRY.register(Counter(
+    "trikabot_chat_responses_total",
+    "Respuestas del chat según su origen (llm, faq, template, rejected, error).",
+    ("source",),
+))
+
+
+def registrar_gauge(name: str, documentation: str, labelnames, funcion, tipo: str = "gauge"):
+    return REGISTRY.register(GaugeCallback(name, documentation, labelnames, funcion, tipo))
+
+
+# --- Etapas (spans) ---
+
+_etapas_actuales: ContextVar = ContextVar("etapas_actuales", default=None)
+
+
+def acumular_etapas(destino: dict):
+    """Las etapas medidas desde aquí en el contexto actual se suman en `destino` (ms)."""
+    _etapas_actuales.set(destino)
+
+
+@contextmanager
+def span(etapa: str):
+    """Mide una etapa: histograma, log de depuración y (si hay) el registro de la petición."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        segundos = time.perf_counter() - inicio
+        STAGE_SECONDS.observe(segundos, stage=etapa)
+        destino = _etapas_actuales.get()
+        if destino is not None:
+            destino[etapa] = round(destino.get(etapa, 0) + segundos * 1000, 3)
+        logger.debug("etapa", extra={"stage": etapa, "duration_ms": round(segundos * 1000, 3)})
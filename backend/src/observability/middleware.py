@@ -0,0 +1,51 @@
+import time
+import uuid
+
+from .logs import request_id_var
+from .metrics import HTTP_REQUEST_SECONDS
+
+
+class RequestContextMiddleware:
+    """
+    Middleware ASGI: asigna un id a cada petición (o respeta X-Request-ID),
+    lo devuelve en la respuesta y mide su latencia por ruta. En respuestas
+    en streaming la latencia cubre hasta el último fragmento.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for nombre, valor in scope.get("headers", []):
+            if nombre == b"x-request-id":
+                request_id = valor.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+        estado = {"status": 500}
+        inicio = time.perf_counter()
+
+        async def send_con_id(mensaje):
+            if mensaje["type"] == "http.response.start":
+                estado["status"] = mensaje["status"]
+                mensaje.setdefault("headers", [])
+                mensaje["headers"] = list(mensaje["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, send_con_id)
+        finally:
+            # La plantilla de la ruta ("/api/teachers"), no la URL: cardinalidad acotada
+            ruta = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - inicio,
+                method=scope["method"],
+                route=getattr(ruta, "path", "unmatched"),
+                status=estado["status"],
+            )
+            request_id_var.reset(token)
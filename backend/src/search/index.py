@@ -0,0 +1,345 @@
+import heapq
+import math
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict, deque
+
+from sqlalchemy import event
+
+from src.chat.normalize import STOPWORDS, normalizar_texto
+from src.models import Curso, Docente, Tramite, Ubicacion
+
+
+def _normalizar(texto: str) -> str:
+    """Sin tildes ni mayúsculas; guiones y guiones bajos separan palabras ("BMA-01")."""
+    return normalizar_texto(texto or "").replace("-", " ").replace("_", " ")
+
+
+def _trigramas(tokens) -> set:
+    """Trigramas por palabra, con el mismo relleno que pg_trgm ("  ab", "abc", "bc ")."""
+    trigramas = set()
+    for token in tokens:
+        relleno = f"  {token} "
+        trigramas.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return trigramas
+
+
+def _documento(obj):
+    """(clave, título, detalle, [(texto, peso)]) de un objeto indexable, o None."""
+    if isinstance(obj, Ubicacion):
+        lugar = ", ".join(p for p in (
+            f"pabellón {obj.pabellon}" if obj.pabellon else None,
+            f"piso {obj.piso}" if obj.piso else None,
+        ) if p)
+        detalle = " · ".join(p for p in (obj.tipo, lugar) if p)
+        return ("location", obj.id_ubicacion), obj.nombre, detalle, [(obj.nombre, 1.0), (obj.pabellon, 0.6)]
+    if isinstance(obj, Docente):
+        return ("teacher", obj.id_docente), obj.nombres_completos, obj.especialidad or obj.correo_institucional, [
+            (obj.nombres_completos, 1.0),
+        ]
+    if isinstance(obj, Curso):
+        detalle = obj.codigo_curso + (f" · ciclo {obj.ciclo_sugerido}" if obj.ciclo_sugerido else "")
+        return ("course", obj.codigo_curso), obj.nombre, detalle, [(obj.codigo_curso, 1.0), (obj.nombre, 1.0)]
+    if isinstance(obj, Tramite):
+        return ("procedure", obj.id_tramite), obj.titulo, obj.plataforma_asociada, [(obj.titulo, 1.0)]
+    return None
+
+
+# Tabla -> (modelo, tipo de resultado)
+MODELOS = {
+    "ubicaciones": (Ubicacion, "location"),
+    "docentes": (Docente, "teacher"),
+    "cursos": (Curso, "course"),
+    "tramites": (Tramite, "procedure"),
+}
+
+
+class SearchIndex:
+    """
+    Índice en memoria para búsqueda mientras se escribe (typeahead) sobre
+    ubicaciones, docentes, cursos y trámites. Todo se compara sin tildes ni
+    mayúsculas.
+
+    Cada palabra de la consulta debe ser prefijo de alguna palabra del
+    resultado ("lab a" -> "Laboratorio A1"); los prefijos se resuelven con
+    búsqueda binaria sobre el vocabulario ordenado. Si así no hay
+    resultados, se buscan coincidencias por trigramas (errores de tipeo:
+    "laboratrio"). El ranking premia la frase completa al inicio de un
+    campo, las palabras exactas sobre los prefijos y los títulos cortos.
+
+    Las consultas de una o dos letras tocan miles de registros; como se
+    repiten mucho (son las primeras teclas), los resultados se guardan en
+    una caché de `cache_size` entradas que se vacía con cada cambio.
+    """
+
+    def __init__(self, min_similarity: float = 0.6, cache_size: int = 2048):
+        self.min_similarity = min_similarity
+        self.cache_size = cache_size
+        self.lookups = 0
+        self.cache_hits = 0
+        self.total_ms = 0.0
+        self._latencias = deque(maxlen=1000)  # ms de las búsquedas recientes
+        self._docs = {}         # (tipo, id) -> {"title", "subtitle", "frases", "palabras", ...}
+        self._postings = {}     # palabra -> {clave}
+        self._vocabulario = []  # palabras ordenadas, para buscar por prefijo
+        self._trigramas = {}    # trigrama -> {clave}
+        self._cache = OrderedDict()  # (frase, limit, tipos) -> resultados
+        self._durante_carga = None   # cambios hechos mientras corre `cargar`
+        self._lock = threading.Lock()
+
+    # --- Mantenimiento del índice ---
+
+    def _remove(self, clave):
+        doc = self._docs.pop(clave, None)
+        if doc is None:
+            return
+        for token in doc["tokens"]:
+            posting = self._postings[token]
+            posting.discard(clave)
+            if not posting:
+                del self._postings[token]
+                del self._vocabulario[bisect_left(self._vocabulario, token)]
+        for trigrama in doc["trigramas"]:
+            posting = self._trigramas[trigrama]
+            posting.discard(clave)
+            if not posting:
+                del self._trigramas[trigrama]
+
+    def _insertar(self, clave, doc: dict):
+        self._remove(clave)
+        self._docs[clave] = doc
+        for token in doc["tokens"]:
+            if token not in self._postings:
+                self._postings[token] = set()
+                insort(self._vocabulario, token)
+            self._postings[token].add(clave)
+        for trigrama in doc["trigramas"]:
+            self._trigramas.setdefault(trigrama, set()).add(clave)
+
+    @staticmethod
+    def _preparar(documento: tuple):
+        """(clave, doc) a partir de un documento armado con `_documento`."""
+        clave, titulo, detalle, campos = documento
+        campos = [(texto, texto.split(), peso) for texto, peso in ((_normalizar(t), peso) for t, peso in campos if t)]
+        tokens = {t for _, toks, _ in campos for t in toks}
+        return clave, {
+            "title": titulo,
+            "subtitle": detalle or None,
+            "orden": (len(titulo), titulo),  # desempate: títulos cortos primero
+            "frases": [(texto, peso) for texto, _, peso in campos],
+            # (palabra, peso, bono por ser la primera palabra del campo)
+            "palabras": [(t, peso, 0.5 if i == 0 else 0.0) for _, toks, peso in campos for i, t in enumerate(toks)],
+            "tokens": tokens,
+            "trigramas": _trigramas(tokens),
+        }
+
+    def upsert(self, documento: tuple):
+        """Agrega o reemplaza un documento armado con `_documento`."""
+        clave, doc = self._preparar(documento)
+        with self._lock:
+            self._cache.clear()
+            self._insertar(clave, doc)
+            if self._durante_carga is not None:
+                self._durante_carga.append((clave, doc))
+
+    def remove(self, tipo: str, id_):
+        with self._lock:
+            self._cache.clear()
+            self._remove((tipo, id_))
+            if self._durante_carga is not None:
+                self._durante_carga.append(((tipo, id_), None))
+
+    def cargar(self, db, tablas=None) -> int:
+        """
+        Reconstruye el índice (o sólo las `tablas` dadas) desde la base de
+        datos. El nuevo se arma aparte, con el vocabulario ordenado una sola
+        vez, y se cambia de una vez bajo el lock: `buscar` nunca ve un
+        índice vacío o a medias.
+        """
+        tipos = {tipo for tabla, (_, tipo) in MODELOS.items() if tablas is None or tabla in tablas}
+        with self._lock:
+            self._durante_carga = []
+            # Los documentos no se modifican una vez armados: se comparten
+            docs = {clave: doc for clave, doc in self._docs.items() if clave[0] not in tipos}
+        try:
+            total = 0
+            for tabla, (modelo, tipo) in MODELOS.items():
+                if tipo not in tipos:
+                    continue
+                for obj in db.query(modelo):
+                    clave, doc = self._preparar(_documento(obj))
+                    docs[clave] = doc
+                    total += 1
+            postings, trigramas = {}, {}
+            for clave, doc in docs.items():
+                for token in doc["tokens"]:
+                    postings.setdefault(token, set()).add(clave)
+                for trigrama in doc["trigramas"]:
+                    trigramas.setdefault(trigrama, set()).add(clave)
+            vocabulario = sorted(postings)
+            with self._lock:
+                self._docs, self._postings, self._vocabulario, self._trigramas = docs, postings, vocabulario, trigramas
+                self._cache.clear()
+                # Lo confirmado mientras se leían las tablas puede faltar en la lectura
+                for clave, doc in self._durante_carga:
+                    if doc is None:
+                        self._remove(clave)
+                    else:
+                        self._insertar(clave, doc)
+        finally:
+            with self._lock:
+                self._durante_carga = None
+        return total
+
+    # --- Búsqueda ---
+
+    def _por_prefijo(self, prefijo: str) -> set:
+        claves = set()
+        i = bisect_left(self._vocabulario, prefijo)
+        while i < len(self._vocabulario) and self._vocabulario[i].startswith(prefijo):
+            claves |= self._postings[self._vocabulario[i]]
+            i += 1
+        return claves
+
+    @staticmethod
+    def _puntuar(doc: dict, tokens_q: list, frase: str) -> float:
+        puntaje = 0.0
+        for texto, peso in doc["frases"]:
+            if texto == frase:
+                puntaje += 10 * peso
+            elif texto.startswith(frase):
+                puntaje += 5 * peso
+            elif f" {frase}" in texto:
+                puntaje += 2 * peso
+        for consulta in tokens_q:
+            mejor = 0.0
+            for token, peso, bono in doc["palabras"]:
+                if token.startswith(consulta):
+                    valor = (1.0 if token == consulta else 0.5 + 0.5 * len(consulta) / len(token)) + bono
+                    if valor * peso > mejor:
+                        mejor = valor * peso
+            puntaje += mejor
+        return puntaje
+
+    def buscar(self, consulta: str, limit: int = 10, tipos=None) -> list:
+        """
+        Devuelve hasta `limit` resultados [{type, id, title, subtitle,
+        score, match}] ordenados por relevancia. `tipos` filtra por tipo.
+        """
+        inicio = time.perf_counter()
+        frase = _normalizar(consulta)
+        tokens_q = frase.split()
+        # Las palabras vacías se ignoran salvo la última, que puede estar a medio escribir
+        tokens_q = [t for t in tokens_q[:-1] if t not in STOPWORDS] + tokens_q[-1:]
+        clave_cache = (" ".join(tokens_q), limit, frozenset(tipos) if tipos else None)
+        with self._lock:
+            resultados = self._cache.get(clave_cache)
+            if resultados is not None:
+                self._cache.move_to_end(clave_cache)
+                self.cache_hits += 1
+            else:
+                resultados = self._buscar(tokens_q, frase, limit, tipos)
+                self._cache[clave_cache] = resultados
+                if len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+            ms = (time.perf_counter() - inicio) * 1000
+            self.lookups += 1
+            self.total_ms += ms
+            self._latencias.append(ms)
+        return resultados
+
+    def _buscar(self, tokens_q: list, frase: str, limit: int, tipos) -> list:
+        if not tokens_q:
+            return []
+        conjuntos = sorted((self._por_prefijo(t) for t in tokens_q), key=len)
+        candidatos = conjuntos[0].intersection(*conjuntos[1:])
+        if tipos:
+            candidatos = {c for c in candidatos if c[0] in tipos}
+        docs = self._docs
+        puntuados = [(-self._puntuar(docs[c], tokens_q, frase), docs[c]["orden"], c) for c in candidatos]
+        resultados = [self._resultado(c, -p, "prefix") for p, _, c in heapq.nsmallest(limit, puntuados)]
+        if not resultados and len(frase) >= 3:
+            resultados = self._por_trigramas(tokens_q, limit, tipos)
+        return resultados
+
+    def _por_trigramas(self, tokens_q: list, limit: int, tipos) -> list:
+        trigramas = _trigramas(tokens_q)
+        # Un resultado debe compartir `necesarios` trigramas con la consulta, así
+        # que tiene al menos uno de los (n - necesarios + 1) más raros: sólo se
+        # recorren esos postings y no los de trigramas comunes como " la".
+        necesarios = max(1, math.ceil(self.min_similarity * len(trigramas)))
+        raros = sorted(trigramas, key=lambda t: len(self._trigramas.get(t, ())))[:len(trigramas) - necesarios + 1]
+        candidatos = set().union(*(self._trigramas.get(t, ()) for t in raros))
+        similares = []
+        for clave in candidatos:
+            if tipos and clave[0] not in tipos:
+                continue
+            comunes = len(trigramas & self._docs[clave]["trigramas"])
+            if comunes >= necesarios:
+                similares.append((comunes / len(trigramas), clave))
+        return [
+            self._resultado(clave, similitud, "fuzzy")
+            for similitud, clave in heapq.nsmallest(
+                limit, similares, key=lambda p: (-p[0], self._docs[p[1]]["orden"])
+            )
+        ]
+
+    def _resultado(self, clave, puntaje: float, coincidencia: str) -> dict:
+        doc = self._docs[clave]
+        return {
+            "type": clave[0],
+            "id": clave[1],
+            "title": doc["title"],
+            "subtitle": doc["subtitle"],
+            "score": round(puntaje, 3),
+            "match": coincidencia,
+        }
+
+    def __len__(self):
+        return len(self._docs)
+
+    def stats(self) -> dict:
+        latencias = sorted(self._latencias)
+        return {
+            "size": len(self._docs),
+            "terms": len(self._vocabulario),
+            "trigrams": len(self._trigramas),
+            "lookups": self.lookups,
+            "cache_hits": self.cache_hits,
+            "avg_ms": round(self.total_ms / self.lookups, 4) if self.lookups else 0.0,
+            "p99_ms": round(latencias[min(len(latencias) - 1, int(0.99 * len(latencias)))], 4) if latencias else 0.0,
+        }
+
+
+def instalar_refresco(session_factory, index: SearchIndex):
+    """
+    Mantiene el índice al día con las escrituras hechas con el ORM: las
+    altas/cambios/bajas se aplican al confirmar. Las cargas con Core deben
+    llamar a `index.cargar(db, tablas)`.
+    """
+
+    @event.listens_for(session_factory, "after_flush")
+    def _anotar_cambios(session, flush_context):
+        cambios = session.info.setdefault("busqueda_cambios", [])
+        # Los datos se copian aquí: tras el commit los objetos están expirados
+        for obj in list(session.new) + list(session.dirty):
+            documento = _documento(obj)
+            if documento is not None:
+                cambios.append(("upsert", documento))
+        for obj in session.deleted:
+            documento = _documento(obj)
+            if documento is not None:
+                cambios.append(("remove", documento[0]))
+
+    @event.listens_for(session_factory, "after_commit")
+    def _aplicar(session):
+        for accion, dato in session.info.pop("busqueda_cambios", []):
+            if accion == "upsert":
+                index.upsert(dato)
+            else:
+                index.remove(*dato)
+
+    @event.listens_for(session_factory, "after_rollback")
+    def _descartar(session):
+        session.info.pop("busqueda_cambios", None)
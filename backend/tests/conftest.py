@@ -0,0 +1,95 @@
+"""
+Configuración común de las pruebas. Como los benchmarks, corren sin Gemini
+ni Postgres: SQLite temporal e IA simulada. Desde backend/:
+
+    python -m pytest -q
+"""
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+
+import pytest
+
+# Antes de importar src: nada del .env real (Postgres, API key) debe usarse
+_DIRECTORIO = tempfile.mkdtemp(prefix="trikabot_tests_")
+os.environ["ENV_FILE"] = os.devnull
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DIRECTORIO, 'tests.db')}"
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["GEMINI_API_KEY"] = "pruebas-sin-red"
+os.environ["SCHEMA_SNAPSHOT_PATH"] = os.path.join(_DIRECTORIO, "schema.json")
+os.environ["BCRYPT_ROUNDS"] = "4"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+from src.ai.base import AIPlatform  # noqa: E402
+
+
+class LLMFalso(AIPlatform):
+    """
+    IA simulada: cada llamada tarda `latencia` segundos y registra cuántas
+    había en curso a la vez. Al paso de SQL le responde `sql`.
+    """
+
+    def __init__(self, latencia: float = 0.2, sql: str = "SELECT nombre FROM ubicaciones LIMIT 5",
+                 respuesta: str = "Respuesta simulada."):
+        self.latencia = latencia
+        self.sql = sql
+        self.respuesta = respuesta
+        self.llamadas = 0
+        self.llamadas_sql = 0
+        self.en_curso = 0
+        self.max_en_curso = 0
+
+    def _texto(self, prompt: str) -> str:
+        return self.sql if "Traduce la siguiente pregunta" in prompt else self.respuesta
+
+    def chat(self, prompt: str) -> str:
+        raise AssertionError("el pipeline async no debe usar la llamada bloqueante")
+
+    async def achat(self, prompt: str) -> str:
+        self.llamadas += 1
+        self.llamadas_sql += "Traduce la siguiente pregunta" in prompt
+        self.en_curso += 1
+        self.max_en_curso = max(self.max_en_curso, self.en_curso)
+        try:
+            await asyncio.sleep(self.latencia)
+        finally:
+            self.en_curso -= 1
+        return self._texto(prompt)
+
+
+@pytest.fixture(scope="session")
+def main():
+    from src.database import Base, engine
+    from src import main as modulo
+
+    Base.metadata.create_all(bind=engine)
+    return modulo
+
+
+@pytest.fixture
+def llm(main):
+    """Reemplaza ambos pasos del LLM por un LLMFalso y parte con cachés vacías."""
+    falso = LLMFalso()
+    anteriores = main.ai_sql_platform, main.ai_platform
+    main.ai_sql_platform = main.envolver_llm(falso, "sql")
+    main.ai_platform = main.envolver_llm(falso, "answer")
+    main.sql_cache.clear()
+    main.result_cache.clear()
+    yield falso
+    main.ai_sql_platform, main.ai_platform = anteriores
+
+
+@pytest.fixture
+def api(main):
+    """`async with api() as cliente`: la app completa (con su lifespan) en el mismo proceso."""
+    import httpx
+
+    @asynccontextmanager
+    async def cliente():
+        async with main.app.router.lifespan_context(main.app):
+            transporte = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transporte, base_url="http://pruebas") as c:
+                yield c
+
+    return cliente
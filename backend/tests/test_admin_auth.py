@@ -0,0 +1,48 @@
+import asyncio
+import uuid
+
+import pytest
+
+from src.auth.utils import create_access_token
+
+
+def crear_usuario(id_tipo_usuario: int) -> str:
+    """Crea un usuario activo y devuelve un token suyo."""
+    from src.database import SessionLocal
+    from src.models import Usuario
+
+    correo = f"{uuid.uuid4().hex[:12]}@uni.pe"
+    with SessionLocal() as db:
+        db.add(Usuario(codigo_uni=correo[:12], nombre_completo="Usuario de prueba", correo=correo,
+                       contrasenia="x", estado=True, id_tipo_usuario=id_tipo_usuario))
+        db.commit()
+    return create_access_token({"sub": correo})
+
+
+def pedir(api, metodo: str, ruta: str, token: str = None, **kwargs):
+    async def correr():
+        async with api() as cliente:
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            return await cliente.request(metodo, ruta, headers=headers, **kwargs)
+
+    return asyncio.run(correr())
+
+
+@pytest.mark.parametrize("metodo, ruta, cuerpo, esperado", [
+    ("GET", "/api/admin/cache", {}, 200),
+    ("GET", "/api/admin/history", {}, 200),
+    ("GET", "/api/admin/templates", {}, 200),
+    ("GET", "/api/admin/db/pools", {}, 200),
+    ("DELETE", "/api/admin/cache/results", {}, 200),
+    ("POST", "/api/admin/schema/refresh", {}, 200),
+    ("POST", "/api/admin/ingest/refresh", {"json": {"tables": ["cursos"]}}, 200),
+    ("POST", "/api/admin/ingest/cursos",
+     {"files": {"archivo": ("cursos.csv", b"codigo_curso,nombre\nBMA01,Calculo Diferencial\n")}}, 200),
+    ("POST", "/chat/batch",
+     {"files": {"archivo": ("lote.jsonl", '{"id": 1, "prompt": "¿Dónde queda el aula 1?"}\n'.encode())}}, 202),
+    ("GET", "/chat/batch/inexistente", {}, 404),
+])
+def test_endpoints_admin_exigen_administrador(main, llm, api, metodo, ruta, cuerpo, esperado):
+    assert pedir(api, metodo, ruta, **cuerpo).status_code == 401
+    assert pedir(api, metodo, ruta, crear_usuario(id_tipo_usuario=2), **cuerpo).status_code == 403
+    assert pedir(api, metodo, ruta, crear_usuario(id_tipo_usuario=1), **cuerpo).status_code == esperado
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+from test_admin_auth import crear_usuario
+
+
+def test_lote_corre_en_segundo_plano(main, llm, api, monkeypatch):
+    monkeypatch.setattr(main.lotes, "flush_interval", 0.05)
+    llm.latencia = 0.1
+    token = crear_usuario(id_tipo_usuario=1)
+    headers = {"Authorization": f"Bearer {token}"}
+    preguntas = [{"id": n, "prompt": f"¿Qué aulas hay en el piso {n}?"} for n in range(6)]
+    preguntas.append({"id": "repetida", "prompt": "¿Qué aulas hay en el piso 0?"})
+    archivo = "".join(json.dumps(p, ensure_ascii=False) + "\n" for p in preguntas).encode()
+
+    async def correr():
+        async with api() as cliente:
+            lanzado = await cliente.post("/chat/batch", headers=headers, params={"concurrency": 2, "rpm": 0},
+                                         files={"archivo": ("lote.jsonl", archivo)})
+            assert lanzado.status_code == 202
+            lote = lanzado.json()
+            estados = []
+            for _ in range(100):
+                estado = (await cliente.get(lote["status_url"], headers=headers)).json()
+                estados.append(estado)
+                if estado["status"] != "running":
+                    break
+                await asyncio.sleep(0.05)
+            return lote, estados
+
+    lote, estados = asyncio.run(correr())
+
+    assert lote["questions"] == 7 and lote["unique"] == 6
+    assert estados[0]["status"] == "running" and estados[0]["done"] < 6
+    final = estados[-1]
+    assert final["status"] == "done" and final["done"] == 6
+    assert final["summary"]["duplicates"] == 1
+    assert [r["ids"] for r in final["results"]][0] == [0, "repetida"]
+    # El avance se guarda mientras corre: algún sondeo vio resultados parciales
+    assert any(0 < len(e["results"]) < 6 for e in estados if e["status"] == "running")
+
+
+def test_lote_interrumpido_conserva_lo_hecho(main, llm, api):
+    llm.latencia = 0.2
+    token = crear_usuario(id_tipo_usuario=1)
+    archivo = "".join(json.dumps({"id": n, "prompt": f"¿Dónde queda el laboratorio {n}?"}) + "\n" for n in range(20))
+
+    async def correr():
+        async with api() as cliente:
+            lanzado = await cliente.post("/chat/batch", headers={"Authorization": f"Bearer {token}"},
+                                         params={"concurrency": 1, "rpm": 0},
+                                         files={"archivo": ("lote.jsonl", archivo.encode())})
+            await asyncio.sleep(0.5)
+            return lanzado.json()["job_id"]
+        # Al salir, el lifespan detiene los lotes en curso
+
+    estado = main.lotes.consultar(asyncio.run(correr()))
+    assert estado["status"] == "interrupted"
+    assert 0 < estado["done"] < 20 and len(estado["results"]) == estado["done"]
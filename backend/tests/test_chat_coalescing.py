@@ -0,0 +1,52 @@
+import asyncio
+import json
+
+
+def leer_eventos(cuerpo: str) -> list:
+    eventos = []
+    for bloque in filter(None, cuerpo.split("\n\n")):
+        nombre, datos = bloque.split("\n", 1)
+        eventos.append((nombre.removeprefix("event: "), json.loads(datos.removeprefix("data: "))))
+    return eventos
+
+
+def test_streams_identicos_llaman_una_vez_al_llm(main, llm, api):
+    llm.latencia = 0.3
+    pregunta = "¿Qué aulas hay en el pabellón R?"
+
+    async def correr():
+        async with api() as cliente:
+            # Primer turno de dos chats y una pregunta sin chat: el mismo contexto (vacío)
+            chats = [(await cliente.post("/api/chats")).json() for _ in range(2)]
+            cuerpos = [{"prompt": pregunta, "chat_id": c["id_chat"], "chat_key": c["chat_key"]} for c in chats]
+            cuerpos += [{"prompt": pregunta}] * 2
+            return await asyncio.gather(*(cliente.post("/chat/stream", json=c) for c in cuerpos))
+
+    respuestas = asyncio.run(correr())
+
+    assert all(r.status_code == 200 for r in respuestas)
+    assert llm.llamadas_sql == 1
+    assert main.coalescer.stats()["in_flight"] == 0
+    for respuesta in respuestas:
+        eventos = leer_eventos(respuesta.text)
+        assert eventos[-1][0] == "done"
+        assert "".join(d["text"] for e, d in eventos if e == "token")
+
+
+def test_stream_se_une_a_un_chat_en_curso(main, llm, api):
+    llm.latencia = 0.3
+    pregunta = "¿Qué laboratorios hay en el pabellón Q?"
+
+    async def correr():
+        async with api() as cliente:
+            return await asyncio.gather(
+                cliente.post("/chat", json={"prompt": pregunta}),
+                cliente.post("/chat/stream", json={"prompt": pregunta}),
+            )
+
+    normal, stream = asyncio.run(correr())
+
+    assert normal.status_code == stream.status_code == 200
+    assert llm.llamadas_sql == 1
+    tokens = "".join(d["text"] for e, d in leer_eventos(stream.text) if e == "token")
+    assert tokens == normal.json()["response"]
@@ -0,0 +1,22 @@
+import asyncio
+import time
+
+
+def test_chats_concurrentes_se_solapan(main, llm, api):
+    # Si el pipeline bloqueara el event loop, las llamadas al LLM irían una tras otra
+    llm.latencia = 0.3
+    preguntas = [f"¿Qué ubicaciones hay en el pabellón {letra}?" for letra in "ABCDEFGH"]
+
+    async def correr():
+        async with api() as cliente:
+            inicio = time.perf_counter()
+            respuestas = await asyncio.gather(*(cliente.post("/chat", json={"prompt": p}) for p in preguntas))
+            return respuestas, time.perf_counter() - inicio
+
+    respuestas, duracion = asyncio.run(correr())
+
+    assert all(r.status_code == 200 for r in respuestas)
+    assert llm.llamadas >= len(preguntas)
+    assert llm.max_en_curso == len(preguntas)
+    # En serie serían al menos 8 x 0.3 s sólo en el paso de SQL
+    assert duracion < len(preguntas) * llm.latencia / 2
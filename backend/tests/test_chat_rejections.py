@@ -0,0 +1,60 @@
+import asyncio
+import json
+
+import pytest
+
+from src.chat.schema import SchemaSnapshot
+from src.chat.sql_guard import TABLAS_INTERNAS, SQLRechazada, validar_sql
+
+
+def test_rechazo_por_costo_llega_al_cliente(main, llm, api, monkeypatch):
+    def costo_excedido(db, sql, max_cost, params=None):
+        raise SQLRechazada("cost_exceeded", "El costo estimado de la consulta supera el máximo permitido.")
+
+    monkeypatch.setattr(main, "verificar_costo", costo_excedido)
+    pregunta = "¿Qué ubicaciones tienen más de tres pisos y ascensor?"
+
+    async def correr():
+        async with api() as cliente:
+            return await cliente.post("/chat", json={"prompt": pregunta})
+
+    cuerpo = asyncio.run(correr()).json()
+
+    assert cuerpo["source"] == "rejected"
+    assert cuerpo["rejection"]["code"] == "cost_exceeded"
+    assert llm.llamadas == 1  # no se pasa el error al LLM de respuesta
+    # El SQL rechazado no queda en caché: la próxima vez se vuelve a generar
+    assert main.sql_cache.get_sql(pregunta, main.schema_snapshot.fingerprint) is None
+
+
+@pytest.mark.parametrize("sql", [
+    "SELECT correo, contrasenia FROM usuarios",
+    "SELECT * FROM public.metricas_consulta",
+    'SELECT * FROM "Versiones_Datos"',
+    "WITH c AS (SELECT * FROM consultas) SELECT count(*) FROM c",
+    "SELECT u.nombre FROM ubicaciones u WHERE u.id_ubicacion IN (SELECT id_chat FROM chats)",
+])
+def test_sql_sobre_tablas_internas_se_rechaza(sql):
+    with pytest.raises(SQLRechazada) as error:
+        validar_sql(sql)
+    assert error.value.code == "forbidden_table"
+
+
+def test_las_tablas_internas_no_llegan_al_schema_del_llm(main, tmp_path):
+    nombres = {t["name"] for t in main.schema_snapshot.tablas}
+    assert nombres and not nombres & TABLAS_INTERNAS
+    assert "ubicaciones" in nombres
+    for tabla in TABLAS_INTERNAS:
+        assert f"TABLE: {tabla}\n" not in main.schema_snapshot.texto
+        assert f"-> {tabla}(" not in main.schema_snapshot.texto
+
+    # Un snapshot guardado antes de excluirlas tampoco las trae de vuelta
+    from src.database import engine
+
+    ruta = tmp_path / "schema.json"
+    viejo = SchemaSnapshot(engine, str(ruta), excluir=frozenset())
+    viejo.refrescar()
+    assert "metricas_consulta" in {t["name"] for t in json.loads(ruta.read_text())["tables"]}
+    snapshot = SchemaSnapshot(engine, str(ruta))
+    assert snapshot.cargar() == "snapshot"
+    assert not {t["name"] for t in snapshot.tablas} & TABLAS_INTERNAS
@@ -0,0 +1,85 @@
+import asyncio
+
+from src.chat.conversation import ConversationStore
+
+from test_admin_auth import crear_usuario
+
+
+def preguntar(api, cuerpo: dict, token: str = None):
+    async def correr():
+        async with api() as cliente:
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            return await cliente.post("/chat", json=cuerpo, headers=headers)
+
+    return asyncio.run(correr())
+
+
+def abrir_chat(api, token: str = None) -> dict:
+    async def correr():
+        async with api() as cliente:
+            headers = {"Authorization": f"Bearer {token}"} if token else {}
+            return (await cliente.post("/api/chats", headers=headers)).json()
+
+    return asyncio.run(correr())
+
+
+def test_chat_exige_su_clave(main, llm, api):
+    chat, otro = abrir_chat(api), abrir_chat(api)
+    pregunta = {"prompt": "¿Dónde queda el aula 3?", "chat_id": chat["id_chat"]}
+
+    assert preguntar(api, pregunta).status_code == 404
+    assert preguntar(api, {**pregunta, "chat_key": otro["chat_key"]}).status_code == 404
+    assert preguntar(api, {**pregunta, "chat_key": chat["chat_key"]}).status_code == 200
+
+
+def test_chat_con_dueno_solo_para_su_usuario(main, llm, api):
+    dueno, intruso = crear_usuario(id_tipo_usuario=2), crear_usuario(id_tipo_usuario=2)
+    chat = abrir_chat(api, dueno)
+    pregunta = {"prompt": "¿Dónde queda el aula 4?", "chat_id": chat["id_chat"], "chat_key": chat["chat_key"]}
+
+    assert preguntar(api, pregunta).status_code == 404
+    assert preguntar(api, pregunta, intruso).status_code == 404
+    assert preguntar(api, pregunta, dueno).status_code == 200
+
+
+def guardar_turno(id_chat: int, pregunta: str, respuesta: str):
+    """Un turno escrito por otro worker."""
+    from src.database import SessionLocal
+    from src.models import Consulta, MetricaConsulta, Respuesta
+
+    with SessionLocal() as db:
+        consulta = Consulta(id_chat=id_chat, contenido=pregunta)
+        consulta.respuestas.append(Respuesta(contenido=respuesta))
+        consulta.metrica = MetricaConsulta(origen="llm")
+        db.add(consulta)
+        db.commit()
+
+
+def test_turnos_de_otro_worker_y_resumen_persistido(main, llm, api):
+    id_chat = abrir_chat(api)["id_chat"]
+
+    async def resumir(previo, turnos):
+        return "Preguntó por el aula 5."
+
+    async def correr():
+        store = ConversationStore(resumir, max_turns=1, guardar_resumen=main.guardar_resumen)
+        conv = await store.obtener(id_chat, main.cargar_conversacion, main.contar_turnos)
+        store.agregar_turno(conv, "¿Dónde queda el aula 5?", "En el pabellón A.")
+        assert await store.obtener(id_chat, main.cargar_conversacion, main.contar_turnos) is conv
+
+        guardar_turno(id_chat, "¿Dónde queda el aula 5?", "En el pabellón A.")
+        guardar_turno(id_chat, "¿Y el aula 6?", "En el pabellón B.")
+        conv = await store.obtener(id_chat, main.cargar_conversacion, main.contar_turnos)
+        assert store.reloads == 1
+        assert list(conv.turnos) == [("¿Y el aula 6?", "En el pabellón B.")]
+
+        store.agregar_turno(conv, "¿Y su piso?", "El 2.")
+        await asyncio.gather(*store._tareas)
+
+        # Un worker recién iniciado parte del resumen guardado
+        nuevo = ConversationStore(resumir, max_turns=1)
+        return await nuevo.obtener(id_chat, main.cargar_conversacion, main.contar_turnos)
+
+    conv = asyncio.run(correr())
+    assert conv.resumen == "Preguntó por el aula 5."
+    assert conv.resumidos == 2
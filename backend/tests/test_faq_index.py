@@ -0,0 +1,42 @@
+from src.chat.faq import FAQIndex
+
+
+class BaseFalsa:
+    """Devuelve `filas` y, mientras "lee la tabla", corre `durante`."""
+
+    def __init__(self, filas, durante):
+        self.filas = filas
+        self.durante = durante
+
+    def query(self, *columnas):
+        return self
+
+    def all(self):
+        self.durante()
+        return self.filas
+
+
+def test_recargar_no_deja_el_indice_vacio_ni_pierde_cambios():
+    index = FAQIndex(threshold=0.5)
+    index.upsert(1, "¿Dónde pago la matrícula?", "En tesorería")
+    vistas = []
+
+    def durante():
+        # Otro hilo busca y confirma una FAQ nueva mientras se lee la tabla
+        vistas.append(index.buscar("¿Dónde pago la matrícula?"))
+        index.upsert(3, "¿Cuándo abre la biblioteca?", "A las 8")
+
+    filas = [
+        (1, "¿Dónde pago la matrícula?", "En tesorería, primer piso", None),
+        (2, "¿Dónde recojo mi carné?", "En registro", None),
+    ]
+    assert index.cargar(BaseFalsa(filas, durante)) == 2
+
+    assert vistas[0]["respuesta"] == "En tesorería"
+    assert index.buscar("¿Dónde pago la matrícula?")["respuesta"] == "En tesorería, primer piso"
+    assert index.buscar("¿Cuándo abre la biblioteca?")["respuesta"] == "A las 8"
+    assert len(index) == 3
+
+    # Sin la FAQ 3 en la base, una nueva recarga la quita
+    assert index.cargar(BaseFalsa(filas, lambda: None)) == 2
+    assert len(index) == 2 and index.buscar("¿Cuándo abre la biblioteca?") is None
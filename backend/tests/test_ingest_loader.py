@@ -0,0 +1,64 @@
+import io
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from src.ingest.loader import BulkLoader, convertir_valor
+
+
+@pytest.mark.parametrize("valor, esperado", [
+    ("true", True), ("FALSE", False), ("1", True), ("0", False), (True, True), (0, False),
+])
+def test_booleanos(valor, esperado):
+    assert convertir_valor(bool, valor) is esperado
+
+
+@pytest.mark.parametrize("valor", ["no", "sí", "2", ""])
+def test_booleanos_invalidos(valor):
+    with pytest.raises(ValueError):
+        convertir_valor(bool, valor)
+
+
+def test_fechas_iso():
+    assert convertir_valor(datetime, "2024-03-01T08:30:00-05:00") == datetime(
+        2024, 3, 1, 8, 30, tzinfo=timezone(timedelta(hours=-5)))
+    assert convertir_valor(date, "2024-03-01") == date(2024, 3, 1)
+    for tipo, valor in ((datetime, "01/03/2024"), (date, "2024-03-01T08:30:00")):
+        with pytest.raises(ValueError):
+            convertir_valor(tipo, valor)
+
+
+def test_numeros_con_decimal():
+    assert convertir_valor(Decimal, "12.30") == Decimal("12.30")
+    assert convertir_valor(Decimal, 0.1) == Decimal("0.1")  # sin la expansión binaria del float
+    assert convertir_valor(float, "2.5") == 2.5
+    assert convertir_valor(int, "7") == 7 and convertir_valor(int, 7.0) == 7
+    for tipo, valor in ((int, 3.7), (int, True), (Decimal, "NaN"), (float, "inf"), (Decimal, "doce")):
+        with pytest.raises(ValueError):
+            convertir_valor(tipo, valor)
+
+
+def cargar(tabla: str, texto: str) -> dict:
+    from src.database import SessionLocal
+
+    return BulkLoader(SessionLocal, tabla).cargar(io.StringIO(texto), "jsonl")
+
+
+def test_la_carga_convierte_y_rechaza_por_tipo(main):
+    from src.database import SessionLocal
+    from src.models import DocenteCursoInfo
+
+    cargar("docentes", '{"nombres_completos": "Rosa Vega", "correo_institucional": "rosa.vega@uni.pe"}\n')
+    cargar("cursos", '{"codigo_curso": "CB-301", "nombre": "Física III", "ciclo_sugerido": "3"}\n')
+
+    reporte = cargar("docente_curso_info", (
+        '{"correo_docente": "rosa.vega@uni.pe", "codigo_curso": "CB-301", "fecha_registro": "2024-03-01T08:30:00"}\n'
+        '{"correo_docente": "rosa.vega@uni.pe", "codigo_curso": "CB-301", "fecha_registro": "01/03/2024"}\n'
+    ))
+
+    assert reporte["inserted"] == 1 and reporte["rejected"] == 1
+    assert "fecha_registro: se esperaba fecha y hora ISO 8601" in reporte["errors"][0]["error"]
+    with SessionLocal() as db:
+        fila = db.query(DocenteCursoInfo).filter_by(codigo_curso="CB-301").one()
+        assert fila.fecha_registro.replace(tzinfo=None) == datetime(2024, 3, 1, 8, 30)
@@ -0,0 +1,40 @@
+import io
+
+from src.ingest import versions
+from src.ingest.loader import BulkLoader
+from src.ingest.versions import VersionWatcher
+
+
+def cargar_faq(pregunta: str):
+    from src.database import SessionLocal
+
+    archivo = io.StringIO(f"pregunta,respuesta\n{pregunta},En la oficina de registro\n")
+    return BulkLoader(SessionLocal, "preguntas_frecuentes").cargar(archivo, "csv")
+
+
+def test_carga_de_otro_proceso_llega_a_cada_worker(main, monkeypatch):
+    from src.database import SessionLocal
+
+    avisos = []
+    vigia = VersionWatcher(SessionLocal, avisos.append)
+    vigia.revisar()
+
+    # Lo que carga este proceso ya se aplicó al cargar: no se repite
+    assert cargar_faq("¿Dónde recojo mi carné?")["inserted"] == 1
+    assert vigia.revisar() == set() and avisos == []
+
+    # Una carga de la CLI u otro worker sí se aplica, una sola vez
+    cargar_faq("¿Dónde pago la matrícula?")
+    monkeypatch.setattr(versions, "_publicadas", {})  # como si la hubiera hecho otro proceso
+    assert vigia.revisar() == {"preguntas_frecuentes"}
+    assert avisos == [{"preguntas_frecuentes"}]
+    assert vigia.revisar() == set()
+
+
+def test_el_worker_refresca_la_faq_tras_una_carga_externa(main, monkeypatch):
+    main.vigia_versiones.revisar()
+    cargar_faq("¿Cuándo abre la biblioteca?")
+    monkeypatch.setattr(versions, "_publicadas", {})
+
+    assert main.vigia_versiones.revisar() == {"preguntas_frecuentes"}
+    assert main.faq_index.buscar("¿Cuándo abre la biblioteca?") is not None
@@ -0,0 +1,33 @@
+from sqlalchemy import create_engine, inspect, text
+
+from src.database import Base
+from src.migrations.schema import TABLAS_PROPIAS, migrar, pendientes
+
+
+def base_sin_tablas_propias(tmp_path):
+    """Base con sólo las tablas del dominio, como antes del backend."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'vieja.db'}")
+    propias = {m.__table__.name for m in TABLAS_PROPIAS}
+    Base.metadata.create_all(engine, tables=[t for t in Base.metadata.sorted_tables if t.name not in propias])
+    return engine
+
+
+def test_migrar_crea_lo_que_falta_una_sola_vez(tmp_path):
+    engine = base_sin_tablas_propias(tmp_path)
+    assert set(pendientes(engine)) == {m.__table__.name for m in TABLAS_PROPIAS}
+
+    assert len(migrar(engine)) == len(TABLAS_PROPIAS)
+    assert pendientes(engine) == []
+    # Un segundo despliegue (o worker) no vuelve a tocar nada
+    assert migrar(engine) == []
+
+
+def test_migrar_agrega_columnas_nuevas_a_una_tabla_vieja(tmp_path):
+    engine = base_sin_tablas_propias(tmp_path)
+    with engine.begin() as conexion:
+        conexion.execute(text("CREATE TABLE versiones_datos (tabla VARCHAR(50) PRIMARY KEY, version INTEGER)"))
+
+    assert "versiones_datos.actualizado_en" in pendientes(engine)
+    assert "versiones_datos.actualizado_en" in migrar(engine)
+    assert "actualizado_en" in {c["name"] for c in inspect(engine).get_columns("versiones_datos")}
+    assert pendientes(engine) == []
@@ -0,0 +1,11 @@
+from src.chat.renderer import renderizar
+
+
+def test_conteo_se_redacta_como_registros():
+    assert renderizar(["count"], [(42,)]) == "Encontré 42 registro(s)."
+    assert renderizar(["count(*)"], [(3,)]) == "Encontré 3 registro(s)."
+
+
+def test_otros_agregados_se_muestran_con_su_etiqueta():
+    assert renderizar(["total_creditos"], [(42,)]) == "Total creditos: 42"
+    assert renderizar(["cantidad_horas"], [(6,)]) == "Cantidad horas: 6"
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from src.ai.base import AIPlatform
+from src.ai.resilience import CircuitBreaker, LLMNoDisponible, ResilientPlatform
+
+
+class Proveedor(AIPlatform):
+    """Responde según `modo`: "ok", "caido" (transitorio), "bloqueado" (no transitorio) o "lento"."""
+
+    def __init__(self):
+        self.modo = "ok"
+
+    def _responder(self):
+        if self.modo == "caido":
+            raise ConnectionError("proveedor caído")
+        if self.modo == "bloqueado":
+            raise ValueError("respuesta bloqueada")
+        return "hola"
+
+    def chat(self, prompt: str) -> str:
+        return self._responder()
+
+    async def achat(self, prompt: str) -> str:
+        if self.modo == "lento":
+            await asyncio.sleep(10)
+        return self._responder()
+
+    async def astream(self, prompt: str):
+        yield self._responder()
+
+
+def abrir_circuito(proveedor: Proveedor) -> ResilientPlatform:
+    plataforma = ResilientPlatform(proveedor, "answer", max_retries=0,
+                                   breaker=CircuitBreaker(threshold=1, cooldown=0.05))
+    proveedor.modo = "caido"
+    with pytest.raises(ConnectionError):
+        asyncio.run(plataforma.achat("x"))
+    assert plataforma.breaker.estado == "open"
+    time.sleep(0.06)
+    assert plataforma.breaker.estado == "half_open"
+    return plataforma
+
+
+def test_prueba_con_error_no_transitorio_cierra_el_circuito():
+    proveedor = Proveedor()
+    plataforma = abrir_circuito(proveedor)
+    proveedor.modo = "bloqueado"
+    with pytest.raises(ValueError):
+        asyncio.run(plataforma.achat("x"))
+
+    proveedor.modo = "ok"
+    assert asyncio.run(plataforma.achat("x")) == "hola"
+    assert plataforma.breaker.estado == "closed"
+
+
+def test_prueba_cancelada_no_deja_el_circuito_trabado():
+    proveedor = Proveedor()
+    plataforma = abrir_circuito(proveedor)
+    proveedor.modo = "lento"
+
+    async def cancelar_prueba():
+        tarea = asyncio.ensure_future(plataforma.achat("x"))
+        await asyncio.sleep(0.01)
+        tarea.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await tarea
+
+    asyncio.run(cancelar_prueba())
+    # La cancelación cuenta como falla: el circuito vuelve a abrirse por un cooldown
+    with pytest.raises(LLMNoDisponible):
+        asyncio.run(plataforma.achat("x"))
+
+    time.sleep(0.06)
+    proveedor.modo = "ok"
+    assert asyncio.run(plataforma.achat("x")) == "hola"
+    assert plataforma.breaker.estado == "closed"
+
+
+def test_prueba_en_stream_con_error_no_transitorio():
+    proveedor = Proveedor()
+    plataforma = abrir_circuito(proveedor)
+    proveedor.modo = "bloqueado"
+
+    async def consumir():
+        return [f async for f in plataforma.astream("x")]
+
+    with pytest.raises(ValueError):
+        asyncio.run(consumir())
+
+    proveedor.modo = "ok"
+    assert asyncio.run(consumir()) == ["hola"]
+    assert plataforma.breaker.estado == "closed"
+
+
+def test_prueba_sincrona_con_error_no_transitorio():
+    proveedor = Proveedor()
+    plataforma = abrir_circuito(proveedor)
+    proveedor.modo = "bloqueado"
+    with pytest.raises(ValueError):
+        plataforma.chat("x")
+
+    proveedor.modo = "ok"
+    assert plataforma.chat("x") == "hola"
@@ -0,0 +1,47 @@
+import asyncio
+
+from src.chat.result_cache import ResultCache
+from src.ingest import versions
+from src.ingest.versions import VersionWatcher
+
+
+def test_el_tamano_cuenta_las_filas_ademas_del_texto(main, llm, monkeypatch):
+    from src.database import SessionLocal
+    from src.models import Ubicacion
+
+    with SessionLocal() as db:
+        db.add_all([Ubicacion(nombre=f"Aula {i}", tipo="aula", pabellon="B") for i in range(3)])
+        db.commit()
+    sql = "SELECT nombre, pabellon FROM ubicaciones WHERE tipo = 'aula'"
+
+    with SessionLocal() as db:
+        columnas, filas, texto, _ = asyncio.run(main.obtener_datos(db, sql))
+    assert filas and main.result_cache.bytes > len(texto.encode())
+
+    # Truncado: el paso 3 sólo usa el texto y las filas no se guardan
+    main.result_cache.clear()
+    monkeypatch.setattr(main, "SQL_RESULT_MAX_BYTES", 30)
+    with SessionLocal() as db:
+        columnas, filas, texto, total = asyncio.run(main.obtener_datos(db, sql))
+    assert filas is None and total >= 3 and "truncado" in texto
+    assert main.result_cache.get(sql)[1] is None
+    assert main.result_cache.bytes == len(texto.encode())
+
+
+def test_una_escritura_del_orm_invalida_la_cache_de_otro_worker(main, monkeypatch):
+    from src.database import SessionLocal
+    from src.models import Docente
+
+    # La caché de "otro worker" y su vigía de versiones_datos
+    otra = ResultCache(["docentes"])
+    otra.set("SELECT nombres_completos FROM docentes", ("filas",), size=10)
+    vigia = VersionWatcher(SessionLocal, otra.invalidate_tables)
+    vigia.revisar()
+
+    with SessionLocal() as db:
+        db.add(Docente(nombres_completos="Luis Paredes"))
+        db.commit()
+    monkeypatch.setattr(versions, "_publicadas", {})  # el vigía es de otro proceso
+
+    assert vigia.revisar() == {"docentes"}
+    assert otra.get("SELECT nombres_completos FROM docentes") is None
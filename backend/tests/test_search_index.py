@@ -0,0 +1,56 @@
+from src.models import Docente, Ubicacion
+from src.search.index import SearchIndex, _documento
+
+
+class BaseFalsa:
+    """Devuelve los objetos de cada modelo y, mientras "lee" ubicaciones, corre `durante`."""
+
+    def __init__(self, objetos: dict, durante=lambda: None):
+        self.objetos = objetos
+        self.durante = durante
+
+    def query(self, modelo):
+        if modelo is Ubicacion:
+            self.durante()
+        return list(self.objetos.get(modelo, []))
+
+
+def titulos(index, consulta):
+    return [r["title"] for r in index.buscar(consulta)]
+
+
+def test_recargar_cambia_el_indice_de_una_vez():
+    index = SearchIndex()
+    index.upsert(_documento(Ubicacion(id_ubicacion=1, nombre="Laboratorio A1", tipo="laboratorio")))
+    index.upsert(_documento(Docente(id_docente=1, nombres_completos="Ana Torres")))
+    vistas = []
+
+    def durante():
+        # Otro hilo busca y confirma un docente mientras se leen las tablas
+        vistas.append(titulos(index, "lab"))
+        index.upsert(_documento(Docente(id_docente=2, nombres_completos="Luis Paredes")))
+
+    base = BaseFalsa({Ubicacion: [
+        Ubicacion(id_ubicacion=1, nombre="Laboratorio B2", tipo="laboratorio"),
+        Ubicacion(id_ubicacion=2, nombre="Auditorio Central", tipo="auditorio"),
+    ]}, durante)
+    assert index.cargar(base, {"ubicaciones"}) == 2
+
+    assert vistas == [["Laboratorio A1"]]
+    assert titulos(index, "lab") == ["Laboratorio B2"]
+    assert titulos(index, "audi") == ["Auditorio Central"]
+    # Los docentes no se recargaron: siguen, con el alta hecha durante la carga
+    assert titulos(index, "ana") == ["Ana Torres"]
+    assert titulos(index, "luis") == ["Luis Paredes"]
+    assert index._vocabulario == sorted(index._postings)
+    assert len(index) == 4
+
+
+def test_recarga_completa_quita_lo_que_ya_no_esta():
+    index = SearchIndex()
+    index.upsert(_documento(Docente(id_docente=1, nombres_completos="Ana Torres")))
+
+    assert index.cargar(BaseFalsa({Docente: [Docente(id_docente=3, nombres_completos="Rosa Vega")]})) == 1
+
+    assert titulos(index, "ana") == [] and titulos(index, "rosa") == ["Rosa Vega"]
+    assert index._vocabulario == sorted(index._postings)
@@ -0,0 +1,108 @@
+import pytest
+
+from src.chat.templates import TemplateLibrary
+
+SQL = "SELECT piso FROM ubicaciones WHERE nombre = '{}' LIMIT 1"
+HUELLA = "pruebas"
+AULAS = ("Aula B12", "Aula C7", "Aula D3", "Aula E1")
+
+
+@pytest.fixture(scope="module")
+def entidades(main):
+    from src.database import SessionLocal
+    from src.models import Ubicacion
+
+    with SessionLocal() as db:
+        for aula in AULAS:
+            db.add(Ubicacion(nombre=aula, tipo="aula", pabellon=aula[5], piso="1"))
+        db.commit()
+
+
+def biblioteca(**kwargs) -> TemplateLibrary:
+    from src.database import SessionLocal
+
+    plantillas = TemplateLibrary(**kwargs)
+    with SessionLocal() as db:
+        plantillas.cargar_entidades(db)
+    return plantillas
+
+
+def activa(plantillas: TemplateLibrary, pregunta: str) -> bool:
+    return plantillas.patron(pregunta)[0] in {t["pattern"] for t in plantillas.listar()}
+
+
+def test_plantilla_que_falla_se_retira_y_se_reaprende(entidades):
+    plantillas = biblioteca(min_examples=2)
+    for aula in AULAS[:2]:
+        plantillas.aprender(f"¿Dónde queda el {aula}?", SQL.format(aula), HUELLA)
+    assert plantillas.buscar("¿Dónde queda el Aula D3?", HUELLA) is not None
+
+    assert plantillas.degradar("¿Dónde queda el Aula D3?")
+    assert plantillas.buscar("¿Dónde queda el Aula D3?", HUELLA) is None
+    assert plantillas.stats()["demoted"] == 1
+
+    corregido = "SELECT piso, pabellon FROM ubicaciones WHERE nombre = '{}' LIMIT 1"
+    for aula in AULAS[2:]:
+        plantillas.aprender(f"¿Dónde queda el {aula}?", corregido.format(aula), HUELLA)
+    sql, params, _ = plantillas.buscar("¿Dónde queda el Aula B12?", HUELLA)
+    assert "pabellon" in sql and params == {"p0": "Aula B12"}
+
+
+def test_candidatas_acotadas(entidades):
+    plantillas = biblioteca(min_examples=2, max_candidates=3)
+    preguntas = ("¿Dónde queda el {}?", "¿Cómo llego al {}?", "¿En qué piso está el {}?",
+                 "¿Qué pabellón tiene el {}?", "Busco el {}")
+    for pregunta in preguntas:
+        plantillas.aprender(pregunta.format("Aula B12"), SQL.format("Aula B12"), HUELLA)
+    assert plantillas.stats()["candidates"] == 3
+
+
+def test_arranque_solo_aprende_de_sql_con_filas(main, entidades, monkeypatch):
+    from src.database import SessionLocal
+    from src.models import Consulta, MetricaConsulta
+
+    with SessionLocal() as db:
+        # Dos SQL que fallaron (sin filas registradas) y dos que no devolvieron nada
+        for aula, filas in zip(AULAS, (None, None, 0, 0)):
+            consulta = Consulta(contenido=f"¿En qué piso queda el {aula}?")
+            consulta.metrica = MetricaConsulta(sql_generado=SQL.format(aula), origen="llm", filas_resultado=filas)
+            db.add(consulta)
+        db.commit()
+
+    monkeypatch.setattr(main, "plantillas_sql", TemplateLibrary(min_examples=2))
+    main.cargar_plantillas()
+    assert main.plantillas_sql.buscar("¿En qué piso queda el Aula B12?", main.schema_snapshot.fingerprint) is None
+
+    with SessionLocal() as db:
+        for aula in AULAS[:2]:
+            consulta = Consulta(contenido=f"¿En qué piso queda el {aula}?")
+            consulta.metrica = MetricaConsulta(sql_generado=SQL.format(aula), origen="llm", filas_resultado=1)
+            db.add(consulta)
+        db.commit()
+
+    main.cargar_plantillas()
+    assert main.plantillas_sql.buscar("¿En qué piso queda el Aula E1?", main.schema_snapshot.fingerprint) is not None
+
+
+def test_chat_retira_la_plantilla_si_su_sql_falla(main, llm, api, entidades, monkeypatch):
+    import asyncio
+
+    plantillas = biblioteca(min_examples=2)
+    monkeypatch.setattr(main, "plantillas_sql", plantillas)
+
+    def falla(db, sql_query, params=None):
+        raise RuntimeError("column \"piso\" does not exist")
+
+    monkeypatch.setattr(main, "ejecutar_sql", falla)
+
+    async def correr():
+        async with api() as cliente:
+            # Con el schema ya cargado: su huella es parte de la plantilla
+            for aula in AULAS[:2]:
+                plantillas.aprender(f"¿Dónde queda el {aula}?", SQL.format(aula), main.schema_snapshot.fingerprint)
+            assert activa(plantillas, "¿Dónde queda el Aula D3?")
+            return await cliente.post("/chat", json={"prompt": "¿Dónde queda el Aula D3?"})
+
+    assert asyncio.run(correr()).status_code == 200
+    assert not activa(plantillas, "¿Dónde queda el Aula D3?")
+    assert plantillas.stats()["demoted"] == 1
@@ -0,0 +1,33 @@
+import asyncio
+
+from sqlalchemy import text
+
+
+def test_etag_cambia_con_escrituras_fuera_del_orm(main, llm, api):
+    from src.database import SessionLocal, engine
+    from src.models import Docente
+
+    with SessionLocal() as db:
+        docente = Docente(nombres_completos="Ana Torres", correo_institucional="ana.torres@uni.pe")
+        db.add(docente)
+        db.commit()
+        id_docente = docente.id_docente
+
+    async def pedir(etag=None):
+        async with api() as cliente:
+            headers = {"If-None-Match": etag} if etag else {}
+            return await cliente.get("/api/teachers", params={"q": "ana.torres@"}, headers=headers)
+
+    primera = asyncio.run(pedir())
+    etag = primera.headers["ETag"]
+    assert primera.status_code == 200
+    assert asyncio.run(pedir(etag)).status_code == 304
+
+    # SQL manual (o una carga de otro proceso): no pasa por los eventos del ORM
+    with engine.begin() as conexion:
+        conexion.execute(text("UPDATE docentes SET especialidad = 'Redes' WHERE id_docente = :id"), {"id": id_docente})
+
+    despues = asyncio.run(pedir(etag))
+    assert despues.status_code == 200
+    assert despues.headers["ETag"] != etag
+    assert despues.json()[0]["specialty"] == "Redes"
@@ -0,0 +1,125 @@
+import asyncio
+import threading
+
+from src.auth import throttling
+from src.auth.throttling import MemoryBackend, RateLimiter
+
+
+def test_ventana_deslizante_en_el_borde():
+    limiter = RateLimiter(MemoryBackend())
+    # 10 peticiones por minuto, todas al final de la ventana [0, 60)
+    for i in range(10):
+        assert limiter.hit("u", 10, 60, now=50 + i * 0.1).allowed
+    assert not limiter.hit("u", 10, 60, now=59.9).allowed
+
+    # Al empezar la ventana siguiente la anterior aún pesa por completo
+    rechazo = limiter.hit("u", 10, 60, now=60)
+    assert not rechazo.allowed
+    assert rechazo.retry_after == 6  # 10 * (1 - 6/60) + 1 = 10 entra justo
+
+    assert not limiter.hit("u", 10, 60, now=65.9).allowed
+    assert limiter.hit("u", 10, 60, now=66).allowed
+
+    # A mitad de la ventana la anterior pesa la mitad: 5 + 1 ya hechas
+    permitidas = sum(limiter.hit("u", 10, 60, now=90).allowed for _ in range(10))
+    assert permitidas == 4
+
+
+def test_usuarios_no_comparten_cuota():
+    limiter = RateLimiter(MemoryBackend())
+    for _ in range(3):
+        limiter.hit("a", 3, 60, now=10)
+    assert not limiter.hit("a", 3, 60, now=10).allowed
+    assert limiter.hit("b", 3, 60, now=10).allowed
+
+
+def test_peticiones_concurrentes_no_superan_el_limite():
+    limiter = RateLimiter(MemoryBackend())
+    inicio = threading.Barrier(40)
+    permitidas = []
+
+    def pedir():
+        inicio.wait()
+        permitidas.append(limiter.hit("u", 10, 60, now=30).allowed)
+
+    hilos = [threading.Thread(target=pedir) for _ in range(40)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert sum(permitidas) == 10
+    # Las rechazadas devuelven su cupo: no alargan el bloqueo
+    assert limiter.hit("u", 10, 60, now=90).allowed
+
+
+def clientes(main, *ips):
+    """Un cliente por IP de origen, todos contra la misma app."""
+    import httpx
+
+    return [
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app, client=(ip, 50000)), base_url="http://pruebas")
+        for ip in ips
+    ]
+
+
+def test_token_tiene_su_limite_por_usuario_y_por_ip(main, llm, monkeypatch):
+    monkeypatch.setattr(throttling, "limiter", RateLimiter(MemoryBackend()))
+    monkeypatch.setattr(throttling, "LOGIN_RATE_LIMIT", 2)
+    monkeypatch.setattr(throttling, "LOGIN_IP_RATE_LIMIT", 4)
+    monkeypatch.setattr(throttling, "GLOBAL_RATE_LIMIT", 1)  # el chat anónimo no afecta al login
+
+    async def correr():
+        async with main.app.router.lifespan_context(main.app):
+            a, b = clientes(main, "10.0.0.1", "10.0.0.2")
+            async with a, b:
+                await a.post("/chat", json={"prompt": "¿Dónde queda el aula 1?"})
+                login = lambda c, correo: c.post("/token", data={"username": correo, "password": "x"})
+                mismo_usuario = [await login(a, "nadie@uni.pe") for _ in range(3)]
+                otra_ip = await login(b, "nadie@uni.pe")
+                otro_usuario = await login(a, "otro@uni.pe")
+                ip_agotada = await login(a, "tercero@uni.pe")
+                return mismo_usuario, otra_ip, otro_usuario, ip_agotada
+
+    (primera, segunda, tercera), otra_ip, otro_usuario, ip_agotada = asyncio.run(correr())
+
+    assert primera.status_code == segunda.status_code == 401  # credenciales inválidas, pero dentro del límite
+    assert tercera.status_code == 429
+    assert 1 <= int(tercera.headers["Retry-After"]) <= 300
+    assert tercera.headers["RateLimit-Remaining"] == "0"
+    assert otra_ip.status_code == 429  # el límite por usuario vale desde cualquier IP
+    assert otro_usuario.status_code == 401
+    assert ip_agotada.status_code == 429  # la IP ya hizo sus 4 intentos
+
+
+def test_chat_anonimo_se_limita_por_ip(main, llm, monkeypatch):
+    monkeypatch.setattr(throttling, "limiter", RateLimiter(MemoryBackend()))
+    monkeypatch.setattr(throttling, "GLOBAL_RATE_LIMIT", 1)
+
+    async def correr():
+        async with main.app.router.lifespan_context(main.app):
+            a, b = clientes(main, "10.0.0.1", "10.0.0.2")
+            async with a, b:
+                return [await c.post("/chat", json={"prompt": "¿Dónde queda el aula 7?"}) for c in (a, a, b)]
+
+    primera, segunda, otra_ip = asyncio.run(correr())
+
+    assert primera.status_code == 200
+    assert segunda.status_code == 429
+    assert otra_ip.status_code == 200
+
+
+def test_chat_aplica_el_limite(main, llm, api, monkeypatch):
+    monkeypatch.setattr(throttling, "limiter", RateLimiter(MemoryBackend()))
+    monkeypatch.setattr(throttling, "GLOBAL_RATE_LIMIT", 1)
+
+    async def correr():
+        async with api() as cliente:
+            return [await cliente.post("/chat", json={"prompt": f"¿Dónde queda el aula {n}?"}) for n in (1, 2)]
+
+    primera, segunda = asyncio.run(correr())
+
+    assert primera.status_code == 200
+    assert primera.headers["RateLimit-Remaining"] == "0"
+    assert segunda.status_code == 429
+    assert "Retry-After" in segunda.headers
@@ -146,9 +146,17 @@ export function TeachersManager() {
   useEffect(() => {
     async function fetchTeachers() {
       try {
-        const res = await fetch("http://127.0.0.1:8080/api/teachers")
-        if (!res.ok) throw new Error("No se pudo cargar la lista de docentes")
-        const data = await res.json()
+        // El backend pagina por cursor (cabecera X-Next-Cursor); se recorren
+        // todas las páginas. Las páginas sin cambios se revalidan con ETag.
+        const data: any[] = []
+        let cursor: string | null = null
+        do {
+          const url: string = "http://127.0.0.1:8080/api/teachers?limit=200" + (cursor ? `&cursor=${cursor}` : "")
+          const res = await fetch(url)
+          if (!res.ok) throw new Error("No se pudo cargar la lista de docentes")
+          data.push(...(await res.json()))
+          cursor = res.headers.get("X-Next-Cursor")
+        } while (cursor)
         // Mapear respuesta al formato interno
         const mapped: Teacher[] = (data || []).map((t: any) => ({
           id: String(t.id || Date.now() + Math.random()),
@@ -6,7 +6,7 @@ import { Button } from "@/components/ui/button"
 import { Input } from "@/components/ui/input"
 import { Card } from "@/components/ui/card"
 import { Send, Bot, User, Plus, MessageSquare, Sparkles, Clock, TrendingUp } from "lucide-react"
-import { getChatResponse } from "@/lib/chat-responses" // Conexión con el backend
+import { type BackendChat, createChat, getChatResponse, streamChatResponse } from "@/lib/chat-responses" // Conexión con el backend
 import { ScrollArea } from "@/components/ui/scroll-area"
 
 interface Message {
@@ -22,6 +22,7 @@ interface Chat {
   lastMessage: string
   timestamp: Date
   messages: Message[]
+  backendId?: BackendChat | null // id_chat y chat_key en el backend (contexto de la conversación)
 }
 
 interface ChatInterfaceProps {
@@ -117,29 +118,45 @@ export function ChatInterface({ user }: ChatInterfaceProps) {
     setIsTyping(true)
 
     try {
-      // 2. PEDIR RESPUESTA REAL AL BACKEND (Esperar)
-      const responseText = await getChatResponse(input)
-
-      const botMessage: Message = {
-        id: `${messageId}-bot`, // ID única del bot
-        role: "assistant",
-        content: responseText,
-        timestamp: new Date(),
+      // 2. El primer mensaje abre el chat en el backend para tener contexto
+      let backendId = currentChat.backendId
+      if (backendId === undefined) {
+        backendId = await createChat(input.slice(0, 100))
+        setChats((prevChats) =>
+          prevChats.map((chat) => (chat.id === currentChatId ? { ...chat, backendId } : chat)),
+        )
       }
 
-      // 3. Agregar respuesta del bot
-      setChats((prevChats) => 
-        prevChats.map((chat) => {
-          if (chat.id === currentChatId) {
-            return {
-              ...chat,
-              messages: [...chat.messages, botMessage],
-              lastMessage: botMessage.content.slice(0, 50) + "...",
-            }
+      // 3. PEDIR RESPUESTA REAL AL BACKEND (en streaming)
+      const botId = `${messageId}-bot` // ID única del bot
+      let started = false
+
+      const upsertBotMessage = (content: string) => {
+        setChats((prevChats) =>
+          prevChats.map((chat) => {
+            if (chat.id !== currentChatId) return chat
+            const exists = chat.messages.some((m) => m.id === botId)
+            const messages = exists
+              ? chat.messages.map((m) => (m.id === botId ? { ...m, content } : m))
+              : [...chat.messages, { id: botId, role: "assistant" as const, content, timestamp: new Date() }]
+            return { ...chat, messages, lastMessage: content.slice(0, 50) + "..." }
+          }),
+        )
+      }
+
+      // 4. Ir mostrando la respuesta del bot a medida que llega
+      let partial = ""
+      const responseText = await streamChatResponse(input, {
+        onToken: (text) => {
+          if (!started) {
+            started = true
+            setIsTyping(false)
           }
-          return chat
-        })
-      )
+          partial += text
+          upsertBotMessage(partial)
+        },
+      }, backendId)
+      upsertBotMessage(responseText)
     } catch (error) {
       console.error("Error en chat:", error)
     } finally {
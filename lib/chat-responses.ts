@@ -31,4 +31,103 @@ export async function getChatResponse(query: string): Promise<string> {
     console.error("Error de conexión:", error);
     return "Error de conexión: ¿Está encendido el backend en 8080? (Verifica la terminal negra)";
   }
-}
\ No newline at end of file
+}
+// --- STREAMING (Server-Sent Events) ---
+// Muestra el progreso del pipeline y la respuesta fragmento a fragmento,
+// en lugar de esperar a que el backend termine los tres pasos.
+export interface ChatStreamHandlers {
+  onProgress?: (message: string) => void
+  onToken: (text: string) => void
+}
+
+// --- CONVERSACIONES ---
+// Con un chat del backend (id_chat) las preguntas de seguimiento ("¿y su correo?")
+// se responden con el contexto de los turnos anteriores. La chat_key que devuelve
+// el backend al crearlo se envía con cada pregunta: sin ella el chat no existe.
+export interface BackendChat {
+  id_chat: number
+  chat_key: string
+}
+
+export async function createChat(titulo?: string): Promise<BackendChat | null> {
+  try {
+    const res = await fetch("http://127.0.0.1:8080/api/chats", {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ titulo }),
+    })
+    if (!res.ok) return null
+    const data = await res.json()
+    return { id_chat: data.id_chat, chat_key: data.chat_key }
+  } catch (error) {
+    console.error("No se pudo crear el chat:", error)
+    return null
+  }
+}
+
+export async function streamChatResponse(
+  query: string,
+  handlers: ChatStreamHandlers,
+  chat?: BackendChat | null,
+): Promise<string> {
+  let fullText = ""
+  try {
+    const res = await fetch("http://127.0.0.1:8080/chat/stream", {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        Accept: "text/event-stream",
+      },
+      body: JSON.stringify({
+        prompt: query,
+        chat_id: chat?.id_chat ?? null,
+        chat_key: chat?.chat_key ?? null,
+      }),
+    })
+
+    if (!res.ok || !res.body) {
+      return "Error al procesar la pregunta. El servidor no respondió correctamente."
+    }
+
+    const reader = res.body.getReader()
+    const decoder = new TextDecoder()
+    let buffer = ""
+
+    while (true) {
+      const { done, value } = await reader.read()
+      if (done) break
+      buffer += decoder.decode(value, { stream: true })
+
+      // Cada evento SSE termina con una línea en blanco
+      let sep = buffer.indexOf("\n\n")
+      while (sep !== -1) {
+        const raw = buffer.slice(0, sep)
+        buffer = buffer.slice(sep + 2)
+        sep = buffer.indexOf("\n\n")
+
+        let event = "message"
+        let data = ""
+        for (const line of raw.split("\n")) {
+          if (line.startsWith("event:")) event = line.slice(6).trim()
+          else if (line.startsWith("data:")) data += line.slice(5).trim()
+        }
+        const payload = data ? JSON.parse(data) : {}
+
+        if (event === "progress") {
+          handlers.onProgress?.(payload.message)
+        } else if (event === "token") {
+          fullText += payload.text
+          handlers.onToken(payload.text)
+        } else if (event === "error") {
+          fullText += payload.message
+          handlers.onToken(payload.message)
+        }
+      }
+    }
+
+    return fullText
+  } catch (error) {
+    console.error("Error de conexión:", error)
+    return fullText || "Error de conexión: ¿Está encendido el backend en 8080? (Verifica la terminal negra)"
+  }
+}